@@ -0,0 +1,243 @@
+# Headless solution statistics over many random states, without Blender.
+#
+#   python analytics.py --states 1000000 --workers 16 --output stats.jsonl
+#   python analytics.py --states 100000 --solver short --target-length 20 --output short.jsonl
+#
+# State i is the one rubik.py draws for seed i with the same --scramble
+# (nxn.scrambled_state), solved with the same solver
+# backend as rubik.py --solver. The seeds are cut into chunks that worker
+# processes solve; every finished chunk is appended to --output as one JSON line
+# with its solution-length and solve-time histograms, so millions of states take
+# little space and a rerun with the same options skips the chunks already in
+# the file (chunks of another seed range or --chunk-size are not counted). A
+# summary (length histogram, solve-time percentiles and the frame counts the
+# animation timing of keyframes.py predicts) is printed every --report-interval
+# seconds and at the end, and written to --summary.
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import cube_state
+import keyframes
+import notation
+import nxn
+import solver
+
+# solve times are counted in logarithmic bins, 20 per decade (12% wide)
+TIME_BINS_PER_DECADE = 20
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def time_bin(seconds):
+    return math.floor(math.log10(max(seconds, 1e-7)) * TIME_BINS_PER_DECADE)
+
+
+def bin_seconds(index):
+    # geometric middle of a time bin
+    return 10 ** ((index + 0.5) / TIME_BINS_PER_DECADE)
+
+
+def predicted_frames(n_moves):
+    # frame_end of an animation of n_moves moves (lead-in, turn + pause per move, tail)
+    return keyframes.static_ranges(n_moves)[-1][1]
+
+
+# --- workers -----------------------------------------------------------------
+
+worker_solve = None
+worker_size = 3
+worker_scramble = "random-state"
+
+
+def init_worker(backend, options, size, scramble="random-state"):
+    global worker_solve, worker_size, worker_scramble
+    worker_solve = solver.get_solver(backend, **options)
+    worker_size = size
+    worker_scramble = scramble
+    if backend in ("twophase", "short"):
+        solver.twophase.load_tables()
+    if size != 3:
+        nxn.cycle_library(size)
+
+
+def solve_chunk(chunk):
+    start, stop = chunk
+    lengths = {}
+    times = {}
+    errors = 0
+    total = 0.0
+    for seed in range(start, stop):
+        state = nxn.scrambled_state(seed, worker_size, worker_scramble)
+        begin = time.perf_counter()
+        try:
+            if worker_size == 3:
+                n_moves = len(notation.simplify(notation.parse(worker_solve(cube_state.kociemba_facelets(state)))))
+            else:
+                n_moves = len(nxn.solve(state, worker_solve, worker_size))
+        except ValueError:
+            errors += 1
+            continue
+        elapsed = time.perf_counter() - begin
+        total += elapsed
+        lengths[n_moves] = lengths.get(n_moves, 0) + 1
+        times[time_bin(elapsed)] = times.get(time_bin(elapsed), 0) + 1
+    return {"start": start, "stop": stop, "lengths": lengths, "times": times,
+            "errors": errors, "solve_seconds": total}
+
+
+# --- results -----------------------------------------------------------------
+
+class Statistics:
+    def __init__(self):
+        self.lengths = {}
+        self.times = {}
+        self.errors = 0
+        self.solve_seconds = 0.0
+
+    def add(self, record):
+        # JSON turns the histogram keys into strings
+        for length, count in record["lengths"].items():
+            self.lengths[int(length)] = self.lengths.get(int(length), 0) + count
+        for index, count in record["times"].items():
+            self.times[int(index)] = self.times.get(int(index), 0) + count
+        self.errors += record["errors"]
+        self.solve_seconds += record["solve_seconds"]
+
+    def count(self):
+        return sum(self.lengths.values())
+
+    def summary(self):
+        count = self.count()
+        if count == 0:
+            return {"states": 0, "errors": self.errors}
+        frames = {}
+        for length, n in self.lengths.items():
+            frames[predicted_frames(length)] = frames.get(predicted_frames(length), 0) + n
+        return {"states": count, "errors": self.errors,
+                "lengths": {str(length): self.lengths[length] for length in sorted(self.lengths)},
+                "mean_length": sum(length * n for length, n in self.lengths.items()) / count,
+                "solve_seconds": dict(percentiles(self.times, bin_seconds), mean=self.solve_seconds / count),
+                "frames": dict(percentiles(frames), mean=sum(f * n for f, n in frames.items()) / count,
+                               total=sum(f * n for f, n in frames.items()))}
+
+
+def percentiles(histogram, value=lambda key: key):
+    # {"p50": ..., "max": ...} of a {key: count} histogram
+    count = sum(histogram.values())
+    result = {}
+    keys = sorted(histogram)
+    for p in PERCENTILES:
+        rank = p / 100 * count
+        seen = 0
+        for key in keys:
+            seen += histogram[key]
+            if seen >= rank:
+                result[f"p{p:g}"] = value(key)
+                break
+    result["max"] = value(keys[-1])
+    return result
+
+
+def read_records(path, options):
+    # finished chunks of an earlier run with the same options
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # cut off by an interrupted run
+                continue
+            if record.get("options") == options:
+                records.append(record)
+    return records
+
+
+def report(statistics, started, solved):
+    summary = statistics.summary()
+    if not summary["states"]:
+        return
+    rate = solved / max(time.perf_counter() - started, 1e-9)
+    times = summary["solve_seconds"]
+    frames = summary["frames"]
+    print(f"{summary['states']} states ({rate:.0f}/s this run), {summary['errors']} errors, "
+          f"mean length {summary['mean_length']:.2f}, lengths {summary['lengths']}")
+    print("  solve time " + " ".join(f"{key} {value * 1000:.2f}ms" for key, value in times.items()))
+    print(f"  frames p50 {frames['p50']} p99 {frames['p99']} max {frames['max']} "
+          f"mean {frames['mean']:.1f} total {frames['total']}", flush=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--states", type=int, default=10000, help="number of random states")
+    parser.add_argument("--first-seed", type=int, default=0, help="seed of the first state")
+    parser.add_argument("--size", type=int, choices=nxn.SIZES, default=3, help="cubies per edge")
+    parser.add_argument("--scramble", choices=nxn.SCRAMBLES, default="random-state",
+                        help="how the seed scrambles a 3x3 (see rubik.py --scramble)")
+    parser.add_argument("--solver", choices=tuple(solver.BACKENDS), default=solver.DEFAULT,
+                        help="solver backend (see rubik.py --solver)")
+    parser.add_argument("--target-length", type=int, default=20, help="short solver: target length")
+    parser.add_argument("--solve-time", type=float, default=1.0, help="short solver: seconds per state")
+    parser.add_argument("--solve-nodes", type=int, default=None, help="short solver: search nodes per state")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="solver processes")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="states per chunk (and output line)")
+    parser.add_argument("--output", default="analytics.jsonl", help="one JSON line per finished chunk")
+    parser.add_argument("--summary", default=None, help="write the final summary to this JSON file")
+    parser.add_argument("--report-interval", type=float, default=10, help="seconds between progress reports")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    solver_options = {}
+    if args.solver == "short":
+        solver_options = {"target": args.target_length, "timeout": args.solve_time, "max_nodes": args.solve_nodes}
+    # chunks only count towards a run with the same states and solver
+    options = {"size": args.size, "scramble": args.scramble, "solver": args.solver, "solver_options": solver_options}
+
+    stop = args.first_seed + args.states
+    chunks = [(start, min(start + args.chunk_size, stop))
+              for start in range(args.first_seed, stop, args.chunk_size)]
+    statistics = Statistics()
+    done = set()
+    wanted = set(chunks)
+    for record in read_records(args.output, options):
+        # only chunks of this seed range and chunk size, each once
+        chunk = (record["start"], record["stop"])
+        if chunk in wanted and chunk not in done:
+            statistics.add(record)
+            done.add(chunk)
+    pending = [chunk for chunk in chunks if chunk not in done]
+    print(f"{len(chunks) - len(pending)} of {len(chunks)} chunks already done", flush=True)
+
+    started = time.perf_counter()
+    last_report = started
+    solved = 0
+    if pending:
+        with multiprocessing.Pool(args.workers, init_worker,
+                                  (args.solver, solver_options, args.size, args.scramble)) as pool, \
+                open(args.output, "a") as output:
+            for record in pool.imap_unordered(solve_chunk, pending):
+                record["options"] = options
+                output.write(json.dumps(record) + "\n")
+                output.flush()
+                statistics.add(record)
+                solved += record["stop"] - record["start"]
+                if time.perf_counter() - last_report >= args.report_interval:
+                    last_report = time.perf_counter()
+                    report(statistics, started, solved)
+    report(statistics, started, solved)
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump(dict(statistics.summary(), options=options), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
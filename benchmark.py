@@ -0,0 +1,208 @@
+# Stage-level benchmarks of the generator pipeline.
+#
+#   blender -b -P benchmark.py -- --seeds 5 --output bench.json --baseline baseline.json
+#   python benchmark.py --seeds 20          (headless stages only, without bpy)
+#
+# Every stage runs once per seed; the headless stages and the scene stages that
+# do not change the scene are repeated --repeat times and count their fastest
+# run, like timeit. The JSON report keeps min/median/mean per stage and, with
+# --baseline, the run fails when a stage is slower than the baseline by more
+# than --tolerance and by more than --min-slowdown milliseconds, so the noise of
+# sub-millisecond stages does not count as a regression.
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import cube_state
+import keyframes
+import notation
+import solver
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+if bpy is not None:
+    import nxn
+    import rubik
+
+
+@contextmanager
+def timer(timings, stage):
+    start = time.perf_counter()
+    yield
+    timings.setdefault(stage, []).append(time.perf_counter() - start)
+
+
+def repeated(timings, stage, repeat, func, *args):
+    # the fastest of `repeat` runs of func(*args); returns its result
+    best = float("inf")
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    timings.setdefault(stage, []).append(best)
+    return result
+
+
+def headless_stages(seed, timings, solve, repeat=1):
+    moves = cube_state.random_moves(300, random.Random(seed))
+    repeated(timings, "scramble_model", repeat, cube_state.apply_moves, cube_state.SOLVED, moves)
+    # every run draws the same state, the one rubik.py poses for the seed
+    rngs = [random.Random(seed) for i in range(repeat)]
+    state = repeated(timings, "random_state", repeat, lambda: cube_state.random_state(rngs.pop()))
+    facelets = repeated(timings, "facelets_model", repeat, cube_state.kociemba_facelets, state)
+    if solve is None:
+        return state, None
+    solution = notation.parse(repeated(timings, "solve", repeat, solve, facelets))
+    repeated(timings, "solution_keys", repeat, keyframes.solution_keys, state, solution)
+    return state, solution
+
+
+def render_stage(timings, frames, samples, percentage, engine):
+    scene = bpy.context.scene
+    render = scene.render
+    saved = (render.engine, render.resolution_percentage, scene.frame_start, scene.frame_end, render.filepath)
+    render.engine = engine
+    render.resolution_percentage = percentage
+    if engine == "CYCLES":
+        scene.cycles.samples = samples
+    scene.frame_start = 1
+    scene.frame_end = frames
+    with tempfile.TemporaryDirectory() as output:
+        render.filepath = os.path.join(output, "frame_")
+        with timer(timings, "render"):
+            bpy.ops.render.render(animation=True)
+    render.engine, render.resolution_percentage, scene.frame_start, scene.frame_end, render.filepath = saved
+
+
+def scene_stages(seed, state, solution, timings, args):
+    with timer(timings, "build_rig"):
+        collection = rubik.build_rig(args.rig)
+    with timer(timings, "create_cubie_mesh"):
+        mesh = rubik.create_cubie_mesh()
+    bpy.data.meshes.remove(mesh)
+
+    rng = random.Random(seed)
+    if rubik.rig_armature(collection) is None:
+        with timer(timings, "scramble_scene"):
+            for i in range(nxn.N_ROTATIONS):
+                rubik.rotate(collection, rng.choice(nxn.SCRAMBLE_MOVES))
+        rubik.reset_cubes(collection)
+
+    repeated(timings, "pose_cubes", args.repeat, rubik.pose_cubes, collection, state)
+    if rubik.rig_armature(collection) is None:
+        repeated(timings, "get_color_string", args.repeat, rubik.get_color_string, collection)
+        repeated(timings, "get_color_string_fast", args.repeat, rubik.get_color_string_fast, collection)
+    if solution is None:
+        return
+    if rubik.rig_armature(collection) is None:
+        with timer(timings, "animate_insert"):
+            rubik.animate_solution_insert(collection, solution)
+        rubik.reset_cubes(collection)
+        rubik.pose_cubes(collection, state)
+    with timer(timings, "animate_bulk"):
+        rubik.animate_solution(collection, state, solution)
+    if args.render_frames:
+        render_stage(timings, args.render_frames, args.render_samples, args.render_percentage, args.render_engine)
+    with timer(timings, "reset_cubes"):
+        rubik.reset_cubes(collection)
+    with timer(timings, "setup_scene"):
+        rubik.setup_scene()
+
+
+def summarize(timings):
+    return {stage: {"runs": len(values), "min": min(values), "median": statistics.median(values),
+                    "mean": statistics.fmean(values)}
+            for stage, values in timings.items()}
+
+
+def compare(stages, baseline, tolerance, min_slowdown=0.0):
+    regressions = []
+    print(f"{'stage':24} {'median ms':>10} {'baseline':>10} {'ratio':>7}")
+    for stage, result in stages.items():
+        reference = baseline.get(stage)
+        if reference is None:
+            print(f"{stage:24} {result['median'] * 1000:10.3f} {'-':>10} {'-':>7}")
+            continue
+        ratio = result["median"] / reference["median"] if reference["median"] else float("inf")
+        flag = ""
+        if ratio > 1 + tolerance and result["median"] - reference["median"] > min_slowdown:
+            regressions.append(stage)
+            flag = "  REGRESSION"
+        print(f"{stage:24} {result['median'] * 1000:10.3f} {reference['median'] * 1000:10.3f} {ratio:7.2f}{flag}")
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="benchmark.py")
+    parser.add_argument("--seeds", type=int, default=5, help="number of seeds every stage runs on")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="runs of the repeatable stages per seed, the fastest counts")
+    parser.add_argument("--solver", choices=tuple(solver.BACKENDS), default=solver.DEFAULT)
+    parser.add_argument("--rig", choices=("objects", "armature"), default="objects")
+    parser.add_argument("--render-frames", type=int, default=3, help="frames of the render stage, 0 to skip")
+    parser.add_argument("--render-samples", type=int, default=4)
+    parser.add_argument("--render-percentage", type=int, default=25, help="resolution scale of the render stage")
+    parser.add_argument("--render-engine", default="CYCLES")
+    parser.add_argument("--output", default=None, help="write the JSON report here")
+    parser.add_argument("--baseline", default=None, help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown against the baseline (0.2 = 20%%)")
+    parser.add_argument("--min-slowdown", type=float, default=1.0,
+                        help="milliseconds a stage must lose before it counts as a regression")
+    # inside Blender the script arguments follow "--"
+    if "--" in argv:
+        argv = argv[argv.index("--") + 1:]
+    elif bpy is not None:
+        argv = []
+    else:
+        argv = argv[1:]
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args(sys.argv)
+    timings = {}
+    solve = solver.get_solver(args.solver)
+    if args.solver == "kociemba" and importlib.util.find_spec("kociemba") is None:
+        solve = None
+    elif args.solver in ("twophase", "short"):
+        # map (or generate) the tables outside the timed solve stage
+        solver.twophase.load_tables()
+    for seed in range(args.first_seed, args.first_seed + args.seeds):
+        state, solution = headless_stages(seed, timings, solve, args.repeat)
+        if bpy is not None:
+            scene_stages(seed, state, solution, timings, args)
+    report = {"meta": {"seeds": args.seeds, "first_seed": args.first_seed, "repeat": args.repeat, "rig": args.rig,
+                       "solver": args.solver,
+                       "blender": bpy.app.version_string if bpy is not None else None,
+                       "python": platform.python_version(), "machine": platform.machine(),
+                       "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+              "stages": summarize(timings)}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["stages"]
+    regressions = compare(report["stages"], baseline, args.tolerance, args.min_slowdown / 1000)
+    if regressions:
+        print("slower than the baseline:", ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
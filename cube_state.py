@@ -0,0 +1,306 @@
+# Headless model of the cube state, used to scramble and solve without bpy.
+#
+# Positions are the world coordinates of the cubie centres in the Blender scene
+# (cubes of size 2 placed at -2, 0, 2), so the model and the scene can be
+# compared directly. A state is a pair of tuples indexed by slot (lattice
+# position): which cubie sits in the slot and the index of its rotation.
+import itertools
+import random
+import time
+
+
+# outward normals of the faces in kociemba (U, R, F, D, L, B) order
+NORMALS = ((0, 0, 1), (1, 0, 0), (0, -1, 0), (0, 0, -1), (-1, 0, 0), (0, 1, 0))
+# colors of the solved cube in the same order, as returned by get_color_string
+FACE_COLORS = "ygrwbo"
+# face -> (axis, layer value) of the layer it turns
+FACE_LAYERS = {'U': (2, 2), 'R': (0, 2), 'F': (1, -2), 'D': (2, -2), 'L': (0, -2), 'B': (1, 2)}
+
+# cubies per edge and the coordinate of the outer layers (see nxn.Cube)
+SIZE = 3
+EXTENT = 2
+POSITIONS = tuple(itertools.product((-2, 0, 2), repeat=3))
+SLOT_OF = {position: slot for slot, position in enumerate(POSITIONS)}
+# (axis, layer value) -> the 9 slots of that layer
+LAYER_SLOTS = {(axis, value): tuple(slot for slot, position in enumerate(POSITIONS) if position[axis] == value)
+               for axis in range(3) for value in (-2, 0, 2)}
+
+
+def mat_mul(a, b):
+    return tuple(sum(a[3 * i + k] * b[3 * k + j] for k in range(3)) for i in range(3) for j in range(3))
+
+
+def mat_vec(m, v):
+    return tuple(m[3 * i] * v[0] + m[3 * i + 1] * v[1] + m[3 * i + 2] * v[2] for i in range(3))
+
+
+def transpose(m):
+    return tuple(m[3 * j + i] for i in range(3) for j in range(3))
+
+
+# counter-clockwise quarter turns about x, y and z
+QUARTER_TURNS = ((1, 0, 0, 0, 0, -1, 0, 1, 0),
+                 (0, 0, 1, 0, 1, 0, -1, 0, 0),
+                 (0, -1, 0, 1, 0, 0, 0, 0, 1))
+IDENTITY = (1, 0, 0, 0, 1, 0, 0, 0, 1)
+
+
+def generate_rotations():
+    # closure of the quarter turns: the 24 rotations of the cube
+    rotations = [IDENTITY]
+    for rotation in rotations:
+        for turn in QUARTER_TURNS:
+            product = mat_mul(turn, rotation)
+            if product not in rotations:
+                rotations.append(product)
+    return tuple(rotations)
+
+
+ROTATIONS = generate_rotations()
+ROTATION_INDEX = {rotation: idx for idx, rotation in enumerate(ROTATIONS)}
+# ROTATION_MUL[a][b] is the index of ROTATIONS[a] @ ROTATIONS[b]
+ROTATION_MUL = tuple(tuple(ROTATION_INDEX[mat_mul(a, b)] for b in ROTATIONS) for a in ROTATIONS)
+# COLOR_OF[rotation][normal] is the color a cubie rotated by `rotation` shows on `normal`
+COLOR_OF = tuple(tuple(FACE_COLORS[NORMALS.index(mat_vec(transpose(rotation), normal))] for normal in NORMALS)
+                 for rotation in ROTATIONS)
+
+
+def face_rotation(axis, quarter_turns):
+    rotation = IDENTITY
+    for i in range(quarter_turns % 4):
+        rotation = mat_mul(QUARTER_TURNS[axis], rotation)
+    return rotation
+
+
+# every move of the standard notation -> (axis, layer values, sign of a clockwise
+# turn): faces, wide moves (face and middle layer), slices M (as L), E (as D),
+# S (as F) and whole cube rotations x (as R), y (as U), z (as F)
+LAYERS = {face: (axis, (value,), -1 if value > 0 else 1) for face, (axis, value) in FACE_LAYERS.items()}
+LAYERS.update({face + "w": (axis, tuple(sorted((value, 0))), sign) for face, (axis, (value,), sign) in list(LAYERS.items())})
+LAYERS.update({'M': (0, (0,), 1), 'E': (2, (0,), 1), 'S': (1, (0,), 1),
+               'x': (0, (-2, 0, 2), -1), 'y': (2, (-2, 0, 2), -1), 'z': (1, (-2, 0, 2), 1)})
+
+
+def move_table(axis, values, quarter_turns):
+    # returns (source slot for every slot, slots of the layers, rotation index)
+    rotation = face_rotation(axis, quarter_turns)
+    inverse = transpose(rotation)
+    layer = tuple(slot for slot, position in enumerate(POSITIONS) if position[axis] in values)
+    source = list(range(len(POSITIONS)))
+    for slot in layer:
+        source[slot] = SLOT_OF[mat_vec(inverse, POSITIONS[slot])]
+    return tuple(source), layer, ROTATION_INDEX[rotation]
+
+
+def build_move_tables():
+    tables = {}
+    for key, (axis, values, clockwise) in LAYERS.items():
+        for suffix, turns in (("", 1), ("2", 2), ("'", -1)):
+            tables[key + suffix] = move_table(axis, values, clockwise * turns)
+    return tables
+
+
+MOVE_TABLES = build_move_tables()
+# the face turns, which is what scrambles and solvers use
+MOVES = tuple(face + suffix for face in FACE_LAYERS for suffix in ("", "2", "'"))
+
+SOLVED = (tuple(range(len(POSITIONS))), (0,) * len(POSITIONS))
+
+
+def apply_move(state, move):
+    source, layer, rotation = MOVE_TABLES[move]
+    cubies, orients = state
+    new_cubies = list(cubies)
+    new_orients = list(orients)
+    mul = ROTATION_MUL[rotation]
+    for slot in layer:
+        new_cubies[slot] = cubies[source[slot]]
+        new_orients[slot] = mul[orients[source[slot]]]
+    return tuple(new_cubies), tuple(new_orients)
+
+
+def apply_moves(state, moves):
+    for move in moves:
+        state = apply_move(state, move)
+    return state
+
+
+def facelet_slots():
+    # (slot, normal index) of the 54 stickers in the order used by get_color_string
+    axes = {'U': (1, 0), 'R': (2, 1), 'F': (2, 0), 'D': (1, 0), 'L': (2, 1), 'B': (2, 0)}
+    # direction in which rows and columns are read on every face
+    signs = {'U': (-1, 1), 'R': (-1, 1), 'F': (-1, 1), 'D': (1, 1), 'L': (-1, -1), 'B': (-1, -1)}
+    stickers = []
+    for normal_idx, face in enumerate("URFDLB"):
+        axis, value = FACE_LAYERS[face]
+        row_axis, col_axis = axes[face]
+        row_sign, col_sign = signs[face]
+        for row in (-2, 0, 2):
+            for col in (-2, 0, 2):
+                position = [0, 0, 0]
+                position[axis] = value
+                position[row_axis] = row * row_sign
+                position[col_axis] = col * col_sign
+                stickers.append((SLOT_OF[tuple(position)], normal_idx))
+    return tuple(stickers)
+
+
+FACELET_SLOTS = facelet_slots()
+
+
+def facelets(state):
+    # color string in the same U-R-F-D-L-B format as get_color_string
+    orients = state[1]
+    return "".join(COLOR_OF[orients[slot]][normal] for slot, normal in FACELET_SLOTS)
+
+
+def kociemba_facelets(state):
+    # the same string with the face letters kociemba expects (as adapt_for_kociemba)
+    return facelets(state).translate(str.maketrans(FACE_COLORS, "URFDLB"))
+
+
+def from_facelets(colors):
+    # inverse of facelets(): rebuild the state from a U-R-F-D-L-B color string
+    if len(colors) != len(FACELET_SLOTS):
+        raise ValueError(f"expected {len(FACELET_SLOTS)} facelets, got {len(colors)}")
+    stickers = {}
+    for (slot, normal), color in zip(FACELET_SLOTS, colors):
+        if color not in FACE_COLORS:
+            raise ValueError(f"unknown color {color!r}")
+        stickers.setdefault(slot, []).append((NORMALS[normal], NORMALS[FACE_COLORS.index(color)]))
+    cubies = list(SOLVED[0])
+    orients = list(SOLVED[1])
+    for slot, seen in stickers.items():
+        if len(seen) == 1:
+            # centres never move
+            if seen[0][0] != seen[0][1]:
+                raise ValueError("centre facelets do not match the color scheme")
+            continue
+        home = tuple(2 * sum(axis) for axis in zip(*(home_normal for normal, home_normal in seen)))
+        if home not in SLOT_OF:
+            raise ValueError(f"impossible cubie colors at {POSITIONS[slot]}")
+        for idx, rotation in enumerate(ROTATIONS):
+            if all(mat_vec(rotation, home_normal) == normal for normal, home_normal in seen):
+                break
+        else:
+            raise ValueError(f"impossible cubie colors at {POSITIONS[slot]}")
+        cubies[slot] = SLOT_OF[home]
+        orients[slot] = idx
+    if sorted(cubies) != list(SOLVED[0]):
+        raise ValueError("every cubie must appear exactly once")
+    return tuple(cubies), tuple(orients)
+
+
+def cubie_poses(state):
+    # (home position, current position, rotation matrix rows) of every cubie
+    cubies, orients = state
+    for slot, cubie in enumerate(cubies):
+        rotation = ROTATIONS[orients[slot]]
+        yield POSITIONS[cubie], POSITIONS[slot], (rotation[0:3], rotation[3:6], rotation[6:9])
+
+
+def random_moves(n, rng=random):
+    return [rng.choice(MOVES) for i in range(n)]
+
+
+CORNER_SLOTS = tuple(slot for slot, position in enumerate(POSITIONS) if 0 not in position)
+EDGE_SLOTS = tuple(slot for slot, position in enumerate(POSITIONS) if position.count(0) == 1)
+
+
+def reference_normal(position):
+    # the sticker used to measure orientation: U/D if the cubie has one, else F/B
+    axis = 2 if position[2] else 1
+    normal = [0, 0, 0]
+    normal[axis] = 1 if position[axis] > 0 else -1
+    return tuple(normal)
+
+
+def outward_normals(position):
+    return [tuple((1 if c > 0 else -1) if i == axis else 0 for i, c in enumerate(position))
+            for axis in range(3) if position[axis]]
+
+
+def det(a, b, c):
+    return (a[0] * (b[1] * c[2] - b[2] * c[1]) - a[1] * (b[0] * c[2] - b[2] * c[0])
+            + a[2] * (b[0] * c[1] - b[1] * c[0]))
+
+
+def orientation_faces(slot):
+    # faces of a slot in the order used to count twists (corners) and flips (edges):
+    # the reference face first, then the remaining face(s) in a fixed rotational order
+    position = POSITIONS[slot]
+    reference = reference_normal(position)
+    others = [normal for normal in outward_normals(position) if normal != reference]
+    if len(others) == 2 and det(reference, others[0], others[1]) < 0:
+        others.reverse()
+    return [reference] + others
+
+
+def build_orient_lookup():
+    # (cubie, target slot, face index of its reference sticker) -> rotation index
+    lookup = {}
+    for cubie in CORNER_SLOTS + EDGE_SLOTS:
+        for idx, rotation in enumerate(ROTATIONS):
+            target = SLOT_OF[mat_vec(rotation, POSITIONS[cubie])]
+            face = mat_vec(rotation, reference_normal(POSITIONS[cubie]))
+            lookup[cubie, target, orientation_faces(target).index(face)] = idx
+    return lookup
+
+
+ORIENT_LOOKUP = build_orient_lookup()
+
+
+def permutation_parity(permutation):
+    parity = 0
+    seen = [False] * len(permutation)
+    for i in range(len(permutation)):
+        if not seen[i]:
+            j = i
+            while not seen[j]:
+                seen[j] = True
+                j = permutation[j]
+                parity ^= 1
+            parity ^= 1
+    return parity
+
+
+def orientation(state, slot):
+    # twist (0-2) of a corner or flip (0-1) of an edge in `slot`
+    cubies, orients = state
+    face = mat_vec(ROTATIONS[orients[slot]], reference_normal(POSITIONS[cubies[slot]]))
+    return orientation_faces(slot).index(face)
+
+
+def random_state(rng=random):
+    # uniformly random legal state: random corner and edge permutations with equal
+    # parity, random twists summing to 0 mod 3 and random flips summing to 0 mod 2
+    corners = list(CORNER_SLOTS)
+    edges = list(EDGE_SLOTS)
+    rng.shuffle(corners)
+    rng.shuffle(edges)
+    corner_parity = permutation_parity([CORNER_SLOTS.index(c) for c in corners])
+    edge_parity = permutation_parity([EDGE_SLOTS.index(e) for e in edges])
+    if corner_parity != edge_parity:
+        edges[0], edges[1] = edges[1], edges[0]
+    twists = [rng.randrange(3) for i in range(len(corners) - 1)]
+    twists.append(-sum(twists) % 3)
+    flips = [rng.randrange(2) for i in range(len(edges) - 1)]
+    flips.append(sum(flips) % 2)
+
+    cubies = list(SOLVED[0])
+    orients = list(SOLVED[1])
+    for slots, pieces, turns in ((CORNER_SLOTS, corners, twists), (EDGE_SLOTS, edges, flips)):
+        for slot, cubie, turn in zip(slots, pieces, turns):
+            cubies[slot] = cubie
+            orients[slot] = ORIENT_LOOKUP[cubie, slot, turn]
+    return tuple(cubies), tuple(orients)
+
+
+if __name__ == "__main__":
+    # quick standalone benchmark of a 300 move scramble
+    scramble = random_moves(300)
+    start = time.perf_counter()
+    state = apply_moves(SOLVED, scramble)
+    elapsed = time.perf_counter() - start
+    print(facelets(state))
+    print(f"300 moves applied in {elapsed * 1e6:.0f} us")
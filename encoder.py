@@ -0,0 +1,180 @@
+# Streaming video encoders: frames go in one at a time as (height, width, 3)
+# uint8 arrays and are written out right away, so a render never keeps its
+# frame sequence in memory or on disk.
+#
+#   GifEncoder     - in-process GIF writer; the palette is built from the first
+#                    frame and reused (with a colour lookup table) for all others
+#   FfmpegEncoder  - pipes raw RGB frames into an ffmpeg process (mp4, webm, gif, ...)
+#
+# add_frame(pixels, duration) shows a frame for `duration` frame times, which
+# the GIF writer stores as the frame delay instead of repeating the image.
+import struct
+import subprocess
+
+import numpy as np
+
+
+def build_palette(pixels, size=256):
+    # the `size` most common colors of the frame, on a 5 bit per channel grid
+    bins = color_bins(pixels)
+    counts = np.bincount(bins.ravel(), minlength=1 << 15)
+    used = np.flatnonzero(counts)
+    top = used[np.argsort(counts[used])[::-1][:size]]
+    palette = np.stack([(top >> 10) & 31, (top >> 5) & 31, top & 31], axis=1) * 8 + 4
+    return palette.astype(np.uint8)
+
+
+def color_bins(pixels):
+    q = pixels.astype(np.int32) >> 3
+    return (q[..., 0] << 10) | (q[..., 1] << 5) | q[..., 2]
+
+
+def palette_lookup(palette):
+    # nearest palette index for every bin of the 5 bit per channel grid
+    bins = np.arange(1 << 15)
+    colors = np.stack([(bins >> 10) & 31, (bins >> 5) & 31, bins & 31], axis=1) * 8 + 4
+    lookup = np.empty(len(bins), dtype=np.uint8)
+    palette = palette.astype(np.int32)
+    for start in range(0, len(bins), 4096):
+        chunk = colors[start:start + 4096, None, :] - palette[None, :, :]
+        lookup[start:start + 4096] = np.argmin((chunk * chunk).sum(axis=2), axis=1)
+    return lookup
+
+
+def lzw_compress(indices, min_code_size=8):
+    # variable code length LZW as GIF expects it
+    clear = 1 << min_code_size
+    end = clear + 1
+    codes = {}
+    next_code = end + 1
+    code_size = min_code_size + 1
+    out = bytearray()
+    bits = 0
+    n_bits = 0
+
+    def emit(code):
+        nonlocal bits, n_bits
+        bits |= code << n_bits
+        n_bits += code_size
+        while n_bits >= 8:
+            out.append(bits & 255)
+            bits >>= 8
+            n_bits -= 8
+
+    emit(clear)
+    prefix = indices[0]
+    for index in indices[1:]:
+        key = prefix << 8 | index
+        code = codes.get(key)
+        if code is not None:
+            prefix = code
+            continue
+        emit(prefix)
+        # the decoder widens its codes once the next free code needs another bit
+        if next_code >= 1 << code_size and code_size < 12:
+            code_size += 1
+        if next_code < 4096:
+            codes[key] = next_code
+            next_code += 1
+        else:
+            emit(clear)
+            codes = {}
+            next_code = end + 1
+            code_size = min_code_size + 1
+        prefix = index
+    emit(prefix)
+    if next_code >= 1 << code_size and code_size < 12:
+        code_size += 1
+    emit(end)
+    if n_bits:
+        out.append(bits & 255)
+    return bytes(out)
+
+
+def sub_blocks(data):
+    blocks = bytearray()
+    for start in range(0, len(data), 255):
+        chunk = data[start:start + 255]
+        blocks.append(len(chunk))
+        blocks += chunk
+    blocks.append(0)
+    return bytes(blocks)
+
+
+class GifEncoder:
+    def __init__(self, path, fps, palette=None, loop=0):
+        self.file = open(path, "wb")
+        self.fps = fps
+        self.palette = palette
+        self.lookup = None if palette is None else palette_lookup(palette)
+        self.loop = loop
+        self.time = 0
+        self.frames = 0
+
+    def write_header(self, width, height):
+        palette = np.zeros((256, 3), dtype=np.uint8)
+        palette[:len(self.palette)] = self.palette
+        # global color table of 256 entries, shared by every frame
+        self.file.write(b"GIF89a" + struct.pack("<HHBBB", width, height, 0xF7, 0, 0) + palette.tobytes())
+        self.file.write(b"\x21\xFF\x0BNETSCAPE2.0\x03\x01" + struct.pack("<H", self.loop) + b"\x00")
+
+    def add_frame(self, pixels, duration=1):
+        height, width = pixels.shape[:2]
+        if self.frames == 0:
+            if self.palette is None:
+                self.palette = build_palette(pixels)
+                self.lookup = palette_lookup(self.palette)
+            self.write_header(width, height)
+        # delays are in 1/100 s; keep the rounding error from adding up
+        delay = round((self.time + duration) * 100 / self.fps) - round(self.time * 100 / self.fps)
+        self.time += duration
+        self.frames += 1
+        indices = self.lookup[color_bins(pixels)].ravel().tolist()
+        self.file.write(b"\x21\xF9\x04\x04" + struct.pack("<H", delay) + b"\x00\x00")
+        self.file.write(b"\x2C" + struct.pack("<HHHHB", 0, 0, width, height, 0))
+        self.file.write(b"\x08" + sub_blocks(lzw_compress(indices)))
+
+    def close(self):
+        self.file.write(b"\x3B")
+        self.file.close()
+
+
+class FfmpegEncoder:
+    def __init__(self, path, fps, ffmpeg="ffmpeg"):
+        self.path = path
+        self.fps = fps
+        self.ffmpeg = ffmpeg
+        self.process = None
+
+    def start(self, width, height):
+        command = [self.ffmpeg, "-y", "-loglevel", "error",
+                   "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-framerate", str(self.fps),
+                   "-i", "-"]
+        if self.path.endswith(".gif"):
+            # ffmpeg builds one palette for the whole clip
+            command += ["-filter_complex", "split[a][b];[a]palettegen[p];[b][p]paletteuse"]
+        else:
+            # yuv420p (what players expect) needs even dimensions
+            command += ["-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2", "-pix_fmt", "yuv420p"]
+        self.process = subprocess.Popen(command + [self.path], stdin=subprocess.PIPE)
+
+    def add_frame(self, pixels, duration=1):
+        if self.process is None:
+            self.start(pixels.shape[1], pixels.shape[0])
+        data = np.ascontiguousarray(pixels).tobytes()
+        for i in range(duration):
+            self.process.stdin.write(data)
+
+    def close(self):
+        if self.process is None:
+            return
+        self.process.stdin.close()
+        if self.process.wait():
+            raise RuntimeError(f"ffmpeg failed to write {self.path}")
+
+
+def open_encoder(path, fps, encoder="builtin", ffmpeg="ffmpeg"):
+    # GIFs are written in-process unless ffmpeg is asked for; other formats need ffmpeg
+    if path.endswith(".gif") and encoder == "builtin":
+        return GifEncoder(path, fps)
+    return FfmpegEncoder(path, fps, ffmpeg)
@@ -0,0 +1,213 @@
+# Render farm driver: shards seeds (or facelet strings) across several
+# background Blender instances running rubik.py and merges their manifests.
+#
+#   python farm.py --seeds 0:1000 --workers 16 --output renders
+#   python farm.py --facelets-file cubes.txt --workers 8 --output renders
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rubik.py")
+
+
+def parse_seeds(text):
+    if ":" in text:
+        start, stop = text.split(":")
+        return list(range(int(start), int(stop)))
+    return [int(seed) for seed in text.split(",")]
+
+
+def split_shards(items, n_shards):
+    n_shards = max(1, min(n_shards, len(items)))
+    size, extra = divmod(len(items), n_shards)
+    shards = []
+    start = 0
+    for i in range(n_shards):
+        stop = start + size + (1 if i < extra else 0)
+        shards.append(items[start:stop])
+        start = stop
+    return shards
+
+
+def read_manifest(path):
+    if not os.path.exists(path):
+        return []
+    results = []
+    with open(path) as f:
+        for line in f:
+            # a worker killed mid-write can leave a truncated last line
+            try:
+                results.append(json.loads(line))
+            except ValueError:
+                pass
+    return results
+
+
+# key of a job as recorded by rubik.py in its manifest
+def item_key(result):
+    return result["input"] if result.get("input") is not None else result["seed"]
+
+
+class Shard:
+    def __init__(self, idx, items, use_facelets, work_dir):
+        self.idx = idx
+        self.items = items
+        self.use_facelets = use_facelets
+        self.manifest = os.path.join(work_dir, f"shard_{idx}.jsonl")
+        self.log = os.path.join(work_dir, f"shard_{idx}.log")
+        self.input = os.path.join(work_dir, f"shard_{idx}.txt")
+        # consecutive attempts that finished nothing
+        self.attempts = 0
+        self.done_at_start = 0
+        self.process = None
+
+    def done(self):
+        return {item_key(result) for result in read_manifest(self.manifest)}
+
+    def remaining(self):
+        done = self.done()
+        return [item for item in self.items if item not in done]
+
+    def command(self, args):
+        # only the items that are not in the manifest yet, so retries resume
+        items = self.remaining()
+        command = [args.blender, "-b", "-noaudio"]
+        if args.threads:
+            command += ["-t", str(args.threads)]
+        command += ["-P", SCRIPT, "--", "--manifest", self.manifest]
+        # the items go through a file: a million seeds do not fit into one argument
+        with open(self.input, "w") as f:
+            f.write("\n".join(str(item) for item in items) + "\n")
+        command += ["--facelets-file" if self.use_facelets else "--seeds-file", self.input]
+        if args.output:
+            command += ["--output", args.output]
+        if args.video:
+            command += ["--video", args.video]
+        if args.encoder:
+            command += ["--encoder", args.encoder]
+        if args.export:
+            command += ["--export", args.export]
+        if args.rig:
+            command += ["--rig", args.rig]
+        if args.scramble:
+            command += ["--scramble", args.scramble]
+        if args.size:
+            command += ["--size", str(args.size)]
+        if args.template:
+            command += ["--template", args.template]
+        if args.render_profile:
+            command += ["--render-profile", args.render_profile]
+        if args.solver:
+            command += ["--solver", args.solver]
+        if args.target_length is not None:
+            command += ["--target-length", str(args.target_length)]
+        if args.solve_time is not None:
+            command += ["--solve-time", str(args.solve_time)]
+        if args.solve_nodes is not None:
+            command += ["--solve-nodes", str(args.solve_nodes)]
+        return command
+
+    def start(self, args):
+        self.done_at_start = len(self.done())
+        with open(self.log, "a") as log:
+            self.process = subprocess.Popen(self.command(args), stdout=log, stderr=subprocess.STDOUT)
+
+
+def run_farm(items, use_facelets, args):
+    work_dir = args.work_dir or os.path.join(args.output or ".", "farm")
+    os.makedirs(work_dir, exist_ok=True)
+    shards = [Shard(idx, shard_items, use_facelets, work_dir)
+              for idx, shard_items in enumerate(split_shards(items, args.shards or args.workers))]
+    pending = [shard for shard in shards if shard.remaining()]
+    running = []
+    failed = []
+    last_report = 0
+    while pending or running:
+        while pending and len(running) < args.workers:
+            shard = pending.pop(0)
+            shard.start(args)
+            running.append(shard)
+        for shard in list(running):
+            if shard.process.poll() is None:
+                continue
+            running.remove(shard)
+            if not shard.remaining():
+                continue
+            # a worker that crashed after finishing some cubes is not counted as a failed attempt
+            if len(shard.done()) > shard.done_at_start:
+                shard.attempts = 0
+            else:
+                shard.attempts += 1
+            if shard.attempts <= args.retries:
+                print(f"shard {shard.idx} exited with {shard.process.returncode}, retrying", file=sys.stderr)
+                pending.append(shard)
+            else:
+                print(f"shard {shard.idx} failed, see {shard.log}", file=sys.stderr)
+                failed.append(shard)
+        if time.time() - last_report > args.report_interval or not (pending or running):
+            done = sum(len(shard.done()) for shard in shards)
+            print(f"{done}/{len(items)} cubes done, {len(running)} workers running, {len(failed)} shards failed")
+            last_report = time.time()
+        time.sleep(0.5)
+
+    results = []
+    for shard in shards:
+        results.extend(read_manifest(shard.manifest))
+    manifest = args.manifest or os.path.join(args.output or ".", "manifest.json")
+    with open(manifest, "w") as f:
+        json.dump({"results": [result for result in results if "error" not in result],
+                   "errors": [result for result in results if "error" in result],
+                   "failed": [item for shard in failed for item in shard.remaining()]}, f, indent=1)
+    print("manifest written to", manifest)
+    return not failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Shard rubik.py renders across Blender instances")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--seeds", type=parse_seeds, help="seed range or list, e.g. 0:1000 or 1,4,9")
+    source.add_argument("--facelets-file", help="file with one facelet string per line")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Blender instances run at once")
+    parser.add_argument("--shards", type=int, default=None, help="number of shards (default: one per worker)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="render threads per Blender instance (default: the cores shared by the workers)")
+    parser.add_argument("--retries", type=int, default=2, help="times a failed shard is restarted")
+    parser.add_argument("--blender", default="blender", help="path of the Blender executable")
+    parser.add_argument("--output", default=None, help="render output directory")
+    parser.add_argument("--video", default=None, help="stream every cube into a gif, mp4 or webm file")
+    parser.add_argument("--encoder", default=None, help="builtin or ffmpeg (see rubik.py --encoder)")
+    parser.add_argument("--export", default=None, help="write playback files instead of renders (see rubik.py --export)")
+    parser.add_argument("--rig", default=None, help="objects or armature (see rubik.py --rig)")
+    parser.add_argument("--scramble", default=None, help="random-state or moves (see rubik.py --scramble)")
+    parser.add_argument("--size", type=int, default=None, help="cubies per edge (see rubik.py --size)")
+    parser.add_argument("--render-profile", default=None, help="preview, standard or final (see rubik.py --render-profile)")
+    parser.add_argument("--template", default=None, help="directory of prebuilt rig templates (see rubik.py --template)")
+    parser.add_argument("--solver", default=None, help="solver backend of the workers (see rubik.py --solver)")
+    parser.add_argument("--target-length", type=int, default=None, help="target length of the short solver")
+    parser.add_argument("--solve-time", type=float, default=None, help="seconds per cube of the short solver")
+    parser.add_argument("--solve-nodes", type=int, default=None, help="search nodes per cube of the short solver")
+    parser.add_argument("--work-dir", default=None, help="shard manifests and logs (default: <output>/farm)")
+    parser.add_argument("--manifest", default=None, help="merged manifest (default: <output>/manifest.json)")
+    parser.add_argument("--report-interval", type=float, default=10, help="seconds between progress lines")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    if args.threads is None:
+        # one Blender instance uses all cores by default
+        args.threads = max(1, (os.cpu_count() or 1) // args.workers)
+    if args.facelets_file:
+        with open(args.facelets_file) as f:
+            items = [line.strip() for line in f if line.strip()]
+        ok = run_farm(items, True, args)
+    else:
+        ok = run_farm(args.seeds, False, args)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Always-available, opt-in instrumentation of the generator: per-stage wall and
+# CPU time plus counters, written as one JSON line per cube.
+#
+# Turned on with RUBIK_PROFILE=<metrics.jsonl> or rubik.py's --profile flag.
+# When it is off, stage() hands out a shared no-op context manager and count()
+# returns immediately, so the calls can stay in the hot paths.
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+enabled = False
+metrics_path = None
+counters = {}
+stages = {}
+
+NO_STAGE = nullcontext()
+
+
+def enable(path):
+    global enabled, metrics_path
+    enabled = True
+    metrics_path = path
+
+
+def count(name, n=1):
+    if not enabled:
+        return
+    counters[name] = counters.get(name, 0) + n
+
+
+@contextmanager
+def timed_stage(name):
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        yield
+    finally:
+        record = stages.setdefault(name, {"wall": 0.0, "cpu": 0.0, "calls": 0})
+        record["wall"] += time.perf_counter() - wall
+        record["cpu"] += time.process_time() - cpu
+        record["calls"] += 1
+
+
+def stage(name):
+    if not enabled:
+        return NO_STAGE
+    return timed_stage(name)
+
+
+# write the stages and counters collected since the last flush, with `fields`
+def flush(**fields):
+    if not enabled:
+        return
+    record = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "pid": os.getpid()}
+    record.update(fields)
+    record["stages"] = dict(stages)
+    record["counters"] = dict(counters)
+    with open(metrics_path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    stages.clear()
+    counters.clear()
+
+
+if os.environ.get("RUBIK_PROFILE"):
+    enable(os.environ["RUBIK_PROFILE"])
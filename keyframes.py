@@ -0,0 +1,105 @@
+# Headless computation of the solution animation: the rotation keys of every
+# cubie, ready to be written to F-curves in one go.
+import math
+
+import cube_state
+import notation
+
+START_FRAME = 10
+FRAME_DURATION = 10  # Number of frames for each move
+PAUSE = 5
+TAIL = 30
+
+
+def matrix_to_quaternion(m):
+    # (w, x, y, z) of a rotation given as 9 row-major values
+    trace = m[0] + m[4] + m[8]
+    if trace > 0:
+        s = math.sqrt(trace + 1) * 2
+        return (s / 4, (m[7] - m[5]) / s, (m[2] - m[6]) / s, (m[3] - m[1]) / s)
+    if m[0] >= m[4] and m[0] >= m[8]:
+        s = math.sqrt(1 + m[0] - m[4] - m[8]) * 2
+        return ((m[7] - m[5]) / s, s / 4, (m[1] + m[3]) / s, (m[2] + m[6]) / s)
+    if m[4] >= m[8]:
+        s = math.sqrt(1 + m[4] - m[0] - m[8]) * 2
+        return ((m[2] - m[6]) / s, (m[1] + m[3]) / s, s / 4, (m[5] + m[7]) / s)
+    s = math.sqrt(1 + m[8] - m[0] - m[4]) * 2
+    return ((m[3] - m[1]) / s, (m[2] + m[6]) / s, (m[5] + m[7]) / s, s / 4)
+
+
+def quaternion_mul(a, b):
+    return (a[0] * b[0] - a[1] * b[1] - a[2] * b[2] - a[3] * b[3],
+            a[0] * b[1] + a[1] * b[0] + a[2] * b[3] - a[3] * b[2],
+            a[0] * b[2] - a[1] * b[3] + a[2] * b[0] + a[3] * b[1],
+            a[0] * b[3] + a[1] * b[2] - a[2] * b[1] + a[3] * b[0])
+
+
+def turn_quaternion(move, model=cube_state):
+    key, turns = notation.split(move)
+    axis, values, clockwise = model.LAYERS[key]
+    # a clockwise turn seen from the face is a negative rotation about its normal;
+    # "'" turns back by 90 degrees, a half turn is a single 180 degree rotation
+    angle = math.radians(90) * clockwise * (turns if turns < 3 else -1)
+    q = [math.cos(angle / 2), 0, 0, 0]
+    q[axis + 1] = math.sin(angle / 2)
+    return tuple(q)
+
+
+def solution_keys(state, moves, start=START_FRAME, duration=FRAME_DURATION, pause=PAUSE, model=cube_state):
+    # returns ({cubie: [(frame, quaternion, interpolation), ...]}, frame after the last
+    # pause); only the cubies a turn touches get keys, and a key that starts a hold is CONSTANT.
+    # Every move, half turns included, is one step of `duration` frames. `model` is
+    # cube_state or the nxn.Cube of other sizes.
+    poses = {cubie: matrix_to_quaternion(cube_state.ROTATIONS[orient])
+             for cubie, orient in zip(*state)}
+    keys = {}
+    frame = start
+    for move in moves:
+        layer = model.MOVE_TABLES[move][1]
+        turn = turn_quaternion(move, model)
+        for slot in layer:
+            cubie = state[0][slot]
+            cubie_keys = keys.setdefault(cubie, [])
+            if cubie_keys and cubie_keys[-1][0] == frame:
+                # the previous turn ends where this one starts
+                cubie_keys[-1] = (frame, poses[cubie], "LINEAR")
+            else:
+                cubie_keys.append((frame, poses[cubie], "LINEAR"))
+            poses[cubie] = quaternion_mul(turn, poses[cubie])
+            cubie_keys.append((frame + duration, poses[cubie], "CONSTANT"))
+        state = model.apply_move(state, move)
+        frame += duration + pause
+    return keys, frame
+
+
+def static_ranges(n_moves, first_frame=1, start=START_FRAME, duration=FRAME_DURATION, pause=PAUSE, tail=TAIL):
+    # (first, last) frames, inclusive, over which no cubie moves: the lead-in,
+    # the pause after every move (up to the start of the next) and the tail
+    ranges = []
+    hold_start = first_frame
+    frame = start
+    for i in range(n_moves):
+        ranges.append((hold_start, frame))
+        hold_start = frame + duration
+        frame += duration + pause
+    ranges.append((hold_start, frame + tail))
+    return ranges
+
+
+def render_groups(frames, ranges):
+    # [(frame to render, [frames that show the same image]), ...] so that every
+    # static range is rendered only once; `frames` and `ranges` are ascending
+    groups = []
+    current = None
+    ranges = iter(ranges)
+    hold = next(ranges, None)
+    for frame in frames:
+        while hold is not None and hold[1] < frame:
+            hold = next(ranges, None)
+        inside = hold if hold is not None and hold[0] <= frame else None
+        if inside is not None and inside == current:
+            groups[-1][1].append(frame)
+        else:
+            groups.append((frame, [frame]))
+        current = inside
+    return groups
@@ -0,0 +1,79 @@
+# Move algebra on the standard cube notation: parsing, inversion and
+# simplification of move sequences.
+#
+# A move is kept as its canonical string, a key followed by "", "2" or "'":
+# faces U R F D L B, wide moves Uw ... Bw (also written u ... b), slices M E S
+# and cube rotations x y z, as listed in cube_state.LAYERS, and the inner layers
+# 2R ... 6U of bigger cubes (nxn). Solver output and scrambles go through
+# parse(), so every move sequence has this one form.
+import re
+
+import cube_state
+
+SUFFIXES = {1: "", 2: "2", 3: "'"}
+TURNS = {"": 1, "2": 2, "'": 3, "2'": 2, "'2": 2, "3": 3}
+
+TOKEN = re.compile(r"\s*([URFDLB]w|[2-9][URF]|[URFDLBMESxyz]|[urfdlb])(2'|'2|2|3|'|)\s*")
+
+
+def split(move):
+    # "Rw'" -> ("Rw", 3): the key and its clockwise quarter turns
+    key = move.rstrip("2'")
+    return key, TURNS[move[len(key):]]
+
+
+def join(key, turns):
+    # inverse of split(); None when the turns add up to nothing
+    turns %= 4
+    return key + SUFFIXES[turns] if turns else None
+
+
+def parse(text):
+    # "R U2 r' M2 x" (spaces optional, ’ accepted for ') -> list of canonical moves
+    text = text.replace("’", "'")
+    moves = []
+    position = 0
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if match is None:
+            if text[position:].strip():
+                raise ValueError(f"cannot parse move at {text[position:]!r}")
+            break
+        key, suffix = match.groups()
+        if key.islower() and key in "urfdlb":
+            key = key.upper() + "w"
+        moves.append(key + SUFFIXES[TURNS[suffix]])
+        position = match.end()
+    return moves
+
+
+def invert(moves):
+    result = []
+    for move in reversed(moves):
+        key, turns = split(move)
+        result.append(join(key, -turns))
+    return result
+
+
+def simplify(moves, layers=cube_state.LAYERS):
+    # merge turns of the same layers and drop the ones that cancel; moves on
+    # one axis commute, so R L R' becomes L and U D2 U becomes U2 D2. `layers`
+    # is the LAYERS table of the cube size (nxn)
+    result = []
+    for move in moves:
+        key, turns = split(move)
+        axis = layers[key][0]
+        i = len(result)
+        while i > 0 and layers[split(result[i - 1])[0]][0] == axis:
+            i -= 1
+            other, other_turns = split(result[i])
+            if other == key:
+                merged = join(key, turns + other_turns)
+                if merged is None:
+                    del result[i]
+                else:
+                    result[i] = merged
+                break
+        else:
+            result.append(move)
+    return result
@@ -0,0 +1,434 @@
+# Headless model and solver of N x N x N cubes (2 to 7), the generalization of
+# cube_state to other sizes.
+#
+# Cubie centres sit at the odd or even coordinates -(N-1), ..., N-1 (steps of
+# 2, so the 3x3 uses -2, 0, 2 like cube_state) and only the N^3 - (N-2)^3
+# cubies on the outside exist. Moves are the six faces plus inner layers named
+# after the R, U or F side they are counted from: "2R" is the layer next to R,
+# "3U'" the third layer from U turned counter-clockwise.
+#
+# The solver reduces the cube to a 3x3: the corners (and on odd sizes the middle
+# edges and centres) are solved as a 3x3 by the 3x3 solver, inner layers fix the
+# parity of the edge wing orbits, and the centre and wing pieces are then put in
+# place with commutators that cycle three pieces and leave everything else alone.
+import itertools
+import random
+
+import numpy as np
+
+import cube_state
+import notation
+from cube_state import FACE_COLORS, NORMALS, ROTATIONS, ROTATION_INDEX, ROTATION_MUL, COLOR_OF
+from cube_state import face_rotation, mat_vec, permutation_parity, transpose
+
+SIZES = range(2, 8)
+# faces inner layers are counted from, with the sign of their layer value
+LAYER_FACES = {0: ('R', 1), 1: ('F', -1), 2: ('U', 1)}
+
+
+class Cube:
+    def __init__(self, size):
+        if size not in SIZES:
+            raise ValueError(f"cube size must be between {SIZES[0]} and {SIZES[-1]}, got {size}")
+        self.SIZE = size
+        self.EXTENT = extent = size - 1
+        self.COORDS = tuple(range(-extent, extent + 1, 2))
+        self.POSITIONS = tuple(position for position in itertools.product(self.COORDS, repeat=3)
+                               if max(abs(c) for c in position) == extent)
+        self.SLOT_OF = {position: slot for slot, position in enumerate(self.POSITIONS)}
+        self.LAYER_SLOTS = {(axis, value): tuple(slot for slot, position in enumerate(self.POSITIONS)
+                                                 if position[axis] == value)
+                            for axis in range(3) for value in self.COORDS}
+        self.LAYERS = self.build_layers()
+        self.MOVE_TABLES = {}
+        for key, (axis, values, clockwise) in self.LAYERS.items():
+            for suffix, turns in (("", 1), ("2", 2), ("'", -1)):
+                self.MOVE_TABLES[key + suffix] = self.move_table(axis, values, clockwise * turns)
+        self.MOVES = tuple(move for move in self.MOVE_TABLES if move[0] in "URFDLB")
+        self.SOLVED = (tuple(range(len(self.POSITIONS))), (0,) * len(self.POSITIONS))
+        self.FACELET_SLOTS = self.facelet_slots()
+        self.STICKER_MOVES = self.sticker_moves()
+
+    def build_layers(self):
+        # key -> (axis, layer values, sign of a clockwise turn), as cube_state.LAYERS
+        layers = {}
+        for face, (axis, value) in cube_state.FACE_LAYERS.items():
+            value = value // 2 * self.EXTENT
+            layers[face] = (axis, (value,), -1 if value > 0 else 1)
+        for axis, (face, sign) in LAYER_FACES.items():
+            for k in range(2, self.SIZE):
+                value = sign * (self.EXTENT - 2 * (k - 1))
+                layers[f"{k}{face}"] = (axis, (value,), layers[face][2])
+        return layers
+
+    def move_table(self, axis, values, quarter_turns):
+        rotation = face_rotation(axis, quarter_turns)
+        inverse = transpose(rotation)
+        layer = tuple(slot for slot, position in enumerate(self.POSITIONS) if position[axis] in values)
+        source = list(range(len(self.POSITIONS)))
+        for slot in layer:
+            source[slot] = self.SLOT_OF[mat_vec(inverse, self.POSITIONS[slot])]
+        return tuple(source), layer, ROTATION_INDEX[rotation]
+
+    def apply_move(self, state, move):
+        source, layer, rotation = self.MOVE_TABLES[move]
+        cubies, orients = state
+        new_cubies = list(cubies)
+        new_orients = list(orients)
+        mul = ROTATION_MUL[rotation]
+        for slot in layer:
+            new_cubies[slot] = cubies[source[slot]]
+            new_orients[slot] = mul[orients[source[slot]]]
+        return tuple(new_cubies), tuple(new_orients)
+
+    def apply_moves(self, state, moves):
+        for move in moves:
+            state = self.apply_move(state, move)
+        return state
+
+    def random_moves(self, n, rng=random):
+        # all layers, so the inner pieces get scrambled too
+        moves = tuple(self.MOVE_TABLES)
+        return [rng.choice(moves) for i in range(n)]
+
+    def cubie_poses(self, state):
+        cubies, orients = state
+        for slot, cubie in enumerate(cubies):
+            rotation = ROTATIONS[orients[slot]]
+            yield self.POSITIONS[cubie], self.POSITIONS[slot], (rotation[0:3], rotation[3:6], rotation[6:9])
+
+    # --- facelets --------------------------------------------------------------
+
+    def facelet_slots(self):
+        # (slot, normal index) of the 6 N^2 stickers, face by face in the
+        # U-R-F-D-L-B order and row/column directions of cube_state.facelet_slots
+        axes = {'U': (1, 0), 'R': (2, 1), 'F': (2, 0), 'D': (1, 0), 'L': (2, 1), 'B': (2, 0)}
+        signs = {'U': (-1, 1), 'R': (-1, 1), 'F': (-1, 1), 'D': (1, 1), 'L': (-1, -1), 'B': (-1, -1)}
+        stickers = []
+        for normal_idx, face in enumerate("URFDLB"):
+            axis, (value,) = self.LAYERS[face][:2]
+            row_axis, col_axis = axes[face]
+            row_sign, col_sign = signs[face]
+            for row in self.COORDS:
+                for col in self.COORDS:
+                    position = [0, 0, 0]
+                    position[axis] = value
+                    position[row_axis] = row * row_sign
+                    position[col_axis] = col * col_sign
+                    stickers.append((self.SLOT_OF[tuple(position)], normal_idx))
+        return tuple(stickers)
+
+    def facelets(self, state):
+        orients = state[1]
+        return "".join(COLOR_OF[orients[slot]][normal] for slot, normal in self.FACELET_SLOTS)
+
+    def sticker_moves(self):
+        # move -> index array `perm` with new_stickers = old_stickers[perm]
+        index = {(self.POSITIONS[slot], NORMALS[normal]): i for i, (slot, normal) in enumerate(self.FACELET_SLOTS)}
+        moves = {}
+        for move, (source, layer, rotation_idx) in self.MOVE_TABLES.items():
+            rotation = ROTATIONS[rotation_idx]
+            layer = set(layer)
+            perm = np.arange(len(self.FACELET_SLOTS))
+            for i, (slot, normal) in enumerate(self.FACELET_SLOTS):
+                if slot in layer:
+                    perm[index[mat_vec(rotation, self.POSITIONS[slot]), mat_vec(rotation, NORMALS[normal])]] = i
+            moves[move] = perm
+        return moves
+
+    def kociemba_facelets(self, state):
+        return self.facelets(state).translate(str.maketrans(FACE_COLORS, "URFDLB"))
+
+    def home_colors(self, cubie):
+        # {normal index: color} of the stickers of a cubie in the solved cube
+        position = self.POSITIONS[cubie]
+        return {i: FACE_COLORS[i] for i, normal in enumerate(NORMALS)
+                if sum(p * n for p, n in zip(position, normal)) == self.EXTENT}
+
+    def from_facelets(self, colors):
+        # rebuild a state from a U-R-F-D-L-B color string; of the centre pieces
+        # of one color, which one sits where is arbitrary
+        if len(colors) != len(self.FACELET_SLOTS):
+            raise ValueError(f"expected {len(self.FACELET_SLOTS)} facelets, got {len(colors)}")
+        seen = {}
+        for (slot, normal), color in zip(self.FACELET_SLOTS, colors):
+            if color not in FACE_COLORS:
+                raise ValueError(f"unknown color {color!r}")
+            seen.setdefault(slot, {})[normal] = color
+        by_colors = {}
+        for cubie in range(len(self.POSITIONS)):
+            by_colors.setdefault(frozenset(self.home_colors(cubie).values()), []).append(cubie)
+        cubies = [None] * len(self.POSITIONS)
+        orients = [0] * len(self.POSITIONS)
+        used = set()
+        for slot, stickers in seen.items():
+            position = self.POSITIONS[slot]
+            for cubie in by_colors.get(frozenset(stickers.values()), ()):
+                if cubie in used:
+                    continue
+                rotation = self.placing_rotation(cubie, position, stickers)
+                if rotation is not None:
+                    break
+            else:
+                raise ValueError(f"impossible cubie colors at {position}")
+            used.add(cubie)
+            cubies[slot] = cubie
+            orients[slot] = rotation
+        return tuple(cubies), tuple(orients)
+
+    def placing_rotation(self, cubie, position, stickers):
+        # index of a rotation that takes the cubie from home to `position`
+        # showing `stickers` ({normal index: color}), or None
+        home = self.POSITIONS[cubie]
+        colors = self.home_colors(cubie)
+        for idx, rotation in enumerate(ROTATIONS):
+            if mat_vec(rotation, home) != position:
+                continue
+            if all(stickers.get(NORMALS.index(mat_vec(rotation, NORMALS[normal]))) == color
+                   for normal, color in colors.items()):
+                return idx
+        return None
+
+
+_models = {}
+
+
+def model(size):
+    # the 3x3 keeps the cube_state module (which also models the hidden core)
+    if size == 3:
+        return cube_state
+    if size not in _models:
+        _models[size] = Cube(size)
+    return _models[size]
+
+
+# --- scrambles ---------------------------------------------------------------
+
+# a seed scrambles the 3x3 into a uniformly random state ("random-state") or
+# with N_ROTATIONS turns drawn from SCRAMBLE_MOVES ("moves"); other sizes always
+# get N_ROTATIONS random moves of all their layers
+SCRAMBLES = ("random-state", "moves")
+SCRAMBLE_MOVES = tuple(notation.parse("F R U B L D F' R' U' B' L' D'"))
+N_ROTATIONS = 300
+
+
+def scrambled_state(seed, size=3, scramble="random-state"):
+    # the state rubik.py poses and analytics.py solves for `seed`
+    rng = random.Random(seed)
+    cube = model(size)
+    if cube is not cube_state:
+        return cube.apply_moves(cube.SOLVED, cube.random_moves(N_ROTATIONS, rng))
+    if scramble == "random-state":
+        return cube_state.random_state(rng)
+    return cube_state.apply_moves(cube_state.SOLVED, [rng.choice(SCRAMBLE_MOVES) for i in range(N_ROTATIONS)])
+
+
+# --- solver ------------------------------------------------------------------
+
+def reduced_facelets(cube, state):
+    # kociemba facelets of the 3x3 made of the corners and (odd sizes) middle
+    # edges and centres; on even sizes its edges and centres are solved. Colors
+    # are named after the face whose centre has them, so odd cubes whose middle
+    # layers were turned solve into their own color scheme.
+    n = cube.SIZE
+    colors = cube.facelets(state)
+    rows = (0, n // 2, n - 1)
+    if n % 2:
+        centres = {colors[f * n * n + rows[1] * n + rows[1]]: face for f, face in enumerate("URFDLB")}
+    else:
+        centres = dict(zip(FACE_COLORS, "URFDLB"))
+    result = []
+    for f, face in enumerate("URFDLB"):
+        for r in range(3):
+            for c in range(3):
+                if n % 2 == 0 and 1 in (r, c):
+                    result.append(face)
+                else:
+                    result.append(centres[colors[f * n * n + rows[r] * n + rows[c]]])
+    return "".join(result)
+
+
+def sticker_kinds(cube):
+    # per sticker: "corner", "midge", "wing", "fixed" (middle centre) or "centre"
+    kinds = []
+    for slot, normal in cube.FACELET_SLOTS:
+        inner = [c for c in cube.POSITIONS[slot] if abs(c) != cube.EXTENT]
+        if len(inner) == 0:
+            kinds.append("corner")
+        elif len(inner) == 1:
+            kinds.append("midge" if inner[0] == 0 else "wing")
+        else:
+            kinds.append("fixed" if inner == [0, 0] else "centre")
+    return kinds
+
+
+def partners(cube):
+    # the other sticker of the same edge piece, or the sticker itself
+    by_slot = {}
+    for i, (slot, normal) in enumerate(cube.FACELET_SLOTS):
+        by_slot.setdefault(slot, []).append(i)
+    partner = list(range(len(cube.FACELET_SLOTS)))
+    for stickers in by_slot.values():
+        if len(stickers) == 2:
+            partner[stickers[0]], partner[stickers[1]] = stickers[1], stickers[0]
+    return partner
+
+
+def inverse_move(move):
+    return notation.invert([move])[0]
+
+
+def base_cycles(cube):
+    # one pure 3-cycle (commutator [a b a', c]) for every orbit of centre and
+    # wing pieces: {root sticker of the orbit: (sticker cycle, moves)}
+    n_stickers = len(cube.FACELET_SLOTS)
+    kinds = sticker_kinds(cube)
+    parent = list(range(n_stickers))
+
+    def root(i):
+        while parent[i] != i:
+            i = parent[i]
+        return i
+    for perm in cube.STICKER_MOVES.values():
+        for i, j in enumerate(perm):
+            parent[root(i)] = root(int(j))
+    needed = {root(i) for i, kind in enumerate(kinds) if kind in ("centre", "wing")}
+    found = {}
+    identity = np.arange(n_stickers)
+    moves = tuple(cube.STICKER_MOVES)
+    inverse = {move: np.argsort(perm) for move, perm in cube.STICKER_MOVES.items()}
+    for a in moves:
+        for b in moves:
+            if cube.LAYERS[notation.split(a)[0]][0] == cube.LAYERS[notation.split(b)[0]][0]:
+                continue
+            x = cube.STICKER_MOVES[a][cube.STICKER_MOVES[b]][inverse[a]]
+            x_inverse = np.argsort(x)
+            for c in moves:
+                perm = x[cube.STICKER_MOVES[c]][x_inverse][inverse[c]]
+                moved = np.flatnonzero(perm != identity)
+                if len(moved) not in (3, 6) or root(int(moved[0])) not in needed:
+                    continue
+                if len({cube.FACELET_SLOTS[i][0] for i in moved}) != 3:
+                    continue
+                forward = np.argsort(perm)
+                start = int(moved[0])
+                cycle = (start, int(forward[start]), int(forward[forward[start]]))
+                if int(forward[cycle[2]]) != start:
+                    continue
+                sequence = (a, b, inverse_move(a), c, a, inverse_move(b), inverse_move(a), inverse_move(c))
+                found[root(start)] = (cycle, sequence)
+                needed.discard(root(start))
+                if not needed:
+                    return found
+    if needed:
+        raise RuntimeError(f"no 3-cycle found for some pieces of the {cube.SIZE}x{cube.SIZE}")
+    return found
+
+
+def canonical(cycle):
+    i = cycle.index(min(cycle))
+    return cycle[i:] + cycle[:i]
+
+
+_cycles = {}
+
+
+def cycle_library(size):
+    # every pure 3-cycle of centre and wing stickers reachable by conjugating the
+    # base cycles, as {target sticker: {source sticker: [(third sticker, moves)]}}:
+    # the moves take the piece at source to target, target to third and third
+    # to source
+    if size in _cycles:
+        return _cycles[size]
+    cube = model(size)
+    forward = {move: np.argsort(perm).tolist() for move, perm in cube.STICKER_MOVES.items()}
+    partner = partners(cube)
+    seen = {}
+    queue = []
+    for cycle, sequence in base_cycles(cube).values():
+        # both sticker cycles of a wing 3-cycle
+        for start in {cycle, tuple(partner[i] for i in cycle)}:
+            if canonical(start) not in seen:
+                seen[canonical(start)] = sequence
+                queue.append(start)
+    # breadth first, so every cycle keeps its shortest setup
+    for cycle in queue:
+        sequence = seen[canonical(cycle)]
+        for move, image in forward.items():
+            new = tuple(image[i] for i in cycle)
+            if canonical(new) not in seen:
+                seen[canonical(new)] = (inverse_move(move),) + sequence + (move,)
+                queue.append(new)
+    library = {}
+    for (a, b, c), sequence in seen.items():
+        for x, y, z in ((a, b, c), (b, c, a), (c, a, b)):
+            library.setdefault(y, {}).setdefault(x, []).append((z, sequence))
+    _cycles[size] = library
+    return library
+
+
+def solve(state, solve3, size):
+    # moves that solve `state` of a size x size cube; `solve3` solves 3x3
+    # kociemba facelets (a solver backend)
+    cube = model(size)
+    moves = []
+    if size % 2 == 0:
+        # corners alone may be an odd permutation, which the 3x3 with solved
+        # edges cannot have
+        corners = [slot for slot, position in enumerate(cube.POSITIONS)
+                   if all(abs(c) == cube.EXTENT for c in position)]
+        if permutation_parity([corners.index(state[0][slot]) for slot in corners]):
+            moves.append("U")
+    moves += notation.parse(solve3(reduced_facelets(cube, cube.apply_moves(state, moves))))
+    state = cube.apply_moves(state, moves)
+
+    # an inner layer quarter turn swaps the parity of its wing orbit
+    for value in range(1 + size % 2, cube.EXTENT, 2):
+        wings = [slot for slot, position in enumerate(cube.POSITIONS)
+                 if sorted(abs(c) for c in position) == [value, cube.EXTENT, cube.EXTENT]]
+        if permutation_parity([wings.index(state[0][slot]) for slot in wings]):
+            layer = next(key for key, (axis, values, sign) in cube.LAYERS.items() if axis == 0 and values == (value,))
+            moves.append(layer)
+            state = cube.apply_move(state, layer)
+
+    moves += place_pieces(cube, cube.facelets(state))
+    return notation.simplify(moves, cube.LAYERS)
+
+
+def place_pieces(cube, colors):
+    # solve centres and wings with pure 3-cycles, greedily taking the one that
+    # solves most pieces per move
+    n = cube.SIZE
+    colors = list(colors)
+    centres = [colors[f * n * n + n * n // 2] if n % 2 else FACE_COLORS[f] for f in range(6)]
+    want = [centres[i // (n * n)] for i in range(len(colors))]
+    partner = partners(cube)
+    library = cycle_library(n)
+
+    def fits(i, j):
+        # the piece at sticker i belongs at sticker j
+        return colors[i] == want[j] and colors[partner[i]] == want[partner[j]]
+
+    moves = []
+    while True:
+        best = None
+        for y, sources in library.items():
+            if fits(y, y):
+                continue
+            for x, options in sources.items():
+                if not fits(x, y) or fits(x, x):
+                    continue
+                for z, sequence in options:
+                    gain = 1 + fits(y, z) + fits(z, x) - fits(z, z)
+                    if best is None or (gain, -len(sequence)) > best[0]:
+                        best = ((gain, -len(sequence)), (x, y, z), sequence)
+            if best is not None and best[0][0] == 3:
+                break
+        if best is None:
+            return moves
+        (gain, length), (x, y, z), sequence = best
+        if gain <= 0:
+            raise RuntimeError("centres and wings cannot be solved with 3-cycles")
+        for a, b, c in {(x, y, z), (partner[x], partner[y], partner[z])}:
+            colors[b], colors[c], colors[a] = colors[a], colors[b], colors[c]
+        moves += sequence
@@ -0,0 +1,67 @@
+# Content-addressed store of rendered cubes.
+#
+# Every cube is keyed by a hash of its scrambled state, its solution and the
+# rig/render settings, and rendered into <root>/cubes/<key[:2]>/<key>[.ext].
+# <root>/stages.jsonl records the stages finished per key (one JSON line per
+# stage, appended, so several workers can share it), which lets a batch skip
+# cubes that are done, render identical requests only once and pick up a
+# partially rendered frame sequence where it stopped.
+import hashlib
+import json
+import os
+
+
+def cube_key(facelets, solution, settings):
+    data = json.dumps({"facelets": facelets.upper(), "solution": solution, "settings": settings}, sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()[:32]
+
+
+def missing_frames(frames, frame_path):
+    # the frames an interrupted render still has to write; frames are renamed
+    # into place when complete, so the ones on disk are finished
+    return [frame for frame in frames if not os.path.exists(frame_path(frame))]
+
+
+class OutputStore:
+    def __init__(self, root):
+        self.root = root
+        self.manifest = os.path.join(root, "stages.jsonl")
+        self.stages = {}
+        self.offset = 0
+        os.makedirs(root, exist_ok=True)
+        self.reload()
+
+    def reload(self):
+        # pick up the stages other workers finished since the last read
+        if not os.path.exists(self.manifest):
+            return
+        with open(self.manifest, "rb") as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # still being written, read it next time
+                    break
+                self.offset += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # truncated by a killed worker
+                    continue
+                self.stages.setdefault(record["key"], {})[record["stage"]] = record
+
+    def path(self, key, extension=""):
+        directory = os.path.join(self.root, "cubes", key[:2])
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, key + extension)
+
+    def done(self, key, stage):
+        if stage not in self.stages.get(key, {}):
+            self.reload()
+        return stage in self.stages.get(key, {})
+
+    def record(self, key, stage, **fields):
+        record = {"key": key, "stage": stage}
+        record.update(fields)
+        self.stages.setdefault(key, {})[stage] = record
+        with open(self.manifest, "a") as f:
+            f.write(json.dumps(record) + "\n")
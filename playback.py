@@ -0,0 +1,96 @@
+# Playback files: everything needed to show a solution without rendering it.
+#
+# A file holds the cube size, the scrambled state, its facelets, the solution
+# moves and the rotation keys of every cubie the solution turns (as computed by
+# keyframes.solution_keys for the bulk animation backend). rubik.py writes them
+# with --export and rebuilds the Blender animation from one with
+# --import-animation; a web viewer only has to interpolate the quaternions.
+#
+#   .json  - readable JSON, quaternions rounded to 6 decimals
+#   other  - MAGIC, a little-endian uint32 header length, the JSON header
+#            (everything but the keys, plus the cubie ids and key counts) and a
+#            zlib block of uint32 frames, float32 (w, x, y, z) quaternions and
+#            one interpolation byte per key; a 3x3 solution takes a few KB
+import json
+import os
+import struct
+import zlib
+
+import cube_state
+import keyframes
+
+MAGIC = b"RUBIKANM"
+VERSION = 1
+INTERPOLATIONS = ("LINEAR", "CONSTANT")
+
+
+def animation(state, moves, facelets, model=cube_state, fps=24):
+    keys, frame = keyframes.solution_keys(state, moves, model=model)
+    return {"version": VERSION, "size": model.SIZE, "fps": fps,
+            "timing": [keyframes.START_FRAME, keyframes.FRAME_DURATION, keyframes.PAUSE, keyframes.TAIL],
+            "frame_end": frame + keyframes.TAIL, "facelets": facelets, "solution": list(moves),
+            "state": [list(state[0]), list(state[1])], "keys": keys}
+
+
+def save(path, data):
+    # write next to the target and rename, so readers never see half a file
+    partial = path + ".part"
+    if path.endswith(".json"):
+        document = dict(data, keys={str(cubie): [[frame, [round(q, 6) for q in quaternion], interpolation]
+                                                 for frame, quaternion, interpolation in cubie_keys]
+                                    for cubie, cubie_keys in data["keys"].items()})
+        with open(partial, "w") as f:
+            json.dump(document, f, separators=(",", ":"))
+    else:
+        with open(partial, "wb") as f:
+            f.write(encode(data))
+    os.replace(partial, path)
+
+
+def encode(data):
+    cubies = sorted(data["keys"])
+    all_keys = [key for cubie in cubies for key in data["keys"][cubie]]
+    header = {name: value for name, value in data.items() if name != "keys"}
+    header.update(cubies=cubies, counts=[len(data["keys"][cubie]) for cubie in cubies])
+    header = json.dumps(header, separators=(",", ":")).encode()
+    n = len(all_keys)
+    block = (struct.pack(f"<{n}I", *(frame for frame, quaternion, interpolation in all_keys))
+             + struct.pack(f"<{4 * n}f", *(q for frame, quaternion, interpolation in all_keys for q in quaternion))
+             + bytes(INTERPOLATIONS.index(interpolation) for frame, quaternion, interpolation in all_keys))
+    return MAGIC + struct.pack("<I", len(header)) + header + zlib.compress(block, 9)
+
+
+def decode(blob):
+    (length,) = struct.unpack_from("<I", blob, len(MAGIC))
+    start = len(MAGIC) + 4
+    data = json.loads(blob[start:start + length])
+    block = zlib.decompress(blob[start + length:])
+    n = sum(data["counts"])
+    frames = struct.unpack_from(f"<{n}I", block)
+    values = struct.unpack_from(f"<{4 * n}f", block, 4 * n)
+    interpolations = block[20 * n:]
+    keys = {}
+    i = 0
+    for cubie, count in zip(data.pop("cubies"), data.pop("counts")):
+        keys[cubie] = [(frames[k], values[4 * k:4 * k + 4], INTERPOLATIONS[interpolations[k]])
+                       for k in range(i, i + count)]
+        i += count
+    data["keys"] = keys
+    return data
+
+
+def load(path):
+    # the data of save(), keys as {cubie: [(frame, quaternion, interpolation), ...]}
+    with open(path, "rb") as f:
+        blob = f.read()
+    if blob.startswith(MAGIC):
+        data = decode(blob)
+    else:
+        data = json.loads(blob)
+        data["keys"] = {int(cubie): [(frame, tuple(quaternion), interpolation)
+                                     for frame, quaternion, interpolation in cubie_keys]
+                        for cubie, cubie_keys in data["keys"].items()}
+    if data.get("version") != VERSION:
+        raise ValueError(f"{path}: unsupported playback file version {data.get('version')}")
+    data["state"] = (tuple(data["state"][0]), tuple(data["state"][1]))
+    return data
@@ -1,15 +1,46 @@
 import bpy
-import random
+import hashlib
+import inspect
+import json
+import os
+import sys
 import math
-from mathutils import Vector, Matrix, Quaternion
-import kociemba
+import shutil
+import tempfile
+import numpy as np
+import bmesh
+from mathutils import Vector, Matrix
+
+# make the helper modules next to this script importable from inside Blender
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import cube_state
+import encoder
+import instrument
+import keyframes
+import notation
+import nxn
+import output_store
+import playback
+import solver
+import solver_cache
+
+
+# object name of the cubie whose solved position is `position`
+def cubie_name(position):
+    return " ".join(str(c // 2) for c in position)
+
 
 # A function that deletes all objects before creating the cube
 def setup_scene():
-    bpy.ops.object.mode_set(mode='OBJECT')
+    # without an active object (an emptied scene) there is no mode to leave
+    if bpy.ops.object.mode_set.poll():
+        instrument.count("bpy_ops")
+        bpy.ops.object.mode_set(mode='OBJECT')
     # Select all objects in the scene
+    instrument.count("bpy_ops")
     bpy.ops.object.select_all(action='SELECT')
     # Delete all selected objects
+    instrument.count("bpy_ops")
     bpy.ops.object.delete()
     # delete meshes
     for item in bpy.data.meshes:
@@ -23,14 +54,134 @@ def setup_scene():
         bpy.data.materials.remove(material)
 
 
-def create_cubes(collection):
-    for x in range(-1, 2):
-        for y in range(-1, 2):
-            for z in range(-1, 2):
-                bpy.ops.mesh.primitive_cube_add(location=(x * 2, y * 2, z * 2))
-                obj = bpy.context.active_object
-                obj.name = f"{x} {y} {z}"
-                collection.objects.link(obj)
+# materials of the six faces in U-R-F-D-L-B order (see cube_state.FACE_COLORS)
+FACE_MATERIALS = ("yellow", "green", "red", "white", "blue", "orange")
+BEVEL_OFFSET = 0.148376
+BEVEL_SEGMENTS = 2
+
+
+# one beveled cube shared by all cubies; material slot i is the face with
+# outward normal cube_state.NORMALS[i], bevel polygons take the nearest face.
+# 0 segments leaves the edges sharp
+def create_cubie_mesh(segments=BEVEL_SEGMENTS):
+    bm = bmesh.new()
+    bmesh.ops.create_cube(bm, size=2)
+    if segments:
+        bmesh.ops.bevel(bm, geom=bm.verts[:] + bm.edges[:], offset=BEVEL_OFFSET, offset_type='OFFSET',
+                        segments=segments, profile=0.5, affect='EDGES')
+    mesh = bpy.data.meshes.new("cubie")
+    bm.to_mesh(mesh)
+    bm.free()
+    n = len(mesh.polygons)
+    normals = np.empty(n * 3, dtype=np.float32)
+    mesh.polygons.foreach_get("normal", normals)
+    directions = np.array(cube_state.NORMALS, dtype=np.float32)
+    material_idx = (normals.reshape(n, 3) @ directions.T).argmax(axis=1).astype(np.int32)
+    mesh.polygons.foreach_set("material_index", material_idx)
+    mesh.polygons.foreach_set("use_smooth", np.ones(n, dtype=bool))
+    for i in range(len(FACE_MATERIALS)):
+        mesh.materials.append(bpy.data.materials.get("black"))
+    return mesh
+
+
+# material of every face of the cubie at `position`: its color if the face is on
+# the outside of a cube whose outer layers are at +-extent
+def sticker_materials(position, extent=cube_state.EXTENT):
+    return [FACE_MATERIALS[i] if sum(p * n for p, n in zip(position, normal)) == extent else "black"
+            for i, normal in enumerate(cube_state.NORMALS)]
+
+
+# headless model of the cube in the collection: cube_state, or nxn.Cube for other sizes
+def cube_model(collection):
+    return nxn.model(collection.get("size", 3))
+
+
+# the cubies that can be seen; the hidden core of N^3 - (N-2)^3 is never created
+def visible_positions(model):
+    return [position for position in model.POSITIONS if max(abs(c) for c in position) == model.EXTENT]
+
+
+# every cubie is an object using the shared mesh, parented to an empty at the
+# world origin (its pivot) that carries the rotation of the cubie
+def create_cubes(collection, pivots, mesh, model=cube_state):
+    for position in visible_positions(model):
+        pivot = bpy.data.objects.new(cubie_name(position) + " pivot", None)
+        pivot.empty_display_size = 0.2
+        pivot.rotation_mode = "QUATERNION"
+        pivots.objects.link(pivot)
+        obj = bpy.data.objects.new(cubie_name(position), mesh)
+        obj.location = position
+        obj.parent = pivot
+        collection.objects.link(obj)
+        # the materials live on the object, the mesh stays shared
+        for slot, material in zip(obj.material_slots, sticker_materials(position, model.EXTENT)):
+            slot.link = 'OBJECT'
+            slot.material = bpy.data.materials.get(material)
+
+
+# alternative rig: all cubies joined into one mesh, deformed by an armature with
+# one bone per cubie, so the whole solution is keyed in a single action
+def create_armature_rig(collection, template, model=cube_state):
+    count = len(template.vertices)
+    co = np.empty(count * 3, dtype=np.float32)
+    template.vertices.foreach_get("co", co)
+    # same size as resize_cube
+    co = co.reshape(count, 3) * 0.99
+    polygons = [tuple(polygon.vertices) for polygon in template.polygons]
+    face_idx = np.empty(len(polygons), dtype=np.int32)
+    template.polygons.foreach_get("material_index", face_idx)
+
+    materials = ["black"] + list(FACE_MATERIALS)
+    vertices = []
+    faces = []
+    material_idx = []
+    positions = visible_positions(model)
+    for k, position in enumerate(positions):
+        vertices.append(co + np.array(position, dtype=np.float32))
+        faces.extend(tuple(v + k * count for v in polygon) for polygon in polygons)
+        names = sticker_materials(position, model.EXTENT)
+        material_idx.extend(materials.index(names[i]) for i in face_idx)
+    mesh = bpy.data.meshes.new("cube")
+    mesh.from_pydata(np.concatenate(vertices).tolist(), [], faces)
+    for name in materials:
+        mesh.materials.append(bpy.data.materials.get(name))
+    mesh.polygons.foreach_set("material_index", material_idx)
+    mesh.polygons.foreach_set("use_smooth", np.ones(len(faces), dtype=bool))
+    obj = bpy.data.objects.new("cube", mesh)
+    collection.objects.link(obj)
+
+    armature = bpy.data.armatures.new("cube_rig")
+    rig = bpy.data.objects.new("cube_rig", armature)
+    collection.objects.link(rig)
+    bpy.context.view_layer.objects.active = rig
+    instrument.count("bpy_ops")
+    bpy.ops.object.mode_set(mode='EDIT')
+    for position in positions:
+        bone = armature.edit_bones.new(cubie_name(position))
+        # a bone along +Y without roll has the world axes as its local axes,
+        # so a pose rotation is the world rotation around the origin
+        bone.head = (0, 0, 0)
+        bone.tail = (0, 0.5, 0)
+    instrument.count("bpy_ops")
+    bpy.ops.object.mode_set(mode='OBJECT')
+    for k, position in enumerate(positions):
+        group = obj.vertex_groups.new(name=cubie_name(position))
+        group.add(list(range(k * count, (k + 1) * count)), 1.0, 'REPLACE')
+    for bone in rig.pose.bones:
+        bone.rotation_mode = "QUATERNION"
+    obj.parent = rig
+    modifier = obj.modifiers.new("Armature", 'ARMATURE')
+    modifier.object = rig
+    bpy.data.meshes.remove(template)
+    return rig
+
+
+# the armature of the rig if it was built with create_armature_rig
+def rig_armature(collection):
+    for obj in collection.objects:
+        if obj.type == 'ARMATURE':
+            return obj
+    return None
 
 
 # decorator function to apply an operation to all the cubes
@@ -53,329 +204,118 @@ def create_color(name, color):
     return material
 
 
-def add_materials(obj, materials):
-    for material in materials:
-        material_bpy = bpy.data.materials.get(material)
-        obj.data.materials.append(material_bpy)
-
-
-def default_colors():
-    # red-green-yellow
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("1 -1 1")
-    add_materials(obj, ["red", "green", "yellow", "black"])
-    obj.data.polygons[0].material_index = 3
-    obj.data.polygons[1].material_index = 3
-    obj.data.polygons[2].material_index = 1
-    obj.data.polygons[3].material_index = 0
-    obj.data.polygons[4].material_index = 3
-    obj.data.polygons[5].material_index = 2
-    # red-yellow
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("0 -1 1")
-    add_materials(obj, ["red", "yellow", "black"])
-    obj.data.polygons[0].material_index = 2
-    obj.data.polygons[1].material_index = 2
-    obj.data.polygons[2].material_index = 2
-    obj.data.polygons[3].material_index = 0
-    obj.data.polygons[4].material_index = 2
-    obj.data.polygons[5].material_index = 1
-    # pure red
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("0 -1 0")
-    add_materials(obj, ["red", "black"])
-    obj.data.polygons[0].material_index = 1
-    obj.data.polygons[1].material_index = 1
-    obj.data.polygons[2].material_index = 1
-    obj.data.polygons[3].material_index = 0
-    obj.data.polygons[4].material_index = 1
-    obj.data.polygons[5].material_index = 1
-    # red-green
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("1 -1 0")
-    add_materials(obj, ["red", "green", "black"])
-    obj.data.polygons[0].material_index = 2
-    obj.data.polygons[1].material_index = 2
-    obj.data.polygons[2].material_index = 1
-    obj.data.polygons[3].material_index = 0
-    obj.data.polygons[4].material_index = 2
-    obj.data.polygons[5].material_index = 2
-    # red-blue
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("-1 -1 0")
-    add_materials(obj, ["red", "blue", "black"])
-    obj.data.polygons[0].material_index = 1
-    obj.data.polygons[1].material_index = 2
-    obj.data.polygons[2].material_index = 2
-    obj.data.polygons[3].material_index = 0
-    obj.data.polygons[4].material_index = 2
-    obj.data.polygons[5].material_index = 2
-    # red-white
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("0 -1 -1")
-    add_materials(obj, ["red", "white", "black"])
-    obj.data.polygons[0].material_index = 2
-    obj.data.polygons[1].material_index = 2
-    obj.data.polygons[2].material_index = 2
-    obj.data.polygons[3].material_index = 0
-    obj.data.polygons[4].material_index = 1
-    obj.data.polygons[5].material_index = 2
-    # red-yellow-blue
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("-1 -1 1")
-    add_materials(obj, ["red", "yellow", "blue", "black"])
-    obj.data.polygons[0].material_index = 2
-    obj.data.polygons[1].material_index = 3
-    obj.data.polygons[2].material_index = 3
-    obj.data.polygons[3].material_index = 0
-    obj.data.polygons[4].material_index = 2
-    obj.data.polygons[5].material_index = 1
-    # red-blue-white
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("-1 -1 -1")
-    add_materials(obj, ["red", "white", "blue", "black"])
-    obj.data.polygons[0].material_index = 2
-    obj.data.polygons[1].material_index = 3
-    obj.data.polygons[2].material_index = 3
-    obj.data.polygons[3].material_index = 0
-    obj.data.polygons[4].material_index = 1
-    obj.data.polygons[5].material_index = 3
-    # red-green-white
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("1 -1 -1")
-    add_materials(obj, ["red", "white", "green", "black"])
-    obj.data.polygons[0].material_index = 3
-    obj.data.polygons[1].material_index = 3
-    obj.data.polygons[2].material_index = 2
-    obj.data.polygons[3].material_index = 0
-    obj.data.polygons[4].material_index = 1
-    obj.data.polygons[5].material_index = 3
-    # green
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("1 0 0")
-    add_materials(obj, ["green", "black"])
-    obj.data.polygons[0].material_index = 1
-    obj.data.polygons[1].material_index = 1
-    obj.data.polygons[2].material_index = 0
-    obj.data.polygons[3].material_index = 1
-    obj.data.polygons[4].material_index = 1
-    obj.data.polygons[5].material_index = 1
-    # green-white
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("1 0 -1")
-    add_materials(obj, ["green", "white", "black"])
-    obj.data.polygons[0].material_index = 2
-    obj.data.polygons[1].material_index = 2
-    obj.data.polygons[2].material_index = 0
-    obj.data.polygons[3].material_index = 2
-    obj.data.polygons[4].material_index = 1
-    obj.data.polygons[5].material_index = 2
-    # yellow-green
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("1 0 1")
-    add_materials(obj, ["green", "yellow", "black"])
-    obj.data.polygons[0].material_index = 2
-    obj.data.polygons[1].material_index = 2
-    obj.data.polygons[2].material_index = 0
-    obj.data.polygons[3].material_index = 2
-    obj.data.polygons[4].material_index = 2
-    obj.data.polygons[5].material_index = 1
-    # pure yellow
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("0 0 1")
-    add_materials(obj, ["yellow", "black"])
-    obj.data.polygons[0].material_index = 1
-    obj.data.polygons[1].material_index = 1
-    obj.data.polygons[2].material_index = 1
-    obj.data.polygons[3].material_index = 1
-    obj.data.polygons[4].material_index = 1
-    obj.data.polygons[5].material_index = 0
-    # green-yellow-orange
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("1 1 1")
-    add_materials(obj, ["green", "yellow", "orange", "black"])
-    obj.data.polygons[0].material_index = 3
-    obj.data.polygons[1].material_index = 2
-    obj.data.polygons[2].material_index = 0
-    obj.data.polygons[3].material_index = 3
-    obj.data.polygons[4].material_index = 3
-    obj.data.polygons[5].material_index = 1
-    # green-orange
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("1 1 0")
-    add_materials(obj, ["green", "orange", "black"])
-    obj.data.polygons[0].material_index = 2
-    obj.data.polygons[1].material_index = 1
-    obj.data.polygons[2].material_index = 0
-    obj.data.polygons[3].material_index = 2
-    obj.data.polygons[4].material_index = 2
-    obj.data.polygons[5].material_index = 2
-    # white-orange-green
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("1 1 -1")
-    add_materials(obj, ["orange", "white", "green", "black"])
-    obj.data.polygons[0].material_index = 3
-    obj.data.polygons[1].material_index = 0
-    obj.data.polygons[2].material_index = 2
-    obj.data.polygons[3].material_index = 3
-    obj.data.polygons[4].material_index = 1
-    obj.data.polygons[5].material_index = 3
-    # yellow-orange
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("0 1 1")
-    add_materials(obj, ["orange", "yellow", "black"])
-    obj.data.polygons[0].material_index = 2
-    obj.data.polygons[1].material_index = 0
-    obj.data.polygons[2].material_index = 2
-    obj.data.polygons[3].material_index = 2
-    obj.data.polygons[4].material_index = 2
-    obj.data.polygons[5].material_index = 1
-    # orange
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("0 1 0")
-    add_materials(obj, ["orange", "black"])
-    obj.data.polygons[0].material_index = 1
-    obj.data.polygons[1].material_index = 0
-    obj.data.polygons[2].material_index = 1
-    obj.data.polygons[3].material_index = 1
-    obj.data.polygons[4].material_index = 1
-    obj.data.polygons[5].material_index = 1
-    # orange-yellow-blue
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("-1 1 1")
-    add_materials(obj, ["orange", "blue", "yellow", "black"])
-    obj.data.polygons[0].material_index = 1
-    obj.data.polygons[1].material_index = 0
-    obj.data.polygons[2].material_index = 3
-    obj.data.polygons[3].material_index = 3
-    obj.data.polygons[4].material_index = 1
-    obj.data.polygons[5].material_index = 2
-    # yellow-blue
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("-1 0 1")
-    add_materials(obj, ["blue", "yellow", "black"])
-    obj.data.polygons[0].material_index = 0
-    obj.data.polygons[1].material_index = 2
-    obj.data.polygons[2].material_index = 2
-    obj.data.polygons[3].material_index = 2
-    obj.data.polygons[4].material_index = 2
-    obj.data.polygons[5].material_index = 1
-    # blue
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("-1 0 0")
-    add_materials(obj, ["blue", "black"])
-    obj.data.polygons[0].material_index = 0
-    obj.data.polygons[1].material_index = 1
-    obj.data.polygons[2].material_index = 1
-    obj.data.polygons[3].material_index = 1
-    obj.data.polygons[4].material_index = 1
-    obj.data.polygons[5].material_index = 1
-    # orange-blue
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("-1 1 0")
-    add_materials(obj, ["blue", "orange", "black"])
-    obj.data.polygons[0].material_index = 0
-    obj.data.polygons[1].material_index = 1
-    obj.data.polygons[2].material_index = 2
-    obj.data.polygons[3].material_index = 2
-    obj.data.polygons[4].material_index = 2
-    obj.data.polygons[5].material_index = 2
-    # white
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("0 0 -1")
-    add_materials(obj, ["white", "black"])
-    obj.data.polygons[0].material_index = 1
-    obj.data.polygons[1].material_index = 1
-    obj.data.polygons[2].material_index = 1
-    obj.data.polygons[3].material_index = 1
-    obj.data.polygons[4].material_index = 0
-    obj.data.polygons[5].material_index = 1
-    # white-blue
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("-1 0 -1")
-    add_materials(obj, ["blue", "white", "black"])
-    obj.data.polygons[0].material_index = 0
-    obj.data.polygons[1].material_index = 2
-    obj.data.polygons[2].material_index = 2
-    obj.data.polygons[3].material_index = 2
-    obj.data.polygons[4].material_index = 1
-    obj.data.polygons[5].material_index = 2
-    # orange-blue-white
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("-1 1 -1")
-    add_materials(obj, ["orange", "white", "blue", "black"])
-    obj.data.polygons[0].material_index = 2
-    obj.data.polygons[1].material_index = 0
-    obj.data.polygons[2].material_index = 3
-    obj.data.polygons[3].material_index = 3
-    obj.data.polygons[4].material_index = 1
-    obj.data.polygons[5].material_index = 3
-    # orange-white
-    bpy.ops.object.select_all(action='DESELECT')
-    obj = bpy.data.objects.get("0 1 -1")
-    add_materials(obj, ["orange", "white", "black"])
-    obj.data.polygons[0].material_index = 2
-    obj.data.polygons[1].material_index = 0
-    obj.data.polygons[2].material_index = 2
-    obj.data.polygons[3].material_index = 2
-    obj.data.polygons[4].material_index = 1
-    obj.data.polygons[5].material_index = 2
-
-
 def get_bounding_box_location(obj):
     bbox_corners = [obj.matrix_world @ Vector(corner) for corner in obj.bound_box]
     geometry_center = sum(bbox_corners, Vector()) / len(bbox_corners)
     return geometry_center
 
+# lattice slot (model POSITIONS) -> cubie object of every indexed rig, kept up
+# to date by rotate(), so selecting a layer is a lookup of its slots instead of
+# a scan over the bounding boxes of all objects; hidden slots hold None
+slot_index = {}
+
+
+def index_cubes(collection, state=None):
+    model = cube_model(collection)
+    if state is None:
+        state = model.SOLVED
+    slot_index[collection.name] = [collection.objects.get(cubie_name(model.POSITIONS[cubie]))
+                                   for cubie in state[0]]
+
+
+def update_slot_index(collection, move):
+    objects = slot_index.get(collection.name)
+    if objects is None:
+        return
+    source, layer, rotation = cube_model(collection).MOVE_TABLES[move]
+    moved = [objects[source[slot]] for slot in layer]
+    for slot, obj in zip(layer, moved):
+        objects[slot] = obj
+
+
 def get_face(collection, axis, value):
+    objects = slot_index.get(collection.name)
+    if objects is not None:
+        slots = cube_model(collection).LAYER_SLOTS[(axis, round(value))]
+        instrument.count("get_face_objects", len(slots))
+        return [objects[slot] for slot in slots if objects[slot] is not None]
     epsilon = 0.1
     cubes = []
+    # the bounding boxes need the matrices of the last turn
+    bpy.context.view_layer.update()
+    instrument.count("get_face_objects", len(collection.objects))
     for obj in collection.objects:
         abs_loc = get_bounding_box_location(obj)[axis]
         if abs(abs_loc - value) < epsilon:
             cubes.append(obj)
     return cubes
 
-def select_all(object_list):
-    # Deselect all objects first
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select each object in the list
-    for obj in object_list:
-        obj.select_set(True)
-
-
-def rotate_selected (axis, angle):
-    angle_in_radians = math.radians(angle)
-    bpy.ops.transform.rotate(value=angle_in_radians, orient_axis=axis.upper())
+# the turn bpy.ops.transform.rotate would make, applied to the objects' matrices
+# directly: no operator, no selection change, so it works in any context
+def rotate_objects(objects, axis, angle):
+    # transform.rotate turns clockwise for a positive value, Matrix.Rotation counter-clockwise
+    rotation = Matrix.Rotation(math.radians(-angle), 4, axis.upper())
+    # one quaternion for the turn, composed with every cubie's (as in
+    # keyframes.solution_keys): the keys then interpolate the same way round for
+    # all cubies, also for a half turn, where make_compatible has nothing to go by
+    turn = rotation.to_quaternion()
+    for obj in objects:
+        target = pivot_of(obj)
+        if target.rotation_mode == "QUATERNION":
+            target.rotation_quaternion = turn @ target.rotation_quaternion
+            target.location = rotation @ target.location
+        else:
+            target.matrix_world = rotation @ target.matrix_world
+
+
+# turn the layers of a move ("F", "R'", "U2", "2R" on bigger cubes ...)
+def rotate(collection, rotation):
+    key, turns = notation.split(rotation)
+    axis_num, values, clockwise = cube_model(collection).LAYERS[key]
+    # rotate_objects takes transform.rotate angles, positive for a clockwise turn about +axis
+    angle = -90 * clockwise * (turns if turns < 3 else -1)
+    cubes = [cube for value in values for cube in get_face(collection, axis_num, value)]
+    rotate_objects(cubes, "xyz"[axis_num], angle)
+    update_slot_index(collection, rotation)
+    return cubes
 
 
-def rotate(collection, rotation):
-    bpy.ops.object.select_all(action='DESELECT')
-    #'F', 'R', 'U', 'B', 'L', 'D', "F'", "R'", "B'", "L'", "D'"
-    axis_dict = {'F':'y', "F'": 'y', 'B': 'y', "B'": 'y', 'L': 'x', "L'":'x', "R": 'x', "R'": "x",
-                 "U": "z", "U'": "z", "D": 'z', "D'": "z"}
-    angle_dict = {'F': -90, 'R': 90, 'U': 90, 'B': 90, 'L': -90, 'D': -90,
-                  "F'": 90, "R'": -90, "U'": -90, "B'": -90, "L'": 90, "D'": 90}
-    axis_to_num = {"x": 0, "y": 1, "z": 2}
-    values_dict = {'F':-2, "F'": -2, 'B': 2, "B'": 2, 'L': -2, "L'":-2, "R": 2, "R'": 2,
-                 "U": 2, "U'": 2, "D": -2, "D'": -2}
-    value = values_dict[rotation]
-    axis = axis_dict[rotation] #X
-    angle = angle_dict[rotation] #90
-    axis_num = axis_to_num[axis]
-    cubes = get_face(collection, axis_num, value)
-    select_all(cubes)
-    rotate_selected(axis, angle)
-    selected_objects = [obj for obj in bpy.context.selected_objects]
-    return selected_objects
-    #bpy.ops.object.transform_apply(rotation=True, scale=False, location=False)
+# the object that carries the rotation of a cubie: its pivot if it has one
+def pivot_of(obj):
+    return obj.parent if obj.parent else obj
+
+
+# put every cubie where the headless model says it is; the pivots sit at the
+# world origin, so the pose of a cubie is just the rotation of its pivot
+def pose_cubes(collection, state):
+    armature = rig_armature(collection)
+    model = cube_model(collection)
+    for home, position, rotation in model.cubie_poses(state):
+        if max(abs(c) for c in home) < model.EXTENT:
+            # the hidden core has no cubie
+            continue
+        if armature is not None:
+            armature.pose.bones[cubie_name(home)].rotation_quaternion = Matrix(rotation).to_quaternion()
+            continue
+        pivot = pivot_of(collection.objects.get(cubie_name(home)))
+        pivot.rotation_mode = "QUATERNION"
+        pivot.rotation_quaternion = Matrix(rotation).to_quaternion()
+    if armature is None:
+        index_cubes(collection, state)
+    # refresh matrix_world so the bounding boxes used by get_face are up to date
+    bpy.context.view_layer.update()
 
 def adapt_for_kociemba(color_string):
     color_string2 = color_string.replace("r", "F").replace("w", "D").replace("y", "U").replace("b", "L").replace("g", "R").replace("o", "B")
     return color_string2
 
+# inverse of adapt_for_kociemba, accepts both upper and lower case
+def adapt_from_kociemba(color_string):
+    return color_string.upper().translate(str.maketrans("FDULRB", "rwybgo"))
+
 def get_highest_face(obj):
     mesh = obj.data
+    instrument.count("polygons_visited", len(mesh.polygons))
     highest_z = -10
     highest_face = None
     for face in mesh.polygons:
@@ -392,6 +332,7 @@ def get_highest_face(obj):
 
 def get_bottom_face(obj):
     mesh = obj.data
+    instrument.count("polygons_visited", len(mesh.polygons))
     lowest_z = 10
     highest_face = None
     for face in mesh.polygons:
@@ -408,6 +349,7 @@ def get_bottom_face(obj):
 
 def get_front_face(obj):
     mesh = obj.data
+    instrument.count("polygons_visited", len(mesh.polygons))
     smallest_y = 10
     front_face = None
     for face in mesh.polygons:
@@ -426,6 +368,7 @@ def get_front_face(obj):
 
 def get_back_face(obj):
     mesh = obj.data
+    instrument.count("polygons_visited", len(mesh.polygons))
     biggest_y = -10
     back_face = None
     for face in mesh.polygons:
@@ -443,6 +386,7 @@ def get_back_face(obj):
 
 def get_right_face(obj):
     mesh = obj.data
+    instrument.count("polygons_visited", len(mesh.polygons))
     biggest_x = -10
     front_face = None
     for face in mesh.polygons:
@@ -461,6 +405,7 @@ def get_right_face(obj):
 
 def get_left_face(obj):
     mesh = obj.data
+    instrument.count("polygons_visited", len(mesh.polygons))
     smallest_x = 10
     front_face = None
     for face in mesh.polygons:
@@ -477,6 +422,8 @@ def get_left_face(obj):
     return front_face
 
 def get_color_string(collection):
+    # rotate() does not update the depsgraph; the matrices are read once here
+    bpy.context.view_layer.update()
     faces = ""
     upper_face = ""
     lower_face = ""
@@ -489,7 +436,7 @@ def get_color_string(collection):
     # Sort cubes by y-coordinate first (row by row)
     #top_cubes.sort(key=lambda o: -o.location.y)
     #top_cubes.sort(key=lambda o: o.location.x)
-    top_cubes_sorted = sorted(top_cubes, key=lambda obj: (-round(obj.location.y, 2), round(obj.location.x, 2)))
+    top_cubes_sorted = sorted(top_cubes, key=lambda obj: (-round(get_bounding_box_location(obj).y, 2), round(get_bounding_box_location(obj).x, 2)))
     for cube in top_cubes_sorted:
         top_face = get_highest_face(cube)
         face_color_idx = top_face.material_index
@@ -499,7 +446,7 @@ def get_color_string(collection):
 
     #get the bottom face
     bottom_cubes = get_face(collection, 2, -2)
-    right_cubes_sorted = sorted(bottom_cubes, key=lambda obj: (round(obj.location.y, 2), round(obj.location.x, 2)))
+    right_cubes_sorted = sorted(bottom_cubes, key=lambda obj: (round(get_bounding_box_location(obj).y, 2), round(get_bounding_box_location(obj).x, 2)))
     for cube in right_cubes_sorted:
         bottom_polygon = get_bottom_face(cube)
         face_color_idx = bottom_polygon.material_index
@@ -509,7 +456,7 @@ def get_color_string(collection):
 
     #get the left face
     left_cubes = get_face(collection, 0, -2)
-    left_cubes_sorted = sorted(left_cubes, key=lambda obj: (-round(obj.location.z, 2), -round(obj.location.y, 2)))
+    left_cubes_sorted = sorted(left_cubes, key=lambda obj: (-round(get_bounding_box_location(obj).z, 2), -round(get_bounding_box_location(obj).y, 2)))
     for cube in left_cubes_sorted:
         left_polygon = get_left_face(cube)
         face_color_idx = left_polygon.material_index
@@ -519,7 +466,7 @@ def get_color_string(collection):
 
     #get the right face
     right_cubes = get_face(collection, 0, 2)
-    right_cubes_sorted = sorted(right_cubes, key=lambda obj: (-round(obj.location.z, 2), round(obj.location.y, 2)))
+    right_cubes_sorted = sorted(right_cubes, key=lambda obj: (-round(get_bounding_box_location(obj).z, 2), round(get_bounding_box_location(obj).y, 2)))
     for cube in right_cubes_sorted:
         right_polygon = get_right_face(cube)
         face_color_idx = right_polygon.material_index
@@ -529,7 +476,7 @@ def get_color_string(collection):
 
     #get the front face
     front_cubes = get_face(collection, 1, -2)
-    front_cubes_sorted = sorted(front_cubes, key=lambda obj: (-round(obj.location.z, 2), round(obj.location.x, 2)))
+    front_cubes_sorted = sorted(front_cubes, key=lambda obj: (-round(get_bounding_box_location(obj).z, 2), round(get_bounding_box_location(obj).x, 2)))
     for cube in front_cubes_sorted:
         front_polygon = get_front_face(cube)
         face_color_idx = front_polygon.material_index
@@ -539,7 +486,7 @@ def get_color_string(collection):
 
     #get the back face
     back_cubes = get_face(collection, 1, 2)
-    back_cubes_sorted = sorted(back_cubes, key=lambda obj: (-round(obj.location.z, 2), -round(obj.location.x, 2)))
+    back_cubes_sorted = sorted(back_cubes, key=lambda obj: (-round(get_bounding_box_location(obj).z, 2), -round(get_bounding_box_location(obj).x, 2)))
     for cube in back_cubes_sorted:
         back_polygon = get_back_face(cube)
         face_color_idx = back_polygon.material_index
@@ -551,123 +498,733 @@ def get_color_string(collection):
     return faces
 
 
-# MAIN PROGRAM
-
-# setup scene
-setup_scene()
-
-# setup collection for cube
-collection = bpy.data.collections.new("cube")
-bpy.context.scene.collection.children.link(collection)
+# outward direction, axis, value and sort keys (axis, sign) of the six faces in U-R-F-D-L-B order,
+# matching the row/column order used by get_color_string
+FACE_READ_ORDER = (((0, 0, 1), 2, 2, ((1, -1), (0, 1))),
+                   ((1, 0, 0), 0, 2, ((2, -1), (1, 1))),
+                   ((0, -1, 0), 1, -2, ((2, -1), (0, 1))),
+                   ((0, 0, -1), 2, -2, ((1, 1), (0, 1))),
+                   ((-1, 0, 0), 0, -2, ((2, -1), (1, -1))),
+                   ((0, 1, 0), 1, 2, ((2, -1), (0, -1))))
+
+
+# batched version of get_color_string: pulls all matrices and polygon data with
+# foreach_get and classifies the 6 N^2 stickers with a few numpy operations
+def get_color_string_fast(collection):
+    # FACE_READ_ORDER has the layers of the 3x3, the outer layers are at +-(N-1)
+    extent = collection.get("size", 3) - 1
+    # rotate() does not update the depsgraph; the matrices are read once here
+    bpy.context.view_layer.update()
+    objects = list(collection.objects)
+    n = len(objects)
+    matrices = np.empty(n * 16, dtype=np.float32)
+    collection.objects.foreach_get("matrix_world", matrices)
+    # matrix_world is stored column major
+    matrices = matrices.reshape(n, 4, 4).transpose(0, 2, 1)
+
+    # polygon data is read once per mesh; all cubies share one mesh
+    meshes = {}
+    for obj in objects:
+        if obj.data.name not in meshes:
+            polygons = obj.data.polygons
+            count = len(polygons)
+            centers = np.empty(count * 3, dtype=np.float32)
+            polygons.foreach_get("center", centers)
+            normals = np.empty(count * 3, dtype=np.float32)
+            polygons.foreach_get("normal", normals)
+            indices = np.empty(count, dtype=np.int32)
+            polygons.foreach_get("material_index", indices)
+            meshes[obj.data.name] = (centers.reshape(count, 3), normals.reshape(count, 3), indices)
+
+    counts = [len(meshes[obj.data.name][2]) for obj in objects]
+    max_polygons = max(counts)
+    centers = np.zeros((n, max_polygons, 3), dtype=np.float32)
+    normals = np.zeros((n, max_polygons, 3), dtype=np.float32)
+    material_idx = np.zeros((n, max_polygons), dtype=np.int32)
+    valid = np.zeros((n, max_polygons), dtype=bool)
+    initials = []
+    for i, obj in enumerate(objects):
+        count = counts[i]
+        centers[i, :count], normals[i, :count], material_idx[i, :count] = meshes[obj.data.name]
+        valid[i, :count] = True
+        initials.append([slot.material.name[0] if slot.material else "?" for slot in obj.material_slots])
+
+    rotation = matrices[:, :3, :3]
+    world_centers = np.einsum("nij,npj->npi", rotation, centers) + matrices[:, None, :3, 3]
+    world_normals = np.einsum("nij,npj->npi", rotation, normals)
+    # the cubie centre is the mean of its polygon centres
+    cubie_centers = (world_centers * valid[..., None]).sum(axis=1) / np.array(counts)[:, None]
+    rounded = np.round(cubie_centers, 2)
+
+    directions = np.array([face[0] for face in FACE_READ_ORDER], dtype=np.float32)
+    scores = world_normals @ directions.T
+    scores[~valid] = -np.inf
+    # index of the polygon facing each of the six directions, per cubie
+    best = scores.argmax(axis=1)
 
-# create_cubes
-create_cubes(collection)
+    faces = ""
+    for face_idx, (direction, axis, value, keys) in enumerate(FACE_READ_ORDER):
+        on_face = np.flatnonzero(np.abs(cubie_centers[:, axis] - value // 2 * extent) < 0.1)
+        # np.lexsort uses the last key as the primary one
+        order = np.lexsort([rounded[on_face, key_axis] * sign for key_axis, sign in reversed(keys)])
+        for obj_idx in on_face[order]:
+            polygon = best[obj_idx, face_idx]
+            faces += initials[obj_idx][material_idx[obj_idx, polygon]]
+    return faces
 
 
 # make cubes slightly smaller
 def resize_cube(cube):
     cube.scale *= 0.99
 
-apply_all(resize_cube, collection)
-
 
 # create colors
 color_tuple = ("w", "g", "o", "y", "b", "r")
 color_set = ["w"] * 9 + ["g"] * 9 + ["o"] * 9 + ["y"] * 9 + ["b"] * 9 + ["r"] * 9
-create_color("white", (1, 1, 1, 1))
-create_color("green", (0, 1, 0, 1))
-create_color("orange", (1, 0.27, 0, 1))
-create_color("yellow", (1, 1, 0, 1))
-create_color("blue", (0, 0, 1, 1))
-create_color("red", (1, 0, 0, 1))
-create_color("black", (0, 0, 0, 1))
-
-# create the correct cube
-default_colors()
-
-# rotate it randomly for N times
-rotations = ('F', 'R', 'U', 'B', 'L', 'D', "F'", "R'", "B'", "L'", "D'")
-N_ROTATIONS = 300
-
-for i in range(0, N_ROTATIONS):
-    rotation = random.sample(rotations, 1)[0]
-    rotate(collection, rotation)
-
-# create color string for animation
-color_string = get_color_string(collection)
-color_string = adapt_for_kociemba(color_string)
-solution = kociemba.solve(color_string.upper())
-solution_moves = solution.split()
-print(color_string)
-print("solution", solution)
-
-
-#bevel all cubes
-bpy.ops.object.select_all(action='DESELECT')
-# Loop through all objects in the collection and select them
-for obj in collection.objects:
-    obj.select_set(True)  # Select the object
-
-bpy.ops.object.mode_set(mode='EDIT')  # Switch to edit mode
-bpy.ops.mesh.select_all(action='SELECT')
-bpy.ops.mesh.bevel(offset=0.148376, offset_pct=0, segments=2, affect='EDGES')
-bpy.ops.object.mode_set(mode='OBJECT')
-bpy.ops.object.shade_smooth()
-bpy.ops.object.select_all(action='DESELECT')
-
-
-#set origin to cursor
-for obj in collection.objects:
-    obj.select_set(True)
-    obj.rotation_mode = "QUATERNION"
-bpy.ops.object.origin_set(type='ORIGIN_CURSOR')
-
-#animate
-bpy.context.preferences.edit.keyframe_new_interpolation_type = 'LINEAR'
-frame_start = 1
-frame_duration = 10  # Number of frames for each move
-current_frame = 10
-idx = 0
-
-for obj in collection.objects:
-    obj.keyframe_insert(data_path="rotation_quaternion", frame=current_frame)
-
-for move in solution_moves:
-    selected = []
-    if "2" in move:
-        for i in range(0, 2):
-            idx += 1
-            current_frame = current_frame + frame_duration
-            short_move = move.replace("2", "")
-            selected = rotate(collection, short_move)
-            for obj in collection.objects:
-                obj.keyframe_insert(data_path="rotation_quaternion", frame=current_frame)
-                #obj.keyframe_insert(data_path="location", frame=current_frame)
-            #idx += 1
-            #pause
-        current_frame += 5
-        for obj in collection.objects:
-            obj.keyframe_insert(data_path="rotation_quaternion", frame=current_frame)
 
+
+def create_colors():
+    create_color("white", (1, 1, 1, 1))
+    create_color("green", (0, 1, 0, 1))
+    create_color("orange", (1, 0.27, 0, 1))
+    create_color("yellow", (1, 1, 0, 1))
+    create_color("blue", (0, 0, 1, 1))
+    create_color("red", (1, 0, 0, 1))
+    create_color("black", (0, 0, 0, 1))
+
+
+# the camera of the 3x3, moved away in proportion to the size of the cube
+def add_camera(size=3):
+    instrument.count("bpy_ops")
+    bpy.ops.object.camera_add(enter_editmode=False, align='VIEW',
+                              location=(-7.72653e-08, 1.32455e-08, -7.17463e-09),
+                              rotation=(1.20777, -2.8053e-06, 0.637628), scale=(1, 1, 1))
+    camera = bpy.data.objects.get("Camera")
+    camera.rotation_euler = (math.radians(69.2), math.radians(-0.000162), math.radians(36.5334))
+    camera.location = tuple(c * size / 3 for c in (15.7829, -21.1545, 10.2568))
+
+
+# build the solved cube once: materials, the shared cubie mesh, cubies and camera;
+# rig is "objects" (one object per cubie) or "armature" (one mesh, one bone per cubie),
+# size the number of cubies per edge (nxn.SIZES), segments those of the bevel
+def build_rig(rig="objects", size=3, segments=BEVEL_SEGMENTS):
+    model = nxn.model(size)
+    # setup scene
+    setup_scene()
+
+    # setup collection for cube
+    collection = bpy.data.collections.new("cube")
+    bpy.context.scene.collection.children.link(collection)
+    collection["size"] = size
+
+    create_colors()
+    mesh = create_cubie_mesh(segments)
+    if rig == "armature":
+        create_armature_rig(collection, mesh, model)
     else:
+        # and one for the pivots of the cubies
+        pivots = bpy.data.collections.new("pivots")
+        bpy.context.scene.collection.children.link(pivots)
+        create_cubes(collection, pivots, mesh, model)
+        apply_all(resize_cube, collection)
+        index_cubes(collection)
+
+    bpy.context.preferences.edit.keyframe_new_interpolation_type = 'LINEAR'
+    add_camera(size)
+    bpy.context.view_layer.update()
+    return collection
+
+
+# directory of the prebuilt rigs of --template
+TEMPLATE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "rubik", "templates")
+# everything build_rig depends on; editing any of it makes a new template
+RIG_DEFINITION = (cubie_name, create_cubie_mesh, sticker_materials, visible_positions, create_cubes,
+                  create_armature_rig, create_color, create_colors, resize_cube, add_camera, build_rig, nxn.Cube)
+
+
+def template_path(rig="objects", size=3, directory=TEMPLATE_DIR, segments=BEVEL_SEGMENTS):
+    digest = hashlib.sha256()
+    for func in RIG_DEFINITION:
+        try:
+            digest.update(inspect.getsource(func).encode())
+        except (OSError, TypeError):
+            # no source when run from a text block
+            digest.update(func.__code__.co_code if hasattr(func, "__code__") else func.__qualname__.encode())
+    # the lattice the cubies and stickers are placed on
+    digest.update(repr((cube_state.NORMALS, nxn.model(size).POSITIONS)).encode())
+    digest.update(repr((FACE_MATERIALS, BEVEL_OFFSET, segments, bpy.app.version_string)).encode())
+    return os.path.join(directory, f"rig-{rig}-{size}-{digest.hexdigest()[:16]}.blend")
+
+
+# build_rig from a template .blend: the collections and camera of the built rig
+# are appended with one library load. The template is keyed by a hash of the rig
+# definition and written by the first run after the definition changed. Appended,
+# not linked: linked objects could not be posed or keyed.
+def load_rig(rig="objects", size=3, directory=TEMPLATE_DIR, segments=BEVEL_SEGMENTS):
+    path = template_path(rig, size, directory, segments)
+    if not os.path.exists(path):
+        collection = build_rig(rig, size, segments)
+        save_template(path, collection)
+        return collection
+    setup_scene()
+    with bpy.data.libraries.load(path, link=False) as (data_from, data_to):
+        data_to.collections = list(data_from.collections)
+        data_to.objects = ["Camera"]
+    scene = bpy.context.scene
+    for collection in data_to.collections:
+        scene.collection.children.link(collection)
+    scene.collection.objects.link(data_to.objects[0])
+    scene.camera = data_to.objects[0]
+    collection = bpy.data.collections["cube"]
+    if rig_armature(collection) is None:
+        index_cubes(collection)
+    bpy.context.preferences.edit.keyframe_new_interpolation_type = 'LINEAR'
+    bpy.context.view_layer.update()
+    return collection
+
+
+def save_template(path, collection):
+    datablocks = {collection, bpy.data.objects["Camera"]}
+    if bpy.data.collections.get("pivots") is not None:
+        datablocks.add(bpy.data.collections["pivots"])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # other workers may load the template while this one writes it
+    partial = path + ".part"
+    bpy.data.libraries.write(partial, datablocks, fake_user=True)
+    os.replace(partial, path)
+
+
+# return a built rig to the solved pose without rebuilding it
+def reset_cubes(collection):
+    armature = rig_armature(collection)
+    if armature is not None:
+        if armature.animation_data and armature.animation_data.action:
+            bpy.data.actions.remove(armature.animation_data.action)
+        armature.animation_data_clear()
+        for bone in armature.pose.bones:
+            bone.rotation_quaternion = (1, 0, 0, 0)
+        bpy.context.view_layer.update()
+        return
+    for obj in collection.objects:
+        pivot = pivot_of(obj)
+        if pivot.animation_data and pivot.animation_data.action:
+            bpy.data.actions.remove(pivot.animation_data.action)
+        pivot.animation_data_clear()
+        pivot.rotation_quaternion = (1, 0, 0, 0)
+    index_cubes(collection)
+    bpy.context.view_layer.update()
+
+
+# keyframe_insert backend: keys all cubies after every turn and pause
+def animate_solution_insert(collection, solution_moves):
+    frame_duration = 10  # Number of frames for each move
+    current_frame = 10
+    idx = 0
+
+    instrument.count("keyframes", 4 * len(collection.objects))
+    for obj in collection.objects:
+        pivot_of(obj).keyframe_insert(data_path="rotation_quaternion", frame=current_frame)
+
+    for move in solution_moves:
         idx += 1
         current_frame = current_frame + frame_duration
-        selected = rotate(collection, move)
-        for obj in collection.objects: #selected
-            obj.keyframe_insert(data_path="rotation_quaternion", frame=current_frame)
+        # a half turn is a single 180 degree step between two keys
+        rotate(collection, move)
+        instrument.count("keyframes", 4 * len(collection.objects))
+        for obj in collection.objects:
+            pivot_of(obj).keyframe_insert(data_path="rotation_quaternion", frame=current_frame)
         #pause
         current_frame += 5
+        instrument.count("keyframes", 4 * len(collection.objects))
         for obj in collection.objects:
-            obj.keyframe_insert(data_path="rotation_quaternion", frame=current_frame)
+            pivot_of(obj).keyframe_insert(data_path="rotation_quaternion", frame=current_frame)
             # obj.keyframe_insert(data_path="location", frame=current_frame)
-        # idx += 1
+            # idx += 1
+
+    bpy.context.scene.frame_end = current_frame + 30
+
+
+KEYFRAME_INTERPOLATION = {item.identifier: item.value
+                          for item in bpy.types.Keyframe.bl_rna.properties["interpolation"].enum_items}
+
+
+def write_fcurves(action, data_path, group, cubie_keys):
+    instrument.count("keyframes", 4 * len(cubie_keys))
+    interpolation = [KEYFRAME_INTERPOLATION[key[2]] for key in cubie_keys]
+    for i in range(4):
+        fcurve = action.fcurves.new(data_path, index=i, action_group=group)
+        fcurve.keyframe_points.add(len(cubie_keys))
+        co = [value for frame, quaternion, ipo in cubie_keys for value in (frame, quaternion[i])]
+        fcurve.keyframe_points.foreach_set("co", co)
+        fcurve.keyframe_points.foreach_set("interpolation", interpolation)
+        fcurve.update()
+
+
+# write precomputed rotation keys with one foreach_set per F-curve: one action
+# per pivot, or a single action on the armature
+def write_keyframes(collection, keys):
+    armature = rig_armature(collection)
+    if armature is not None:
+        action = bpy.data.actions.new(armature.name)
+        armature.animation_data_create().action = action
+    positions = cube_model(collection).POSITIONS
+    for cubie, cubie_keys in keys.items():
+        name = cubie_name(positions[cubie])
+        if armature is not None:
+            write_fcurves(action, f'pose.bones["{name}"].rotation_quaternion', name, cubie_keys)
+            continue
+        if collection.objects.get(name) is None:
+            # the hidden core, only turned by slice moves
+            continue
+        obj = pivot_of(collection.objects.get(name))
+        action = bpy.data.actions.new(obj.name)
+        obj.animation_data_create().action = action
+        write_fcurves(action, "rotation_quaternion", obj.name, cubie_keys)
+
+
+# bulk backend: only the cubies a turn moves get keys, holds are CONSTANT keys
+def animate_solution(collection, state, solution_moves):
+    keys, current_frame = keyframes.solution_keys(state, solution_moves, model=cube_model(collection))
+    write_keyframes(collection, keys)
+    bpy.context.scene.frame_end = current_frame + keyframes.TAIL
+
+
+# set by main(); None solves every cube from scratch
+solution_cache = None
+solve_facelets = solver.get_solver()
+
+
+def solve(color_string):
+    if solution_cache is None:
+        return solve_facelets(color_string.upper())
+    return solution_cache.solve(color_string)
+
+
+# kociemba facelets of the 3x3 jobs whose state is known before they are posed
+# (not cached yet, each once), so the daemon can solve them in one request
+def batch_facelets(jobs, scramble):
+    batch = {}
+    for seed, facelets in jobs:
+        try:
+            if facelets is not None:
+                state = cube_state.from_facelets(adapt_from_kociemba(facelets))
+            elif seed is not None:
+                state = nxn.scrambled_state(seed, 3, scramble)
+            else:
+                continue
+        except ValueError:
+            # reported when the cube comes up
+            continue
+        color_string = cube_state.kociemba_facelets(state)
+        if solution_cache is None or not solution_cache.cached(color_string):
+            batch[color_string] = True
+    return list(batch)
+
+
+# scramble and solve one cube on an already built rig; the cube is posed from a
+# given color string, or from the state nxn.scrambled_state draws for `seed`
+# (see nxn.SCRAMBLES). Returns the state, its kociemba facelets and the
+# solution moves.
+def solve_cube(collection, seed=None, facelets=None, scramble="random-state"):
+    model = cube_model(collection)
+    with instrument.stage("scramble"):
+        if facelets is not None:
+            state = model.from_facelets(adapt_from_kociemba(facelets))
+        else:
+            # drawn on the headless model, so analytics.py sees the same states
+            state = nxn.scrambled_state(seed, model.SIZE, scramble)
+    # pose the scene once
+    with instrument.stage("pose"):
+        pose_cubes(collection, state)
+
+    # create color string for animation; the joined mesh of the armature rig
+    # cannot be read back per cubie, so that rig uses the model
+    with instrument.stage("read_facelets"):
+        if rig_armature(collection) is None:
+            color_string = get_color_string_fast(collection)
+        else:
+            color_string = model.facelets(state)
+    color_string = adapt_for_kociemba(color_string)
+    with instrument.stage("solve"):
+        if model is cube_state:
+            # whatever the backend returns, the moves are checked and canonical
+            solution_moves = notation.simplify(notation.parse(solve(color_string)))
+        else:
+            # reduction to the 3x3, which goes through the usual solver and cache
+            solution_moves = nxn.solve(model.from_facelets(adapt_from_kociemba(color_string)), solve, model.SIZE)
+    print(color_string)
+    print("solution", " ".join(solution_moves))
+    return state, color_string, solution_moves
+
+
+def animate_cube(collection, state, solution_moves, animation="bulk"):
+    with instrument.stage("animate"):
+        if animation == "bulk":
+            animate_solution(collection, state, solution_moves)
+        elif rig_armature(collection) is None:
+            animate_solution_insert(collection, solution_moves)
+        else:
+            raise ValueError("the keyframe_insert backend needs the objects rig")
+
+
+def cube_result(seed, color_string, solution_moves):
+    # the inverse of the solution is a short scramble that reaches the same state
+    frame_end = keyframes.static_ranges(len(solution_moves), bpy.context.scene.frame_start)[-1][1]
+    return {"seed": seed, "facelets": color_string, "solution": " ".join(solution_moves),
+            "scramble": " ".join(notation.invert(solution_moves)), "frame_end": frame_end}
+
+
+# scramble, solve and animate one cube on an already built rig
+def generate_cube(collection, seed=None, facelets=None, scramble="random-state", animation="bulk"):
+    state, color_string, solution_moves = solve_cube(collection, seed, facelets, scramble)
+    animate_cube(collection, state, solution_moves, animation)
+    return cube_result(seed, color_string, solution_moves)
+
+
+# render the animation as image files; with `holds` (keyframes.static_ranges)
+# every static pose is rendered once and linked (or copied) to its other frames
+def render_animation(output_dir, holds=()):
+    os.makedirs(output_dir, exist_ok=True)
+    scene = bpy.context.scene
+    scene.render.filepath = os.path.join(output_dir, "frame_")
+    frames = range(scene.frame_start, scene.frame_end + 1, scene.frame_step)
+    groups = keyframes.render_groups(frames, holds)
+    # frames that are already there were finished by an earlier run
+    missing = set(output_store.missing_frames([frame for frame, same in groups],
+                                              lambda frame: scene.render.frame_path(frame=frame)))
+    with instrument.stage("render"):
+        for frame, same in groups:
+            path = scene.render.frame_path(frame=frame)
+            if frame in missing:
+                scene.frame_set(frame)
+                instrument.count("bpy_ops")
+                bpy.ops.render.render()
+                # rename into place, so a killed render never leaves a truncated frame
+                partial = path + ".part"
+                bpy.data.images["Render Result"].save_render(partial, scene=scene)
+                os.replace(partial, path)
+            for other in same[1:]:
+                duplicate_file(path, scene.render.frame_path(frame=other))
+
+
+def duplicate_file(source, target):
+    if os.path.exists(target):
+        return
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def read_image_pixels(path):
+    image = bpy.data.images.load(path, check_existing=False)
+    width, height = image.size
+    pixels = np.empty(width * height * image.channels, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    channels = image.channels
+    bpy.data.images.remove(image)
+    # Blender stores rows bottom up
+    pixels = pixels.reshape(height, width, channels)[::-1, :, :3]
+    return (pixels * 255 + 0.5).astype(np.uint8)
+
+
+# render frame by frame into one temporary image and stream each frame into a
+# video encoder (encoder.py), so the frame sequence is never kept on disk; a
+# static pose in `holds` is rendered once and passed on with its duration
+def render_video(path, encoder_name="builtin", ffmpeg="ffmpeg", holds=()):
+    scene = bpy.context.scene
+    render = scene.render
+    settings = render.image_settings
+    saved = (render.filepath, settings.file_format, settings.color_mode, settings.color_depth, settings.compression)
+    settings.file_format, settings.color_mode, settings.color_depth, settings.compression = "PNG", "RGB", "8", 15
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # a stream cannot be resumed; write next to the target and rename when complete
+    base, extension = os.path.splitext(path)
+    partial = base + ".part" + extension
+    video = encoder.open_encoder(partial, render.fps / render.fps_base / scene.frame_step, encoder_name, ffmpeg)
+    with tempfile.TemporaryDirectory() as temporary, instrument.stage("render"):
+        render.filepath = os.path.join(temporary, "frame")
+        frame_path = render.filepath + render.file_extension
+        frames = range(scene.frame_start, scene.frame_end + 1, scene.frame_step)
+        try:
+            for frame, same in keyframes.render_groups(frames, holds):
+                scene.frame_set(frame)
+                instrument.count("bpy_ops")
+                bpy.ops.render.render(write_still=True)
+                video.add_frame(read_image_pixels(frame_path), duration=len(same))
+        finally:
+            video.close()
+            render.filepath, settings.file_format, settings.color_mode, settings.color_depth, settings.compression = saved
+    os.replace(partial, path)
+
+
+# playback file (playback.py) of a solved cube instead of rendering it
+def export_animation(path, collection, state, color_string, solution_moves):
+    render = bpy.context.scene.render
+    data = playback.animation(state, solution_moves, color_string, cube_model(collection), render.fps / render.fps_base)
+    with instrument.stage("export"):
+        playback.save(path, data)
+
+
+# rebuild the animation of a playback file on a rig of the same size
+def import_animation(collection, path):
+    data = playback.load(path)
+    if data["size"] != collection.get("size", 3):
+        raise ValueError(f"{path} holds a {data['size']}x{data['size']} cube, the rig is {collection.get('size', 3)}")
+    reset_cubes(collection)
+    pose_cubes(collection, data["state"])
+    write_keyframes(collection, data["keys"])
+    bpy.context.scene.frame_end = data["frame_end"]
+    return data
+
+
+# named sets of render settings (--render-profile); they are applied before the
+# rig is built, since the bevel is part of the cubie mesh
+RENDER_PROFILES = {
+    # a whole solution in seconds on the CPU: a few Cycles samples at a quarter of
+    # the resolution, no denoising, short light paths, sharp cubies, every 5th frame
+    "preview": {"engine": "CYCLES", "device": "CPU", "samples": 4, "adaptive_threshold": 0.1, "denoise": False,
+                "max_bounces": 2, "resolution_percentage": 25, "bevel_segments": 0, "frame_step": 5},
+    "standard": {"engine": "BLENDER_EEVEE", "samples": 16, "denoise": False,
+                 "resolution_percentage": 50, "bevel_segments": 1, "frame_step": 1},
+    "final": {"engine": "CYCLES", "samples": 256, "adaptive_threshold": 0.01, "denoise": True,
+              "resolution_percentage": 100, "bevel_segments": BEVEL_SEGMENTS, "frame_step": 1},
+}
+
+
+def apply_render_profile(name):
+    profile = RENDER_PROFILES[name]
+    scene = bpy.context.scene
+    engine = profile["engine"]
+    if engine == "BLENDER_EEVEE" and (4, 2, 0) <= bpy.app.version < (5, 0, 0):
+        # EEVEE Next has its own identifier in these versions
+        engine = "BLENDER_EEVEE_NEXT"
+    scene.render.engine = engine
+    scene.render.resolution_percentage = profile["resolution_percentage"]
+    scene.frame_step = profile["frame_step"]
+    if engine == "CYCLES":
+        cycles = scene.cycles
+        cycles.device = profile.get("device", cycles.device)
+        cycles.samples = profile["samples"]
+        # adaptive sampling stops early on the flat stickers
+        cycles.use_adaptive_sampling = "adaptive_threshold" in profile
+        cycles.adaptive_threshold = profile.get("adaptive_threshold", cycles.adaptive_threshold)
+        cycles.use_denoising = profile["denoise"]
+        cycles.max_bounces = profile.get("max_bounces", cycles.max_bounces)
+    else:
+        scene.eevee.taa_render_samples = profile["samples"]
+    return profile
+
+
+# bevel segments of the cubies under the --render-profile
+def bevel_segments(args):
+    if args.render_profile is None:
+        return BEVEL_SEGMENTS
+    return RENDER_PROFILES[args.render_profile]["bevel_segments"]
+
+
+# "5", "0:100" (range) or "1,4,9" (list)
+def parse_seeds(text):
+    if ":" in text:
+        start, stop = text.split(":")
+        return list(range(int(start), int(stop)))
+    return [int(seed) for seed in text.split(",")]
+
+
+# everything besides the cube and its solution that changes the rendered output
+def render_settings(args):
+    scene = bpy.context.scene
+    render = scene.render
+    samples = None
+    denoise = None
+    if render.engine == "CYCLES":
+        samples = scene.cycles.samples
+        denoise = scene.cycles.use_denoising
+    elif hasattr(scene, "eevee"):
+        samples = scene.eevee.taa_render_samples
+    return {"size": args.size, "rig": args.rig, "animation": args.animation,
+            "profile": args.render_profile, "bevel_segments": bevel_segments(args), "denoise": denoise,
+            "timing": [keyframes.START_FRAME, keyframes.FRAME_DURATION, keyframes.PAUSE, keyframes.TAIL],
+            "engine": render.engine, "samples": samples,
+            "resolution": [render.resolution_x, render.resolution_y, render.resolution_percentage],
+            "frame_start": scene.frame_start, "frame_step": scene.frame_step, "fps": render.fps / render.fps_base,
+            "format": args.export or args.video or render.image_settings.file_format,
+            "encoder": args.encoder if args.video else None}
+
+
+def read_facelets(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def read_seeds(path):
+    return [int(seed) for seed in read_facelets(path)]
+
+
+def write_manifest(path, result):
+    if path:
+        with open(path, "a") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+def parse_args(argv):
+    import argparse
+    parser = argparse.ArgumentParser(prog="blender -b -P rubik.py --")
+    parser.add_argument("--seeds", type=parse_seeds, default=None,
+                        help="generate one cube per seed on a single rig, e.g. 0:100 or 1,4,9")
+    parser.add_argument("--seeds-file", default=None,
+                        help="generate one cube per seed listed in this file (one per line)")
+    parser.add_argument("--facelets-file", default=None,
+                        help="generate one cube per facelet string (one per line, kociemba letters)")
+    parser.add_argument("--scramble", choices=nxn.SCRAMBLES, default="random-state",
+                        help="draw a uniformly random state or apply random moves")
+    parser.add_argument("--animation", choices=("bulk", "insert"), default="bulk",
+                        help="write F-curves in bulk or call keyframe_insert for every cubie")
+    parser.add_argument("--rig", choices=("objects", "armature"), default="objects",
+                        help="one object per cubie, or one mesh with a bone per cubie")
+    parser.add_argument("--template", nargs="?", const=TEMPLATE_DIR, default=None,
+                        help="append the solved rig from a prebuilt .blend in this directory "
+                             f"(default {TEMPLATE_DIR}), building it first when the rig definition changed")
+    parser.add_argument("--size", type=int, choices=nxn.SIZES, default=3,
+                        help="cubies per edge, 2 to 7; other sizes than 3 are solved by reduction to the 3x3")
+    parser.add_argument("--output", default=None,
+                        help="render every cube into the content-addressed store <output>/cubes/")
+    parser.add_argument("--video", choices=("gif", "mp4", "webm"), default=None,
+                        help="stream the frames of every cube into one gif, mp4 or webm file instead of image files")
+    parser.add_argument("--encoder", choices=("builtin", "ffmpeg"), default="builtin",
+                        help="write GIFs in-process or with ffmpeg (mp4 and webm always use ffmpeg)")
+    parser.add_argument("--ffmpeg", default="ffmpeg", help="path of the ffmpeg executable")
+    parser.add_argument("--export", choices=("binary", "json"), default=None,
+                        help="write a playback file (scramble, solution, per-cubie rotation keys) of every cube "
+                             "into the --output store instead of rendering it")
+    parser.add_argument("--import-animation", default=None,
+                        help="rebuild the animation of a playback file written by --export")
+    parser.add_argument("--manifest", default=None,
+                        help="append one JSON line per generated cube to this file")
+    parser.add_argument("--render-profile", choices=tuple(RENDER_PROFILES), default=None,
+                        help="set engine, samples, resolution, bevel, denoising and frame step together: "
+                             "preview (seconds per solution on the CPU), standard or final")
+    parser.add_argument("--profile", default=None,
+                        help="append per-stage timings and counters of every cube to this JSONL file "
+                             "(same as RUBIK_PROFILE)")
+    parser.add_argument("--solver", choices=tuple(solver.BACKENDS), default=solver.DEFAULT,
+                        help="kociemba package, the built-in two-phase solver, the solver daemon "
+                             "or short solutions within a budget")
+    parser.add_argument("--target-length", type=int, default=20,
+                        help="short solver: stop at the first solution with at most this many moves")
+    parser.add_argument("--solve-time", type=float, default=1.0,
+                        help="short solver: seconds per cube, counted from the start of the search")
+    parser.add_argument("--solve-nodes", type=int, default=None,
+                        help="short solver: search nodes per cube, counted from the start of the search")
+    parser.add_argument("--solution-cache", default=solver_cache.DEFAULT_PATH,
+                        help="SQLite file shared by all workers to reuse solutions")
+    parser.add_argument("--no-solution-cache", action="store_true",
+                        help="always call the solver")
+    # Blender passes the script arguments after "--"
+    if "--" in argv:
+        argv = argv[argv.index("--") + 1:]
+    else:
+        argv = []
+    args = parser.parse_args(argv)
+    if args.export and not args.output:
+        parser.error("--export writes into the --output store")
+    if args.video and not args.output:
+        parser.error("--video writes into the --output store")
+    return args
+
+
+def new_rig(args, size):
+    if args.template:
+        return load_rig(args.rig, size, args.template, bevel_segments(args))
+    return build_rig(args.rig, size, bevel_segments(args))
+
+
+def main():
+    global solution_cache, solve_facelets
+    args = parse_args(sys.argv)
+    options = {}
+    # solutions of every backend (and budget) are cached apart
+    namespace = f"{args.solver}:"
+    if args.solver == "short":
+        options = {"target": args.target_length, "timeout": args.solve_time, "max_nodes": args.solve_nodes}
+        namespace = f"short-{args.target_length}-{args.solve_time}-{args.solve_nodes}:"
+    solve_facelets = solver.get_solver(args.solver, **options)
+    if not args.no_solution_cache:
+        solution_cache = solver_cache.SolutionCache(solve_facelets, args.solution_cache, namespace=namespace)
+    if args.profile:
+        instrument.enable(args.profile)
+    if args.render_profile:
+        apply_render_profile(args.render_profile)
+    if args.import_animation:
+        size = playback.load(args.import_animation)["size"]
+        import_animation(new_rig(args, size), args.import_animation)
+        return
+    with instrument.stage("build_rig"):
+        collection = new_rig(args, args.size)
+    instrument.flush(event="build", rig=args.rig, size=args.size, template=bool(args.template),
+                     blender=bpy.app.version_string)
+    store = output_store.OutputStore(args.output) if args.output else None
+    settings = render_settings(args) if store is not None else None
+    if args.facelets_file:
+        jobs = [(None, facelets) for facelets in read_facelets(args.facelets_file)]
+    elif args.seeds_file:
+        jobs = [(seed, None) for seed in read_seeds(args.seeds_file)]
+    elif args.seeds is not None:
+        jobs = [(seed, None) for seed in args.seeds]
+    else:
+        jobs = [(None, None)]
+    if args.solver == "daemon" and args.size == 3:
+        with instrument.stage("prefetch"):
+            solver.daemon_prefetch(batch_facelets(jobs, args.scramble))
+    for i, (seed, facelets) in enumerate(jobs):
+        if i > 0:
+            with instrument.stage("reset"):
+                reset_cubes(collection)
+        try:
+            state, color_string, solution_moves = solve_cube(collection, seed, facelets, args.scramble)
+        except ValueError as e:
+            # an invalid or unsolvable facelet string only fails its own cube
+            result = {"seed": seed, "input": facelets, "error": str(e)}
+            write_manifest(args.manifest, result)
+            print("failed", result)
+            continue
+        result = cube_result(seed, color_string, solution_moves)
+        if facelets is not None:
+            result["input"] = facelets
+        if store is None:
+            animate_cube(collection, state, solution_moves, args.animation)
+        else:
+            key = output_store.cube_key(color_string, result["solution"], settings)
+            result["key"] = key
+            if args.export:
+                stage, extension = "export", ".anim.json" if args.export == "json" else ".anim"
+            else:
+                stage, extension = "render", "." + args.video if args.video else ""
+            result["output"] = store.path(key, extension)
+            # identical cubes (a repeated seed or facelet string, or a finished
+            # earlier run) are rendered only once
+            if store.done(key, stage):
+                print(stage, "already done", key)
+            else:
+                if args.export:
+                    export_animation(result["output"], collection, state, color_string, solution_moves)
+                else:
+                    animate_cube(collection, state, solution_moves, args.animation)
+                    holds = keyframes.static_ranges(len(solution_moves), bpy.context.scene.frame_start)
+                    if args.video:
+                        render_video(result["output"], args.encoder, args.ffmpeg, holds)
+                    else:
+                        render_animation(result["output"], holds)
+                store.record(key, stage, output=result["output"], seed=seed, input=facelets)
+        write_manifest(args.manifest, result)
+        print("generated", result)
+        instrument.flush(event="cube", seed=seed, input=facelets, rig=args.rig,
+                         blender=bpy.app.version_string, moves=len(result["solution"].split()))
+    if solution_cache is not None:
+        print("solution cache", solution_cache.stats())
+        solution_cache.close()
 
-bpy.context.scene.frame_end = current_frame + 30
 
-#add a camera
-bpy.ops.object.camera_add(enter_editmode=False, align='VIEW',
-                          location=(-7.72653e-08, 1.32455e-08, -7.17463e-09),
-                          rotation=(1.20777, -2.8053e-06, 0.637628), scale=(1, 1, 1))
-camera = bpy.data.objects.get("Camera")
-camera.rotation_euler = (math.radians(69.2), math.radians(-0.000162), math.radians(36.5334))
-camera.location = (15.7829, -21.1545, 10.2568)
+# MAIN PROGRAM
+if __name__ == "__main__":
+    main()
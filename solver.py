@@ -0,0 +1,80 @@
+# Solver backends: every backend takes a kociemba facelet string (letters
+# URFDLB) and returns the solution as "R U2 F' ...".
+#
+#   kociemba  - the kociemba package (C extension), the default
+#   twophase  - the built-in two-phase solver on memory-mapped tables (twophase.py)
+#   daemon    - a running solver_daemon.py, or kociemba in-process when there is none
+#   short     - the two-phase solver searching for shorter solutions within a
+#               time/node budget (options target, timeout, max_nodes)
+import functools
+
+import twophase
+
+DEFAULT = "kociemba"
+
+
+def kociemba_solve(facelets):
+    import kociemba
+    return kociemba.solve(facelets.upper())
+
+
+def twophase_solve(facelets):
+    return twophase.solve(facelets)
+
+
+def short_solve(facelets, target=20, timeout=1.0, max_nodes=None):
+    return twophase.solve_short(facelets, target, timeout, max_nodes)
+
+
+# one connection per process, reused for every cube; the solutions of a batch
+# sent ahead with daemon_prefetch wait in daemon_solutions until their cube
+# comes up
+daemon_client = None
+daemon_solutions = {}
+
+
+def get_daemon_client():
+    global daemon_client
+    import solver_daemon
+    if daemon_client is None:
+        daemon_client = solver_daemon.DaemonClient()
+    return daemon_client
+
+
+def daemon_prefetch(batch):
+    # solve a whole batch in one daemon request; without a daemon nothing is
+    # prefetched and daemon_solve handles every cube on its own
+    batch = [facelets.upper() for facelets in batch]
+    try:
+        for index, solution in get_daemon_client().solve_batch(batch):
+            daemon_solutions[batch[index]] = solution
+    except OSError:
+        pass
+
+
+def daemon_solve(facelets):
+    solution = daemon_solutions.pop(facelets.upper(), None)
+    if isinstance(solution, ValueError):
+        raise solution
+    if solution is not None:
+        return solution
+    try:
+        return get_daemon_client().solve(facelets)
+    except OSError:
+        return kociemba_solve(facelets)
+
+
+BACKENDS = {
+    "kociemba": kociemba_solve,
+    "twophase": twophase_solve,
+    "daemon": daemon_solve,
+    "short": short_solve,
+}
+
+
+def get_solver(name=DEFAULT, **options):
+    if name not in BACKENDS:
+        raise ValueError(f"unknown solver {name!r}, expected one of {', '.join(BACKENDS)}")
+    if options:
+        return functools.partial(BACKENDS[name], **options)
+    return BACKENDS[name]
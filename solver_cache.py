@@ -0,0 +1,134 @@
+# Cache of solutions keyed by the kociemba facelet string: an in-memory LRU in
+# front of an SQLite file that can be shared by several processes.
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "rubik", "solutions.sqlite")
+# the rows are counted at open and after every eviction and stores add to the
+# count, so a store that takes the file over disk_size rows trims it right away;
+# it drops the least recently used rows down to disk_size minus a batch of
+# disk_size / EVICT_FRACTION, so evicting (and counting) is rare. The use times
+# of disk hits are written in batches of TOUCH_BATCH, so a lookup never writes.
+EVICT_FRACTION = 100
+TOUCH_BATCH = 256
+
+
+def normalize(facelets):
+    return facelets.strip().upper()
+
+
+class SolutionCache:
+    # `namespace` keeps the solutions of different solver backends (and of
+    # differently configured ones, e.g. short solutions) apart in a shared file
+    def __init__(self, solve, path=DEFAULT_PATH, memory_size=4096, disk_size=1000000, namespace=""):
+        self.solve_fn = solve
+        self.namespace = namespace
+        self.memory = OrderedDict()
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.rows = 0
+        self.touched = {}
+        self.db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            # several Blender workers can use the same file at once
+            self.db = sqlite3.connect(path, timeout=30)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS solutions "
+                            "(facelets TEXT PRIMARY KEY, solution TEXT NOT NULL, used REAL NOT NULL)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS solutions_used ON solutions (used)")
+            self.db.commit()
+            self.rows = self.count()
+            if self.rows > self.disk_size:
+                self.evict()
+
+    def remember(self, facelets, solution):
+        self.memory[facelets] = solution
+        self.memory.move_to_end(facelets)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def lookup(self, facelets):
+        solution = self.memory.get(facelets)
+        if solution is not None:
+            self.memory.move_to_end(facelets)
+            self.hits += 1
+            return solution
+        if self.db is not None:
+            row = self.db.execute("SELECT solution FROM solutions WHERE facelets = ?", (facelets,)).fetchone()
+            if row is not None:
+                self.touched[facelets] = time.time()
+                if len(self.touched) >= TOUCH_BATCH:
+                    self.flush()
+                self.disk_hits += 1
+                self.remember(facelets, row[0])
+                return row[0]
+        return None
+
+    def store(self, facelets, solution):
+        self.remember(facelets, solution)
+        if self.db is None:
+            return
+        self.db.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?)", (facelets, solution, time.time()))
+        # a replaced row counts too; the next eviction corrects the count
+        self.rows += 1
+        if self.rows > self.disk_size:
+            self.evict()
+        self.flush()
+
+    def flush(self):
+        # write the pending use times (and commit the pending store)
+        if self.touched:
+            self.db.executemany("UPDATE solutions SET used = ? WHERE facelets = ?",
+                                [(used, facelets) for facelets, used in self.touched.items()])
+            self.touched.clear()
+        self.db.commit()
+
+    def count(self):
+        return self.db.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+
+    def evict(self):
+        # drop the least recently used rows, down to a batch below disk_size
+        # (other processes may have stored rows this one did not count)
+        self.flush()
+        keep = self.disk_size - self.disk_size // EVICT_FRACTION
+        count = self.count()
+        if count > keep:
+            self.db.execute("DELETE FROM solutions WHERE facelets IN "
+                            "(SELECT facelets FROM solutions ORDER BY used LIMIT ?)", (count - keep,))
+            self.db.commit()
+            count = keep
+        self.rows = count
+
+    def cached(self, facelets):
+        # whether solve() would answer from the cache, without counting a hit
+        key = self.namespace + normalize(facelets)
+        if key in self.memory:
+            return True
+        return self.db is not None and self.db.execute(
+            "SELECT 1 FROM solutions WHERE facelets = ?", (key,)).fetchone() is not None
+
+    def solve(self, facelets):
+        facelets = normalize(facelets)
+        key = self.namespace + facelets
+        solution = self.lookup(key)
+        if solution is None:
+            self.misses += 1
+            solution = self.solve_fn(facelets)
+            self.store(key, solution)
+        return solution
+
+    def stats(self):
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "memory_entries": len(self.memory)}
+
+    def close(self):
+        if self.db is not None:
+            self.flush()
+            self.db.close()
+            self.db = None
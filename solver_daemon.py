@@ -0,0 +1,181 @@
+# Local solver daemon: keeps a pool of solver processes (with their tables
+# loaded) running, so short-lived Blender workers do not pay the start-up cost
+# of the solver for every batch.
+#
+#   python solver_daemon.py --workers 8                    (Unix socket)
+#   python solver_daemon.py --address 127.0.0.1:8765       (localhost TCP)
+#
+# Protocol, one JSON object per line: the client sends {"facelets": [...]} and
+# the daemon streams back {"index": i, "solution": "..."} (or {"index": i,
+# "error": "..."}) for every cube as soon as it is solved, then {"done": n}.
+import argparse
+import ipaddress
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+
+import solver
+
+DEFAULT_ADDRESS = os.environ.get("RUBIK_SOLVER_DAEMON",
+                                 os.path.join(os.path.expanduser("~"), ".cache", "rubik", "solver.sock"))
+
+
+def parse_address(address):
+    # "host:port" is TCP on a loopback address, anything else the path of a Unix
+    # socket; the daemon has no authentication, so it never listens on a network
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit() and os.sep not in address:
+        try:
+            loopback = host == "localhost" or ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            loopback = False
+        if not loopback:
+            raise ValueError(f"{address}: the solver daemon only uses loopback addresses")
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+
+# --- daemon ------------------------------------------------------------------
+
+worker_solve = None
+
+
+def init_worker(backend):
+    global worker_solve
+    worker_solve = solver.get_solver(backend)
+    if backend == "twophase":
+        solver.twophase.load_tables()
+
+
+def solve_one(job):
+    index, facelets = job
+    try:
+        return {"index": index, "solution": worker_solve(facelets)}
+    except ValueError as e:
+        return {"index": index, "error": str(e)}
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                facelets = json.loads(line)["facelets"]
+            except (ValueError, KeyError, TypeError):
+                self.send({"error": "expected {\"facelets\": [...]}"})
+                continue
+            for result in self.server.pool.imap_unordered(solve_one, enumerate(facelets), chunksize=4):
+                self.send(result)
+            self.send({"done": len(facelets)})
+
+    def send(self, message):
+        self.wfile.write((json.dumps(message) + "\n").encode())
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(address=DEFAULT_ADDRESS, workers=None, backend="kociemba"):
+    family, target = parse_address(address)
+    if family == socket.AF_UNIX:
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        # a socket file left behind by a daemon that was killed
+        if os.path.exists(target):
+            os.remove(target)
+        server = UnixServer(target, Handler)
+    else:
+        server = TCPServer(target, Handler)
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(backend,)) as pool:
+        server.pool = pool
+        print(f"solving with {backend} on {address}, {workers or os.cpu_count()} workers", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if family == socket.AF_UNIX and os.path.exists(target):
+                os.remove(target)
+
+
+# --- client ------------------------------------------------------------------
+
+class DaemonClient:
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=60):
+        self.address = address
+        self.timeout = timeout
+        self.sock = None
+        self.reader = None
+
+    def connect(self):
+        # raises OSError when no daemon is listening
+        if self.sock is None:
+            family, target = parse_address(self.address)
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(target)
+            except OSError:
+                sock.close()
+                raise
+            self.sock = sock
+            self.reader = sock.makefile("rb")
+
+    def solve_batch(self, facelets):
+        # yields (index, solution) in the order the daemon finishes them; an
+        # invalid cube gives a ValueError as its solution
+        self.connect()
+        try:
+            self.sock.sendall((json.dumps({"facelets": list(facelets)}) + "\n").encode())
+            for line in self.reader:
+                result = json.loads(line)
+                if "done" in result:
+                    return
+                if "index" not in result:
+                    raise ValueError(result.get("error"))
+                if "error" in result:
+                    yield result["index"], ValueError(result["error"])
+                else:
+                    yield result["index"], result["solution"]
+            raise ConnectionError("solver daemon closed the connection")
+        except (OSError, GeneratorExit):
+            # a batch that was not read to the end leaves the stream out of step
+            self.close()
+            raise
+
+    def solve(self, facelets):
+        results = dict(self.solve_batch([facelets]))
+        if 0 not in results:
+            raise ConnectionError("solver daemon sent no solution")
+        if isinstance(results[0], ValueError):
+            raise results[0]
+        return results[0]
+
+    def close(self):
+        if self.sock is not None:
+            self.reader.close()
+            self.sock.close()
+            self.sock = None
+            self.reader = None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve batches of cube solves to local clients.")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS,
+                        help="Unix socket path or loopback host:port (default: $RUBIK_SOLVER_DAEMON or %(default)s)")
+    parser.add_argument("--workers", type=int, default=None, help="solver processes (default: one per core)")
+    parser.add_argument("--solver", choices=tuple(name for name in solver.BACKENDS if name != "daemon"),
+                        default=solver.DEFAULT, help="backend the workers use")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    serve(args.address, args.workers, args.solver)
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# the modules live next to rubik.py, not in a package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def tables():
+    # path of the two-phase tables; they take minutes to generate, so the tests
+    # share the cached file (or RUBIK_TWOPHASE_TABLES) with the solver
+    pytest.importorskip("numpy")
+    import twophase
+    path = os.environ.get("RUBIK_TWOPHASE_TABLES", twophase.DEFAULT_PATH)
+    twophase.load_tables(path)
+    return path
+
+
+@pytest.fixture(scope="session")
+def solve3(tables):
+    # a 3x3 solver with the same interface as kociemba.solve
+    import twophase
+    return lambda facelets: twophase.solve(facelets, tables_path=tables)
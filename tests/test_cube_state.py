@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+import cube_state
+
+
+def test_solved_facelets():
+    assert cube_state.facelets(cube_state.SOLVED) == "".join(color * 9 for color in cube_state.FACE_COLORS)
+    assert cube_state.kociemba_facelets(cube_state.SOLVED) == "".join(face * 9 for face in "URFDLB")
+
+
+@pytest.mark.parametrize("move", cube_state.MOVES)
+def test_four_turns_are_identity(move):
+    assert cube_state.apply_moves(cube_state.SOLVED, [move] * 4) == cube_state.SOLVED
+
+
+def test_move_and_inverse_cancel():
+    moves = cube_state.random_moves(50, random.Random(1))
+    inverse = [move[0] + {"": "'", "'": "", "2": "2"}[move[1:]] for move in reversed(moves)]
+    state = cube_state.apply_moves(cube_state.SOLVED, moves)
+    assert state != cube_state.SOLVED
+    assert cube_state.apply_moves(state, inverse) == cube_state.SOLVED
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_facelets_round_trip(seed):
+    state = cube_state.random_state(random.Random(seed))
+    assert cube_state.from_facelets(cube_state.facelets(state)) == state
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_state_is_legal(seed):
+    cubies, orients = cube_state.random_state(random.Random(seed))
+    assert sorted(cubies) == list(cube_state.SOLVED[0])
+    state = (cubies, orients)
+    corners = [cube_state.CORNER_SLOTS.index(cubies[slot]) for slot in cube_state.CORNER_SLOTS]
+    edges = [cube_state.EDGE_SLOTS.index(cubies[slot]) for slot in cube_state.EDGE_SLOTS]
+    assert cube_state.permutation_parity(corners) == cube_state.permutation_parity(edges)
+    assert sum(cube_state.orientation(state, slot) for slot in cube_state.CORNER_SLOTS) % 3 == 0
+    assert sum(cube_state.orientation(state, slot) for slot in cube_state.EDGE_SLOTS) % 2 == 0
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_random_state_solves(seed, solve3):
+    state = cube_state.random_state(random.Random(seed))
+    moves = solve3(cube_state.kociemba_facelets(state)).split()
+    # the centres may end up turned in place, which no sticker shows
+    assert cube_state.facelets(cube_state.apply_moves(state, moves)) == cube_state.facelets(cube_state.SOLVED)
+
+
+@pytest.mark.parametrize("colors", ["", "y" * 54, "x" + cube_state.facelets(cube_state.SOLVED)[1:]])
+def test_from_facelets_rejects_invalid(colors):
+    with pytest.raises(ValueError):
+        cube_state.from_facelets(colors)
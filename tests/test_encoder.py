@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import encoder  # noqa: E402
+
+
+def lzw_decompress(data, min_code_size=8):
+    # reference GIF decoder: codes widen once the next free code needs another bit
+    clear = 1 << min_code_size
+    end = clear + 1
+    bits = int.from_bytes(data, "little")
+    position = 0
+    code_size = min_code_size + 1
+    table = []
+    previous = None
+    out = []
+    while True:
+        code = (bits >> position) & ((1 << code_size) - 1)
+        position += code_size
+        if code == clear:
+            table = [[i] for i in range(clear)] + [None, None]
+            code_size = min_code_size + 1
+            previous = None
+            continue
+        if code == end:
+            return out
+        if previous is None:
+            entry = table[code]
+        else:
+            entry = table[code] if code < len(table) else previous + previous[:1]
+            if len(table) < 4096:
+                table.append(previous + entry[:1])
+        out += entry
+        previous = entry
+        if len(table) >= 1 << code_size and code_size < 12:
+            code_size += 1
+
+
+@pytest.mark.parametrize("indices", [
+    [0],
+    [7] * 5000,
+    list(range(256)) * 3,
+    # enough distinct strings to fill the code table and clear it
+    [random.Random(1).randrange(256) for i in range(30000)],
+    [random.Random(2).randrange(4) for i in range(30000)],
+])
+def test_lzw_round_trip(indices):
+    assert lzw_decompress(encoder.lzw_compress(indices)) == indices
+
+
+def frames(count=4, height=24, width=40):
+    rng = np.random.default_rng(0)
+    colors = rng.integers(0, 32, size=(6, 3)) * 8 + 4
+    result = []
+    for i in range(count):
+        pixels = np.empty((height, width, 3), dtype=np.uint8)
+        for band in range(6):
+            pixels[:, band * width // 6:(band + 1) * width // 6] = colors[(band + i) % 6]
+        result.append(pixels)
+    return result
+
+
+def test_gif_round_trip(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    path = str(tmp_path / "cube.gif")
+    video = encoder.GifEncoder(path, 25)
+    durations = [1, 5, 1, 3]
+    for pixels, duration in zip(frames(), durations):
+        video.add_frame(pixels, duration=duration)
+    video.close()
+    with Image.open(path) as image:
+        assert image.n_frames == len(durations)
+        assert image.info.get("loop") == 0
+        for i, (pixels, duration) in enumerate(zip(frames(), durations)):
+            image.seek(i)
+            # six colors on the palette grid come back exactly
+            assert np.array_equal(np.asarray(image.convert("RGB")), pixels)
+            assert image.info["duration"] == duration * 40
+
+
+def test_gif_delays_do_not_drift(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    path = str(tmp_path / "cube.gif")
+    video = encoder.GifEncoder(path, 24)
+    for pixels in frames(count=48):
+        video.add_frame(pixels)
+    video.close()
+    with Image.open(path) as image:
+        total = 0
+        for i in range(image.n_frames):
+            image.seek(i)
+            total += image.info["duration"]
+    # 48 frames at 24 fps are 2 s, although no single frame is 1/24 s long
+    assert total == 2000
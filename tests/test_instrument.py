@@ -0,0 +1,66 @@
+import json
+import os
+
+import pytest
+
+import instrument
+
+
+@pytest.fixture(autouse=True)
+def disabled(monkeypatch):
+    # every test starts with profiling off and nothing collected
+    monkeypatch.setattr(instrument, "enabled", False)
+    monkeypatch.setattr(instrument, "metrics_path", None)
+    monkeypatch.setattr(instrument, "counters", {})
+    monkeypatch.setattr(instrument, "stages", {})
+
+
+def test_disabled_is_a_no_op(tmp_path):
+    assert instrument.stage("solve") is instrument.NO_STAGE
+    with instrument.stage("solve"):
+        instrument.count("bpy_ops", 3)
+    instrument.flush(event="cube", seed=1)
+    assert instrument.counters == {}
+    assert instrument.stages == {}
+    assert os.listdir(tmp_path) == []
+
+
+def read_records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_records(tmp_path):
+    path = str(tmp_path / "metrics.jsonl")
+    instrument.enable(path)
+    with instrument.stage("solve"):
+        instrument.count("bpy_ops")
+        instrument.count("bpy_ops", 2)
+    with instrument.stage("solve"):
+        instrument.count("keyframes", 40)
+    instrument.flush(event="cube", seed=7)
+    with instrument.stage("pose"):
+        pass
+    instrument.flush(event="cube", seed=8)
+
+    first, second = read_records(path)
+    assert first["event"] == "cube" and first["seed"] == 7
+    assert first["pid"] == os.getpid()
+    assert set(first) == {"time", "pid", "event", "seed", "stages", "counters"}
+    assert first["counters"] == {"bpy_ops": 3, "keyframes": 40}
+    assert list(first["stages"]) == ["solve"]
+    solve = first["stages"]["solve"]
+    assert solve["calls"] == 2
+    assert solve["wall"] >= 0 and solve["cpu"] >= 0
+    # every flush starts over
+    assert second["seed"] == 8
+    assert second["counters"] == {}
+    assert list(second["stages"]) == ["pose"]
+
+
+def test_stage_records_exceptions(tmp_path):
+    instrument.enable(str(tmp_path / "metrics.jsonl"))
+    with pytest.raises(ValueError):
+        with instrument.stage("solve"):
+            raise ValueError("no solution")
+    assert instrument.stages["solve"]["calls"] == 1
@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+import cube_state
+import keyframes
+
+
+def test_static_ranges_without_moves():
+    # lead-in and tail only
+    assert keyframes.static_ranges(0) == [(1, keyframes.START_FRAME + keyframes.TAIL)]
+
+
+def test_static_ranges():
+    # lead-in up to frame 10, 10 frames per move with a 5-frame pause after it, 30 tail frames
+    assert keyframes.static_ranges(2) == [(1, 10), (20, 25), (35, 70)]
+    assert keyframes.static_ranges(3, first_frame=5, start=12, duration=4, pause=2, tail=8) \
+        == [(5, 12), (16, 18), (22, 24), (28, 38)]
+
+
+@pytest.mark.parametrize("n_moves", [0, 1, 20])
+def test_frame_end_follows_timing(n_moves):
+    frame_end = keyframes.START_FRAME + n_moves * (keyframes.FRAME_DURATION + keyframes.PAUSE) + keyframes.TAIL
+    assert keyframes.static_ranges(n_moves)[-1][1] == frame_end
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_static_ranges_match_keys(seed):
+    # turns start where a hold ends and end (CONSTANT keys) where the next hold starts
+    moves = cube_state.random_moves(15, random.Random(seed))
+    keys, frame = keyframes.solution_keys(cube_state.random_state(random.Random(seed)), moves)
+    ranges = keyframes.static_ranges(len(moves))
+    assert ranges[-1][1] == frame + keyframes.TAIL
+    starts = {first for first, last in ranges}
+    ends = {last for first, last in ranges}
+    for cubie_keys in keys.values():
+        for key_frame, quaternion, interpolation in cubie_keys:
+            assert key_frame in (starts if interpolation == "CONSTANT" else ends)
+
+
+def test_render_groups():
+    ranges = keyframes.static_ranges(1)
+    assert ranges == [(1, 10), (20, 55)]
+    groups = keyframes.render_groups(range(1, 56), ranges)
+    assert groups[0] == (1, list(range(1, 11)))
+    assert groups[1:10] == [(frame, [frame]) for frame in range(11, 20)]
+    assert groups[10:] == [(20, list(range(20, 56)))]
+
+
+def test_render_groups_with_frame_step():
+    ranges = keyframes.static_ranges(2)
+    frames = range(1, ranges[-1][1] + 1, 3)
+    groups = keyframes.render_groups(frames, ranges)
+    assert groups == [
+        (1, [1, 4, 7, 10]), (13, [13]), (16, [16]), (19, [19]),
+        (22, [22, 25]), (28, [28]), (31, [31]), (34, [34]),
+        (37, list(range(37, 71, 3))),
+    ]
+    # every frame is rendered or copied exactly once, in order
+    assert [frame for rendered, same in groups for frame in same] == list(frames)
+
+
+def test_render_groups_keeps_holds_apart():
+    # neighbouring holds show different poses, frames past the last hold are rendered one by one
+    groups = keyframes.render_groups(range(1, 24), [(1, 10), (11, 20)])
+    assert groups == [(1, list(range(1, 11))), (11, list(range(11, 21))), (21, [21]), (22, [22]), (23, [23])]
@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+import cube_state
+import notation
+import nxn
+
+
+@pytest.mark.parametrize("text, moves", [
+    ("R U2 r' M2 x", ["R", "U2", "Rw'", "M2", "x"]),
+    ("RUR'U'", ["R", "U", "R'", "U'"]),
+    ("R2' L'2 F3 B’", ["R2", "L2", "F'", "B'"]),
+    ("  Uw2 Dw'  ", ["Uw2", "Dw'"]),
+    ("2R' 3U2 6F", ["2R'", "3U2", "6F"]),
+    ("", []),
+])
+def test_parse(text, moves):
+    assert notation.parse(text) == moves
+
+
+@pytest.mark.parametrize("text", ["Q", "R X", "R 1R", "R''"])
+def test_parse_rejects(text):
+    with pytest.raises(ValueError):
+        notation.parse(text)
+
+
+def test_invert():
+    assert notation.invert(["R", "U2", "F'"]) == ["F", "U2", "R'"]
+    moves = cube_state.random_moves(30, random.Random(2))
+    state = cube_state.apply_moves(cube_state.SOLVED, moves)
+    assert cube_state.apply_moves(state, notation.invert(moves)) == cube_state.SOLVED
+
+
+@pytest.mark.parametrize("text, simplified", [
+    ("R R'", ""),
+    ("R L R'", "L"),
+    ("U D2 U", "U2 D2"),
+    ("R U U' R'", ""),
+    ("F F F", "F'"),
+    ("R Rw", "R Rw"),
+    ("x x2 x", ""),
+])
+def test_simplify(text, simplified):
+    assert notation.simplify(notation.parse(text)) == notation.parse(simplified)
+
+
+@pytest.mark.parametrize("size", [3, 4, 6])
+@pytest.mark.parametrize("seed", range(10))
+def test_simplify_keeps_the_state(size, seed):
+    model = nxn.model(size)
+    rng = random.Random(seed)
+    # few layers, so that many moves cancel or merge
+    keys = rng.sample(sorted(model.LAYERS), 4)
+    moves = [rng.choice(keys) + rng.choice(("", "2", "'")) for i in range(60)]
+    simplified = notation.simplify(moves, model.LAYERS)
+    assert len(simplified) < len(moves)
+    assert model.apply_moves(model.SOLVED, simplified) == model.apply_moves(model.SOLVED, moves)
+    assert notation.simplify(simplified, model.LAYERS) == simplified
@@ -0,0 +1,110 @@
+import ast
+import os
+import random
+
+import pytest
+
+import cube_state
+import nxn
+
+
+def is_solved(model, state):
+    # every face one color; on odd sizes the middle slices turn the whole cube
+    colors = model.facelets(state)
+    n = model.SIZE * model.SIZE
+    return all(len(set(colors[i:i + n])) == 1 for i in range(0, len(colors), n))
+
+
+def test_model_of_3_is_cube_state():
+    assert nxn.model(3) is cube_state
+
+
+@pytest.mark.parametrize("size", [2, 4, 5, 6, 7])
+def test_visible_cubies(size):
+    model = nxn.model(size)
+    visible = [p for p in model.POSITIONS if max(abs(c) for c in p) == model.EXTENT]
+    assert len(visible) == size ** 3 - (size - 2) ** 3
+    assert len(model.facelets(model.SOLVED)) == 6 * size * size
+
+
+@pytest.mark.parametrize("size", [2, 4, 5])
+def test_four_turns_are_identity(size):
+    model = nxn.model(size)
+    for key in model.LAYERS:
+        assert model.apply_moves(model.SOLVED, [key] * 4) == model.SOLVED
+
+
+@pytest.mark.parametrize("size", [2, 4, 5, 6])
+@pytest.mark.parametrize("seed", range(3))
+def test_facelets_round_trip(size, seed):
+    model = nxn.model(size)
+    state = model.apply_moves(model.SOLVED, model.random_moves(100, random.Random(seed)))
+    colors = model.facelets(state)
+    # identical centre and wing pieces can come back swapped, their stickers cannot
+    assert model.facelets(model.from_facelets(colors)) == colors
+
+
+def test_from_facelets_rejects_invalid():
+    model = nxn.model(4)
+    with pytest.raises(ValueError):
+        model.from_facelets(model.facelets(model.SOLVED)[:-1])
+    with pytest.raises(ValueError):
+        model.from_facelets("y" * 96)
+
+
+@pytest.mark.parametrize("size", [2, 4, 5, 6, 7])
+@pytest.mark.parametrize("seed", range(2))
+def test_solve(size, seed, solve3):
+    model = nxn.model(size)
+    state = model.apply_moves(model.SOLVED, model.random_moves(100, random.Random(seed)))
+    moves = nxn.solve(state, solve3, size)
+    assert is_solved(model, model.apply_moves(state, moves))
+
+
+@pytest.mark.parametrize("size", [2, 3, 4])
+@pytest.mark.parametrize("scramble", nxn.SCRAMBLES)
+def test_scrambled_state(size, scramble):
+    model = nxn.model(size)
+    state = nxn.scrambled_state(5, size, scramble)
+    assert state == nxn.scrambled_state(5, size, scramble)
+    assert state != nxn.scrambled_state(6, size, scramble)
+    assert state != model.SOLVED
+
+
+def test_scrambled_state_of_moves():
+    rng = random.Random(5)
+    moves = [rng.choice(nxn.SCRAMBLE_MOVES) for i in range(nxn.N_ROTATIONS)]
+    assert nxn.scrambled_state(5, 3, "moves") == cube_state.apply_moves(cube_state.SOLVED, moves)
+    assert nxn.scrambled_state(5, 3) == cube_state.random_state(random.Random(5))
+
+
+def calls(path, function):
+    # the calls function makes, as dotted names with their argument names
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    node = next(node for node in ast.walk(tree) if isinstance(node, ast.FunctionDef) and node.name == function)
+    return {ast.unparse(call.func): [ast.unparse(arg) for arg in call.args]
+            for call in ast.walk(node) if isinstance(call, ast.Call)}
+
+
+def test_rubik_and_analytics_draw_the_same_states():
+    # rubik.py needs bpy, so its source is checked instead
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    assert calls(os.path.join(root, "rubik.py"), "solve_cube")["nxn.scrambled_state"] == ["seed", "model.SIZE", "scramble"]
+    assert calls(os.path.join(root, "analytics.py"), "solve_chunk")["nxn.scrambled_state"] \
+        == ["seed", "worker_size", "worker_scramble"]
+
+
+@pytest.mark.parametrize("scramble", nxn.SCRAMBLES)
+def test_analytics_states(scramble, monkeypatch):
+    import analytics
+    solved = []
+
+    def solve(facelets):
+        solved.append(facelets)
+        return ""
+
+    monkeypatch.setattr(analytics, "worker_solve", solve)
+    monkeypatch.setattr(analytics, "worker_scramble", scramble)
+    analytics.solve_chunk((10, 13))
+    assert solved == [cube_state.kociemba_facelets(nxn.scrambled_state(seed, 3, scramble)) for seed in range(10, 13)]
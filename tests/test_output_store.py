@@ -0,0 +1,85 @@
+import json
+import os
+
+import keyframes
+import output_store
+
+FACELETS = "UUUUUUUUURRRRRRRRRFFFFFFFFFDDDDDDDDDLLLLLLLLLBBBBBBBBB"
+SETTINGS = {"rig": "objects", "engine": "EEVEE", "resolution": [480, 480]}
+
+
+def test_cube_key():
+    key = output_store.cube_key(FACELETS, "R U", SETTINGS)
+    assert len(key) == 32 and int(key, 16) >= 0
+    # the same request always gets the same key, whatever the case of the facelets
+    assert output_store.cube_key(FACELETS.lower(), "R U", dict(reversed(list(SETTINGS.items())))) == key
+    assert output_store.cube_key(FACELETS, "R U'", SETTINGS) != key
+    assert output_store.cube_key(FACELETS, "R U", dict(SETTINGS, engine="CYCLES")) != key
+
+
+def test_path(tmp_path):
+    store = output_store.OutputStore(str(tmp_path))
+    key = output_store.cube_key(FACELETS, "R U", SETTINGS)
+    path = store.path(key, ".gif")
+    assert path == os.path.join(str(tmp_path), "cubes", key[:2], key + ".gif")
+    assert os.path.isdir(os.path.dirname(path))
+
+
+def test_done_and_record(tmp_path):
+    store = output_store.OutputStore(str(tmp_path))
+    assert not store.done("k1", "render")
+    store.record("k1", "render", output="out", seed=3)
+    assert store.done("k1", "render")
+    assert not store.done("k1", "export")
+    assert not store.done("k2", "render")
+    with open(tmp_path / "stages.jsonl") as f:
+        assert [json.loads(line) for line in f] == [{"key": "k1", "stage": "render", "output": "out", "seed": 3}]
+
+
+def test_identical_requests_are_done_once(tmp_path):
+    # a second worker (or a later run) sees what the first one finished
+    first = output_store.OutputStore(str(tmp_path))
+    second = output_store.OutputStore(str(tmp_path))
+    key = output_store.cube_key(FACELETS, "R U", SETTINGS)
+    assert not second.done(key, "render")
+    first.record(key, "render")
+    assert second.done(key, "render")
+    assert output_store.OutputStore(str(tmp_path)).done(output_store.cube_key(FACELETS.lower(), "R U", SETTINGS),
+                                                        "render")
+
+
+def test_partial_and_truncated_lines(tmp_path):
+    store = output_store.OutputStore(str(tmp_path))
+    store.record("k1", "render")
+    with open(tmp_path / "stages.jsonl", "a") as f:
+        # a line cut short by a killed worker, then one still being written
+        f.write('{"key": "k2", "sta\n{"key": "k3", "stage": "ren')
+    other = output_store.OutputStore(str(tmp_path))
+    assert other.done("k1", "render")
+    assert not other.done("k3", "render")
+    with open(tmp_path / "stages.jsonl", "a") as f:
+        f.write('der"}\n')
+    assert other.done("k3", "render")
+    assert not other.done("k2", "render")
+
+
+def test_resume_from_first_missing_frame(tmp_path):
+    def frame_path(frame):
+        return str(tmp_path / f"frame_{frame:04d}.png")
+
+    groups = keyframes.render_groups(range(1, 71), keyframes.static_ranges(2))
+    frames = [frame for frame, same in groups]
+    assert output_store.missing_frames(frames, frame_path) == frames
+    # the pause after the first move (20-25) is rendered once, as frame 20
+    assert frames[frames.index(20) + 1] == 26
+    # an earlier run got as far as frame 26, the next one was still being written
+    for frame in frames:
+        if frame > 26:
+            break
+        with open(frame_path(frame), "w") as f:
+            f.write("png")
+    with open(frame_path(27) + ".part", "w") as f:
+        f.write("pn")
+    missing = output_store.missing_frames(frames, frame_path)
+    assert missing == [frame for frame in frames if frame > 26]
+    assert missing[0] == 27
@@ -0,0 +1,76 @@
+import json
+import random
+
+import pytest
+
+import cube_state
+import keyframes
+import notation
+import nxn
+import playback
+
+
+def animation(size=3, seed=0):
+    model = nxn.model(size)
+    rng = random.Random(seed)
+    moves = model.random_moves(20, rng)
+    state = model.apply_moves(model.SOLVED, moves)
+    return playback.animation(state, notation.invert(moves), model.facelets(state), model)
+
+
+def test_animation():
+    data = animation()
+    assert data["size"] == 3
+    assert data["solution"] and data["keys"]
+    assert data["frame_end"] == keyframes.static_ranges(len(data["solution"]))[-1][1]
+
+
+@pytest.mark.parametrize("name", ["cube.anim", "cube.anim.json"])
+@pytest.mark.parametrize("size", [3, 4])
+def test_round_trip(tmp_path, name, size):
+    data = animation(size)
+    path = str(tmp_path / name)
+    playback.save(path, data)
+    assert not (tmp_path / (name + ".part")).exists()
+    loaded = playback.load(path)
+    assert loaded["size"] == size
+    assert loaded["state"] == (tuple(data["state"][0]), tuple(data["state"][1]))
+    assert loaded["solution"] == data["solution"]
+    assert loaded["facelets"] == data["facelets"]
+    assert sorted(loaded["keys"]) == sorted(data["keys"])
+    for cubie, keys in data["keys"].items():
+        assert len(loaded["keys"][cubie]) == len(keys)
+        for (frame, quaternion, interpolation), (loaded_frame, loaded_quaternion, loaded_interpolation) \
+                in zip(keys, loaded["keys"][cubie]):
+            assert loaded_frame == frame
+            assert loaded_interpolation == interpolation
+            # float32 in binary files, 6 decimals in JSON
+            assert loaded_quaternion == pytest.approx(quaternion, abs=1e-6)
+
+
+def test_binary_is_compact(tmp_path):
+    path = str(tmp_path / "cube.anim")
+    playback.save(path, animation())
+    with open(path, "rb") as f:
+        blob = f.read()
+    assert blob.startswith(playback.MAGIC)
+    assert len(blob) < 8192
+
+
+def test_keys_end_solved():
+    # the last key of every turned cubie puts it back home, unrotated
+    data = animation(seed=2)
+    state = (tuple(data["state"][0]), tuple(data["state"][1]))
+    assert cube_state.apply_moves(state, data["solution"]) == cube_state.SOLVED
+    for keys in data["keys"].values():
+        assert abs(keys[-1][1][0]) == pytest.approx(1)
+
+
+def test_unsupported_version(tmp_path):
+    data = dict(animation(), version=playback.VERSION + 1)
+    path = str(tmp_path / "cube.anim.json")
+    playback.save(path, data)
+    with pytest.raises(ValueError):
+        playback.load(path)
+    with open(path) as f:
+        assert json.load(f)["version"] == playback.VERSION + 1
@@ -0,0 +1,123 @@
+import itertools
+import types
+
+import pytest
+
+import solver_cache
+
+SOLVED = "UUUUUUUUURRRRRRRRRFFFFFFFFFDDDDDDDDDLLLLLLLLLBBBBBBBBB"
+
+
+def facelets(i):
+    # distinct keys are all the cache needs
+    return f"{i:054d}"
+
+
+class Solver:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, facelets):
+        self.calls.append(facelets)
+        return f"solution of {facelets[-4:]}"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # use times one second apart, so no two rows tie
+    ticks = itertools.count()
+    monkeypatch.setattr(solver_cache, "time", types.SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def rows(path):
+    cache = solver_cache.SolutionCache(Solver(), path)
+    keys = {key for key, in cache.db.execute("SELECT facelets FROM solutions")}
+    cache.close()
+    return keys
+
+
+def test_memory_hit():
+    solve = Solver()
+    cache = solver_cache.SolutionCache(solve, None)
+    assert cache.solve(SOLVED.lower()) == cache.solve(" " + SOLVED + "\n")
+    assert solve.calls == [SOLVED]
+    assert cache.stats() == {"hits": 1, "disk_hits": 0, "misses": 1, "memory_entries": 1}
+
+
+def test_memory_lru():
+    solve = Solver()
+    cache = solver_cache.SolutionCache(solve, None, memory_size=2)
+    for i in (1, 2, 1, 3, 1, 2):
+        cache.solve(facelets(i))
+    # 2 was the least recently used when 3 came in
+    assert solve.calls == [facelets(1), facelets(2), facelets(3), facelets(2)]
+
+
+def test_persisted_hit(tmp_path):
+    path = str(tmp_path / "solutions.sqlite")
+    first = solver_cache.SolutionCache(Solver(), path)
+    solution = first.solve(SOLVED)
+    first.close()
+    solve = Solver()
+    second = solver_cache.SolutionCache(solve, path)
+    assert second.solve(SOLVED) == solution
+    assert solve.calls == []
+    assert second.stats()["disk_hits"] == 1
+    second.close()
+
+
+def test_namespaces(tmp_path):
+    path = str(tmp_path / "solutions.sqlite")
+    kociemba = solver_cache.SolutionCache(lambda facelets: "R", path, namespace="kociemba:")
+    kociemba.solve(SOLVED)
+    kociemba.close()
+    solve = Solver()
+    twophase = solver_cache.SolutionCache(solve, path, namespace="twophase:")
+    assert twophase.solve(SOLVED) != "R"
+    assert solve.calls == [SOLVED]
+    twophase.close()
+    assert rows(path) == {"kociemba:" + SOLVED, "twophase:" + SOLVED}
+
+
+def test_disk_lru_eviction(tmp_path, monkeypatch, clock):
+    path = str(tmp_path / "solutions.sqlite")
+    monkeypatch.setattr(solver_cache, "TOUCH_BATCH", 1)
+    cache = solver_cache.SolutionCache(Solver(), path, memory_size=1, disk_size=200)
+    for i in range(200):
+        cache.solve(facelets(i))
+    # a disk hit makes 0 the most recently used
+    cache.solve(facelets(0))
+    assert cache.stats()["disk_hits"] == 1
+    assert len(rows(path)) == 200
+    # the 201st store trims the file to 198 rows (1% below disk_size) right away
+    cache.solve(facelets(200))
+    assert rows(path) == {facelets(i) for i in [0] + list(range(4, 201))}
+    # and the next trim is due after 2 more stores
+    cache.solve(facelets(201))
+    cache.solve(facelets(202))
+    assert len(rows(path)) == 200
+    cache.solve(facelets(203))
+    assert len(rows(path)) == 198
+    cache.close()
+
+
+def test_trimmed_at_open(tmp_path, clock):
+    path = str(tmp_path / "solutions.sqlite")
+    cache = solver_cache.SolutionCache(Solver(), path)
+    for i in range(10):
+        cache.solve(facelets(i))
+    cache.close()
+    solver_cache.SolutionCache(Solver(), path, disk_size=5).close()
+    assert rows(path) == {facelets(i) for i in range(5, 10)}
+
+
+def test_cached(tmp_path):
+    path = str(tmp_path / "solutions.sqlite")
+    cache = solver_cache.SolutionCache(Solver(), path, memory_size=1, namespace="twophase:")
+    assert not cache.cached(SOLVED)
+    cache.solve(SOLVED)
+    cache.solve(facelets(1))
+    # on disk only, and in memory
+    assert cache.cached(SOLVED.lower()) and cache.cached(facelets(1))
+    assert cache.stats() == {"hits": 0, "disk_hits": 0, "misses": 2, "memory_entries": 1}
+    cache.close()
@@ -0,0 +1,121 @@
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+import cube_state
+import solver
+import solver_daemon
+import twophase
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def scrambled(seed):
+    return cube_state.kociemba_facelets(cube_state.random_state(random.Random(seed)))
+
+
+@pytest.fixture(scope="module")
+def daemon(tables, tmp_path_factory):
+    # a daemon with one twophase worker on a Unix socket; yields its address
+    address = str(tmp_path_factory.mktemp("daemon") / "solver.sock")
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "solver_daemon.py"), "--address", address,
+                                "--workers", "1", "--solver", "twophase"],
+                               env=dict(os.environ, RUBIK_TWOPHASE_TABLES=tables), stdout=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 60
+        while not os.path.exists(address):
+            assert process.poll() is None and time.monotonic() < deadline, "solver daemon did not start"
+            time.sleep(0.05)
+        yield address
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def exchange(address, line):
+    # the raw reply lines to one request line
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(60)
+        sock.connect(address)
+        sock.sendall(line)
+        replies = []
+        with sock.makefile("rb") as reader:
+            for reply in reader:
+                replies.append(json.loads(reply))
+                if "index" not in replies[-1]:
+                    return replies
+    return replies
+
+
+@pytest.mark.parametrize("address, family", [
+    ("/tmp/solver.sock", socket.AF_UNIX),
+    ("127.0.0.1:8765", socket.AF_INET),
+    ("localhost:8765", socket.AF_INET),
+])
+def test_parse_address(address, family):
+    assert solver_daemon.parse_address(address)[0] == family
+
+
+@pytest.mark.parametrize("address", ["0.0.0.0:8765", "192.168.1.10:8765", "example.com:80"])
+def test_rejects_non_loopback(address):
+    with pytest.raises(ValueError):
+        solver_daemon.parse_address(address)
+
+
+def test_streams_one_line_per_cube(daemon):
+    batch = [scrambled(seed) for seed in range(4)]
+    replies = exchange(daemon, (json.dumps({"facelets": batch}) + "\n").encode())
+    assert replies[-1] == {"done": 4}
+    assert sorted(reply["index"] for reply in replies[:-1]) == [0, 1, 2, 3]
+    for reply in replies[:-1]:
+        moves = reply["solution"].split()
+        state = cube_state.from_facelets(batch[reply["index"]].translate(str.maketrans("URFDLB", cube_state.FACE_COLORS)))
+        assert cube_state.facelets(cube_state.apply_moves(state, moves)) == cube_state.facelets(cube_state.SOLVED)
+
+
+def test_error_entries(daemon):
+    client = solver_daemon.DaemonClient(daemon)
+    try:
+        results = dict(client.solve_batch([scrambled(0), "U" * 54, scrambled(1)]))
+        # the invalid cube fails alone, the connection stays usable
+        assert isinstance(results[1], ValueError)
+        assert isinstance(results[0], str) and isinstance(results[2], str)
+        assert client.solve(scrambled(2))
+        with pytest.raises(ValueError):
+            client.solve("")
+    finally:
+        client.close()
+
+
+def test_rejects_malformed_requests(daemon):
+    assert "error" in exchange(daemon, b"not json\n")[0]
+    assert "error" in exchange(daemon, b'{"cubes": []}\n')[0]
+
+
+def test_prefetch(daemon, monkeypatch):
+    monkeypatch.setattr(solver, "daemon_client", solver_daemon.DaemonClient(daemon))
+    monkeypatch.setattr(solver, "daemon_solutions", {})
+    batch = [scrambled(seed) for seed in range(3)] + ["U" * 54]
+    solver.daemon_prefetch(batch)
+    assert sorted(solver.daemon_solutions) == sorted(batch)
+    # the cubes are answered from the batch, without another request
+    solver.daemon_client.close()
+    monkeypatch.setattr(solver, "daemon_client", solver_daemon.DaemonClient(daemon + ".missing"))
+    for facelets in batch[:3]:
+        assert solver.daemon_solve(facelets.lower()) == twophase.solve(facelets)
+    with pytest.raises(ValueError):
+        solver.daemon_solve("U" * 54)
+    assert solver.daemon_solutions == {}
+
+
+def test_prefetch_without_daemon(tmp_path, monkeypatch):
+    monkeypatch.setattr(solver, "daemon_client", solver_daemon.DaemonClient(str(tmp_path / "none.sock")))
+    monkeypatch.setattr(solver, "daemon_solutions", {})
+    solver.daemon_prefetch([scrambled(0)])
+    assert solver.daemon_solutions == {}
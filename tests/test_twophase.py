@@ -0,0 +1,142 @@
+import random
+import time
+
+import pytest
+
+import cube_state
+import twophase
+
+SOLVED = cube_state.kociemba_facelets(cube_state.SOLVED)
+
+
+def solved_by(facelets, solution):
+    state = cube_state.from_facelets(facelets.translate(str.maketrans("URFDLB", cube_state.FACE_COLORS)))
+    return cube_state.facelets(cube_state.apply_moves(state, solution.split())) == cube_state.facelets(cube_state.SOLVED)
+
+
+def test_solved_cube(tables):
+    assert twophase.solve(SOLVED, tables_path=tables) == ""
+    assert twophase.solve_short(SOLVED, tables_path=tables) == ""
+
+
+def test_one_move(tables):
+    facelets = cube_state.kociemba_facelets(cube_state.apply_moves(cube_state.SOLVED, ["R"]))
+    # the first solution need not be the shortest, the search for one of at most 1 move finds it
+    assert solved_by(facelets, twophase.solve(facelets, tables_path=tables))
+    assert twophase.solve_short(facelets, target=1, timeout=None, tables_path=tables) == "R'"
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_solve(seed, tables):
+    facelets = cube_state.kociemba_facelets(cube_state.random_state(random.Random(seed)))
+    solution = twophase.solve(facelets, tables_path=tables)
+    assert len(solution.split()) <= 24
+    assert solved_by(facelets, solution)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_short_is_never_longer(seed, tables):
+    facelets = cube_state.kociemba_facelets(cube_state.random_state(random.Random(seed)))
+    solution = twophase.solve(facelets, tables_path=tables)
+    # a target no solution misses returns the first solution found
+    first = twophase.solve_short(facelets, target=24, timeout=None, tables_path=tables)
+    assert first == solution
+    short = twophase.solve_short(facelets, timeout=None, max_nodes=400000, tables_path=tables)
+    assert len(short.split()) <= len(solution.split())
+    assert solved_by(facelets, short)
+
+
+def test_short_is_shorter(tables):
+    lengths = []
+    short_lengths = []
+    for seed in range(2, 7):
+        facelets = cube_state.kociemba_facelets(cube_state.random_state(random.Random(seed)))
+        lengths.append(len(twophase.solve(facelets, tables_path=tables).split()))
+        # node budgets keep the test independent of the machine; every first solution takes fewer
+        short = twophase.solve_short(facelets, target=18, timeout=None, max_nodes=200000, tables_path=tables)
+        short_lengths.append(len(short.split()))
+    assert sum(short_lengths) < sum(lengths)
+
+
+@pytest.mark.parametrize("max_nodes", [1, 5000, 50000])
+def test_short_respects_node_budget(max_nodes, tables):
+    cube = twophase.from_facelets(cube_state.kociemba_facelets(cube_state.random_state(random.Random(3))))
+    search = twophase.Search(cube, twophase.load_tables(tables), 24, target=0, max_nodes=max_nodes)
+    search.run()
+    assert search.stopped
+    assert search.nodes <= max_nodes
+
+
+def test_short_respects_time_budget(tables):
+    facelets = cube_state.kociemba_facelets(cube_state.random_state(random.Random(3)))
+    twophase.load_tables(tables)
+    start = time.perf_counter()
+    solution = twophase.solve_short(facelets, target=0, timeout=0.2, tables_path=tables)
+    assert time.perf_counter() - start < 0.5
+    assert solved_by(facelets, solution)
+
+
+def test_short_budget_without_solution(tables):
+    # the budget holds before the first solution too
+    facelets = cube_state.kociemba_facelets(cube_state.random_state(random.Random(3)))
+    with pytest.raises(ValueError):
+        twophase.solve_short(facelets, timeout=None, max_nodes=1, tables_path=tables)
+
+
+def test_short_reaches_target(tables):
+    facelets = cube_state.kociemba_facelets(cube_state.random_state(random.Random(7)))
+    solution = twophase.solve_short(facelets, target=21, timeout=None, tables_path=tables)
+    assert len(solution.split()) <= 21
+    assert solved_by(facelets, solution)
+
+
+@pytest.mark.parametrize("facelets", [
+    "",
+    SOLVED[:-1] + "U",
+    # a twisted corner
+    "UUUUUUUUF" + SOLVED[9:18] + "RFFFFFFFF" + SOLVED[27:54],
+    # swapped centres
+    SOLVED[:4] + "R" + SOLVED[5:13] + "U" + SOLVED[14:],
+])
+def test_invalid_facelets(facelets, tables):
+    with pytest.raises(ValueError):
+        twophase.solve(facelets, tables_path=tables)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_to_facelets_round_trip(seed):
+    facelets = cube_state.kociemba_facelets(cube_state.random_state(random.Random(seed)))
+    assert twophase.to_facelets(twophase.from_facelets(facelets)) == facelets
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_phase1_bound_is_symmetric(seed, tables):
+    # the bound of every conjugate is the bound of the cube, each looked up through another symmetry
+    search = twophase.Search(None, twophase.load_tables(tables), 24)
+    facelets = cube_state.kociemba_facelets(cube_state.random_state(random.Random(seed)))
+    bounds = set()
+    for sym in twophase.SYMMETRIES:
+        cube = twophase.from_facelets(twophase.conjugate(facelets, sym))
+        bounds.add(search.phase1_bound(twophase.twist_of(cube), twophase.flip_of(cube), twophase.slice_of(cube)))
+    assert len(bounds) == 1
+
+
+def test_phase1_bound_is_exact(tables):
+    search = twophase.Search(None, twophase.load_tables(tables), 24)
+    cube = twophase.SOLVED
+    for depth, move in enumerate(["R", "F", "L'", "B", "R'"]):
+        assert search.phase1_bound(twophase.twist_of(cube), twophase.flip_of(cube), twophase.slice_of(cube)) == depth
+        cube = twophase.multiply(cube, twophase.MOVE_CUBES[twophase.MOVE_NAMES.index(move)])
+
+
+def test_solve_speed_and_length(tables):
+    twophase.load_tables(tables)
+    lengths = []
+    start = time.perf_counter()
+    for seed in range(20):
+        facelets = cube_state.kociemba_facelets(cube_state.random_state(random.Random(seed)))
+        lengths.append(len(twophase.solve(facelets, tables_path=tables).split()))
+    # about 0.1 s and 20.7 moves a solve; the bounds leave room for slow machines
+    assert time.perf_counter() - start < 20
+    assert max(lengths) <= 22
+    assert sum(lengths) / len(lengths) <= 21.5
@@ -0,0 +1,630 @@
+# Built-in two-phase solver (Kociemba's algorithm) on memory-mapped tables.
+#
+# The move and pruning tables are generated once with numpy and stored in one
+# binary file; every process maps that file read-only, so parallel workers
+# share the pages through the OS page cache instead of building or parsing
+# tables at start-up. Solving itself only needs the standard library.
+#
+# Phase 1 brings the cube into the subgroup <U, D, R2, L2, F2, B2> using the
+# corner twist, edge flip and UD-slice coordinates; phase 2 solves it inside the
+# subgroup using corner permutation, U/D edge permutation and slice permutation.
+#
+# Phase 1 is pruned with the exact distance of every (flip, slice, twist)
+# combination. The 16 symmetries of the cube that keep the U-D axis reduce the
+# 1013760 flip-slice combinations to 64430 classes, so the table has one byte
+# for each of 64430 x 2187 states (141 MB, generated in a few minutes).
+import itertools
+import json
+import mmap
+import os
+import struct
+import time
+
+TABLES_VERSION = 2
+# phase 2 of more moves is not tried: a longer phase 1 with a short phase 2 is
+# found sooner, and the solutions come out shorter
+PHASE2_MAX_LENGTH = 10
+MAGIC = b"RUBIK2PH"
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "rubik", f"twophase-v{TABLES_VERSION}.bin")
+
+# corners and edges in kociemba order
+URF, UFL, ULB, UBR, DFR, DLF, DBL, DRB = range(8)
+UR, UF, UL, UB, DR, DF, DL, DB, FR, FL, BL, BR = range(12)
+
+# facelet index (0-53 in U-R-F-D-L-B order) of the stickers of every corner and edge
+CORNER_FACELETS = ((8, 9, 20), (6, 18, 38), (0, 36, 47), (2, 45, 11),
+                   (29, 26, 15), (27, 44, 24), (33, 53, 42), (35, 17, 51))
+EDGE_FACELETS = ((5, 10), (7, 19), (3, 37), (1, 46), (32, 16), (28, 25),
+                 (30, 43), (34, 52), (23, 12), (21, 41), (50, 39), (48, 14))
+CORNER_COLORS = ("URF", "UFL", "ULB", "UBR", "DFR", "DLF", "DBL", "DRB")
+EDGE_COLORS = ("UR", "UF", "UL", "UB", "DR", "DF", "DL", "DB", "FR", "FL", "BL", "BR")
+
+# the six face turns as (corner permutation, twists, edge permutation, flips)
+BASIC_MOVES = {
+    'U': ((UBR, URF, UFL, ULB, DFR, DLF, DBL, DRB), (0,) * 8,
+          (UB, UR, UF, UL, DR, DF, DL, DB, FR, FL, BL, BR), (0,) * 12),
+    'R': ((DFR, UFL, ULB, URF, DRB, DLF, DBL, UBR), (2, 0, 0, 1, 1, 0, 0, 2),
+          (FR, UF, UL, UB, BR, DF, DL, DB, DR, FL, BL, UR), (0,) * 12),
+    'F': ((UFL, DLF, ULB, UBR, URF, DFR, DBL, DRB), (1, 2, 0, 0, 2, 1, 0, 0),
+          (UR, FL, UL, UB, DR, FR, DL, DB, UF, DF, BL, BR), (0, 1, 0, 0, 0, 1, 0, 0, 1, 1, 0, 0)),
+    'D': ((URF, UFL, ULB, UBR, DLF, DBL, DRB, DFR), (0,) * 8,
+          (UR, UF, UL, UB, DF, DL, DB, DR, FR, FL, BL, BR), (0,) * 12),
+    'L': ((URF, ULB, DBL, UBR, DFR, UFL, DLF, DRB), (0, 1, 2, 0, 0, 2, 1, 0),
+          (UR, UF, BL, UB, DR, DF, FL, DB, FR, UL, DL, BR), (0,) * 12),
+    'B': ((URF, UFL, UBR, DRB, DFR, DLF, ULB, DBL), (0, 0, 1, 2, 0, 0, 2, 1),
+          (UR, UF, UL, BR, DR, DF, DL, BL, FR, FL, UB, DB), (0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 1, 1)),
+}
+FACES = "URFDLB"
+# move m is face m // 3 turned (m % 3 + 1) quarter turns: U, U2, U', R, R2, R', ...
+MOVE_NAMES = tuple(face + suffix for face in FACES for suffix in ("", "2", "'"))
+# moves of phase 2, which keep the cube in <U, D, R2, L2, F2, B2>
+PHASE2_MOVES = (0, 1, 2, 4, 7, 9, 10, 11, 13, 16)
+PHASE2_SET = frozenset(PHASE2_MOVES)
+
+N_TWIST = 2187
+N_FLIP = 2048
+N_SLICE = 495
+N_PERM8 = 40320
+N_PERM4 = 24
+SLICE_COMBOS = tuple(itertools.combinations(range(12), 4))
+SOLVED_SLICE = SLICE_COMBOS.index((FR, FL, BL, BR))
+
+
+def multiply(a, b):
+    cp_a, co_a, ep_a, eo_a = a
+    cp_b, co_b, ep_b, eo_b = b
+    return (tuple(cp_a[cp_b[i]] for i in range(8)),
+            tuple((co_a[cp_b[i]] + co_b[i]) % 3 for i in range(8)),
+            tuple(ep_a[ep_b[i]] for i in range(12)),
+            tuple((eo_a[ep_b[i]] + eo_b[i]) % 2 for i in range(12)))
+
+
+def build_move_cubes():
+    cubes = []
+    for face in FACES:
+        cube = BASIC_MOVES[face]
+        for power in range(3):
+            cubes.append(cube)
+            cube = multiply(cube, BASIC_MOVES[face])
+    return tuple(cubes)
+
+
+MOVE_CUBES = build_move_cubes()
+SOLVED = (tuple(range(8)), (0,) * 8, tuple(range(12)), (0,) * 12)
+
+
+def parity(permutation):
+    return sum(1 for i, j in itertools.combinations(range(len(permutation)), 2)
+               if permutation[i] > permutation[j]) % 2
+
+
+# kociemba facelet string (letters URFDLB) -> cubie level cube
+def from_facelets(facelets):
+    facelets = facelets.strip().upper()
+    if len(facelets) != 54 or any(facelets.count(face) != 9 for face in FACES):
+        raise ValueError("a cube needs 9 facelets of each of the colors U, R, F, D, L, B")
+    if facelets[4::9] != FACES:
+        raise ValueError("the centres must be U, R, F, D, L, B")
+    cp, co = [], []
+    for stickers in CORNER_FACELETS:
+        colors = [facelets[i] for i in stickers]
+        ori = next((k for k, color in enumerate(colors) if color in "UD"), None)
+        if ori is None:
+            raise ValueError("corner without a U or D sticker")
+        rotated = colors[ori] + colors[(ori + 1) % 3] + colors[(ori + 2) % 3]
+        if rotated not in CORNER_COLORS:
+            raise ValueError(f"impossible corner {''.join(colors)}")
+        cp.append(CORNER_COLORS.index(rotated))
+        co.append(ori)
+    ep, eo = [], []
+    for stickers in EDGE_FACELETS:
+        colors = "".join(facelets[i] for i in stickers)
+        if colors in EDGE_COLORS:
+            ep.append(EDGE_COLORS.index(colors))
+            eo.append(0)
+        elif colors[::-1] in EDGE_COLORS:
+            ep.append(EDGE_COLORS.index(colors[::-1]))
+            eo.append(1)
+        else:
+            raise ValueError(f"impossible edge {colors}")
+    if len(set(cp)) != 8 or len(set(ep)) != 12:
+        raise ValueError("every corner and edge must appear exactly once")
+    if sum(co) % 3:
+        raise ValueError("twisted corner")
+    if sum(eo) % 2:
+        raise ValueError("flipped edge")
+    if parity(cp) != parity(ep):
+        raise ValueError("corner and edge permutation parities differ")
+    return tuple(cp), tuple(co), tuple(ep), tuple(eo)
+
+
+# --- coordinates -------------------------------------------------------------
+
+def twist_of(cube):
+    twist = 0
+    for c in cube[1][:7]:
+        twist = 3 * twist + c
+    return twist
+
+
+def flip_of(cube):
+    flip = 0
+    for e in cube[3][:11]:
+        flip = 2 * flip + e
+    return flip
+
+
+def slice_of(cube):
+    return SLICE_INDEX[tuple(i for i, e in enumerate(cube[2]) if e >= FR)]
+
+
+# --- symmetries --------------------------------------------------------------
+
+def to_facelets(cube):
+    # inverse of from_facelets()
+    cp, co, ep, eo = cube
+    facelets = [""] * 54
+    for i in range(8):
+        for k in range(3):
+            facelets[CORNER_FACELETS[i][(k + co[i]) % 3]] = CORNER_COLORS[cp[i]][k]
+    for i in range(12):
+        for k in range(2):
+            facelets[EDGE_FACELETS[i][(k + eo[i]) % 2]] = EDGE_COLORS[ep[i]][k]
+    for face in range(6):
+        facelets[9 * face + 4] = FACES[face]
+    return "".join(facelets)
+
+
+def facelet_geometry():
+    # (position, outward normal) of every facelet, x to R, y to B, z to U; every
+    # face is read row by row as seen from outside, U with B at the top, D with F
+    # at the top, R F L B with U at the top
+    geometry = []
+    for face in FACES:
+        for row in range(3):
+            for col in range(3):
+                r, c = 1 - row, col - 1
+                geometry.append({'U': ((c, r, 1), (0, 0, 1)), 'R': ((1, c, r), (1, 0, 0)),
+                                 'F': ((c, -1, r), (0, -1, 0)), 'D': ((c, -r, -1), (0, 0, -1)),
+                                 'L': ((-1, -c, r), (-1, 0, 0)), 'B': ((-c, 1, r), (0, 1, 0))}[face])
+    return geometry
+
+
+def symmetries():
+    # the 16 rotations and reflections that map the U-D axis onto itself, as
+    # facelet permutations (the sticker at i moves to sym[i])
+    geometry = facelet_geometry()
+    index = {sticker: i for i, sticker in enumerate(geometry)}
+    syms = []
+    for (a, b), (c, d) in (((1, 0), (0, 1)), ((0, 1), (1, 0))):
+        for sx, sy, sz in itertools.product((1, -1), repeat=3):
+            def transform(v):
+                return (sx * (a * v[0] + b * v[1]), sy * (c * v[0] + d * v[1]), sz * v[2])
+            syms.append(tuple(index[(transform(p), transform(n))] for p, n in geometry))
+    return tuple(syms)
+
+
+SYMMETRIES = symmetries()
+N_SYM = len(SYMMETRIES)
+
+
+def conjugate(facelets, sym):
+    # the cube turned (or mirrored) by sym and repainted so the centres are in
+    # place again; a move sequence solving it is the mapped sequence of the original
+    faces = {FACES[face]: FACES[sym[9 * face + 4] // 9] for face in range(6)}
+    result = [""] * 54
+    for i, color in enumerate(facelets):
+        result[sym[i]] = faces[color]
+    return "".join(result)
+
+
+def edge_symmetry(sym):
+    # where sym moves every edge position, and whether it flips the edge there
+    positions = []
+    flips = []
+    for stickers in EDGE_FACELETS:
+        moved = (sym[stickers[0]], sym[stickers[1]])
+        j = next(j for j, other in enumerate(EDGE_FACELETS) if set(other) == set(moved))
+        positions.append(j)
+        flips.append(0 if moved[0] == EDGE_FACELETS[j][0] else 1)
+    return positions, flips
+
+
+def perm_rank(permutation):
+    # lexicographic rank, the index in itertools.permutations order
+    rank = 0
+    n = len(permutation)
+    for i in range(n):
+        rank = rank * (n - i) + sum(1 for j in range(i + 1, n) if permutation[j] < permutation[i])
+    return rank
+
+
+SLICE_INDEX = {combo: idx for idx, combo in enumerate(SLICE_COMBOS)}
+
+
+# --- table generation (needs numpy) ------------------------------------------
+
+def np_perm_rank(np, perms):
+    n = perms.shape[1]
+    rank = np.zeros(len(perms), dtype=np.int64)
+    for i in range(n):
+        smaller = (perms[:, i + 1:] < perms[:, i:i + 1]).sum(axis=1)
+        rank = rank * (n - i) + smaller
+    return rank
+
+
+def np_digits(np, values, base, count):
+    digits = np.zeros((len(values), count), dtype=np.int64)
+    for i in range(count - 1, -1, -1):
+        digits[:, i] = values % base
+        values = values // base
+    return digits
+
+
+def np_number(np, digits, base):
+    values = np.zeros(len(digits), dtype=np.int64)
+    for i in range(digits.shape[1]):
+        values = values * base + digits[:, i]
+    return values
+
+
+def orientation_move_table(np, n, size, base, moves, perm_idx, ori_idx):
+    digits = np_digits(np, np.arange(n), base, size - 1)
+    last = (-digits.sum(axis=1)) % base
+    orients = np.concatenate([digits, last[:, None]], axis=1)
+    table = np.empty((n, len(moves)), dtype=np.uint16)
+    for k, m in enumerate(moves):
+        move = MOVE_CUBES[m]
+        moved = (orients[:, list(move[perm_idx])] + np.array(move[ori_idx])) % base
+        table[:, k] = np_number(np, moved[:, :size - 1], base)
+    return table
+
+
+def slice_move_table(np):
+    table = np.empty((N_SLICE, 18), dtype=np.uint16)
+    for idx, combo in enumerate(SLICE_COMBOS):
+        occupied = [i in combo for i in range(12)]
+        for m, move in enumerate(MOVE_CUBES):
+            table[idx, m] = SLICE_INDEX[tuple(i for i in range(12) if occupied[move[2][i]])]
+    return table
+
+
+def perm_move_table(np, n, positions, offset, moves, perm_idx):
+    perms = np.array(list(itertools.permutations(range(n))), dtype=np.int64)
+    table = np.empty((len(perms), len(moves)), dtype=np.uint16)
+    for k, m in enumerate(moves):
+        source = np.array(MOVE_CUBES[m][perm_idx][positions]) - offset
+        table[:, k] = np_perm_rank(np, perms[:, source])
+    return table
+
+
+def prune_table(np, move_a, move_b, start):
+    # breadth-first distances in the product of two coordinates
+    n_a, n_moves = move_a.shape
+    n_b = move_b.shape[0]
+    dist = np.full(n_a * n_b, 255, dtype=np.uint8)
+    dist[start] = 0
+    depth = 0
+    while True:
+        frontier = np.flatnonzero(dist == depth)
+        if len(frontier) == 0:
+            return dist
+        a = frontier // n_b
+        b = frontier % n_b
+        for m in range(n_moves):
+            idx = move_a[a, m].astype(np.int64) * n_b + move_b[b, m]
+            idx = idx[dist[idx] == 255]
+            dist[idx] = depth + 1
+        depth += 1
+
+
+def flipslice_classes(np):
+    # symmetry class of every flip-slice coordinate slice * N_FLIP + flip, the
+    # symmetry that turns it into the representative of its class, the
+    # representatives and the symmetries that leave each of them unchanged
+    flip = np.arange(N_FLIP)
+    digits = np_digits(np, flip, 2, 11)
+    orients = np.concatenate([digits, digits.sum(axis=1)[:, None] % 2], axis=1).astype(np.uint8)
+    masks = np.zeros((N_SLICE, 12), dtype=np.uint8)
+    for idx, combo in enumerate(SLICE_COMBOS):
+        masks[idx, list(combo)] = 1
+    mask_index = np.zeros(1 << 12, dtype=np.int64)
+    mask_index[np_number(np, masks.astype(np.int64), 2)] = np.arange(N_SLICE)
+    conjugates = np.empty((N_SYM, N_SLICE * N_FLIP), dtype=np.int64)
+    for s, sym in enumerate(SYMMETRIES):
+        positions, flips = edge_symmetry(sym)
+        # the U and D edges keep their orientation, the slice edges all flip or all keep it
+        assert not any(flips[:FR]) and len(set(flips[FR:])) == 1
+        moved_masks = np.empty_like(masks)
+        moved_masks[:, positions] = masks
+        slices = mask_index[np_number(np, moved_masks.astype(np.int64), 2)]
+        for slc in range(N_SLICE):
+            moved = np.empty_like(orients)
+            moved[:, positions] = orients ^ np.array(flips, dtype=np.uint8) ^ (masks[slc] * flips[FR])
+            conjugates[s, slc * N_FLIP:(slc + 1) * N_FLIP] = slices[slc] * N_FLIP + np_number(np, moved[:, :11], 2)
+    representatives, classes = np.unique(conjugates.min(axis=0), return_inverse=True)
+    stabilizers = conjugates[:, representatives] == representatives
+    return classes.astype(np.uint16), conjugates.argmin(axis=0).astype(np.uint8), representatives, stabilizers.T
+
+
+def twist_conjugation_table(np):
+    # twist of the conjugate by every symmetry, of a cube with only that twist
+    table = np.empty((N_TWIST, N_SYM), dtype=np.uint16)
+    for twist in range(N_TWIST):
+        co = [twist // 3 ** (6 - i) % 3 for i in range(7)]
+        facelets = to_facelets((tuple(range(8)), tuple(co + [-sum(co) % 3]), tuple(range(12)), (0,) * 12))
+        for s, sym in enumerate(SYMMETRIES):
+            table[twist, s] = twist_of(from_facelets(conjugate(facelets, sym)))
+    return table
+
+
+def phase1_prune_table(np, tables, representatives, stabilizers):
+    # breadth-first distances of all (flip-slice class, twist) states, every
+    # state expanded in the orientation of its class representative. A state
+    # reached in another orientation than the one looked up comes back as its
+    # image under a symmetry fixing the representative, so those get set too
+    flip_move = tables["flip_move"]
+    slice_move = tables["slice_move"]
+    twist_move = tables["twist_move"]
+    classes = tables["flipslice_class"]
+    syms = tables["flipslice_sym"]
+    twist_conj = tables["twist_conj"]
+    dist = np.full(len(representatives) * N_TWIST, 255, dtype=np.uint8)
+    dist[int(classes[SOLVED_SLICE * N_FLIP]) * N_TWIST] = 0
+    depth = 0
+    while True:
+        frontier = np.flatnonzero(dist == depth)
+        if len(frontier) == 0:
+            return dist
+        for start in range(0, len(frontier), 1 << 21):
+            chunk = frontier[start:start + (1 << 21)]
+            raw = representatives[chunk // N_TWIST]
+            twist = chunk % N_TWIST
+            flip = raw % N_FLIP
+            slc = raw // N_FLIP
+            for m in range(18):
+                moved = slice_move[slc, m].astype(np.int64) * N_FLIP + flip_move[flip, m]
+                idx = (classes[moved].astype(np.int64) * N_TWIST
+                       + twist_conj[twist_move[twist, m], syms[moved]])
+                idx = idx[dist[idx] == 255]
+                dist[idx] = depth + 1
+                cls = idx // N_TWIST
+                for s in range(1, N_SYM):
+                    fixed = stabilizers[cls, s]
+                    if fixed.any():
+                        dist[cls[fixed] * N_TWIST + twist_conj[idx[fixed] % N_TWIST, s]] = depth + 1
+        depth += 1
+
+
+def generate_tables():
+    import numpy as np
+    all_moves = range(18)
+    tables = {}
+    tables["twist_move"] = orientation_move_table(np, N_TWIST, 8, 3, all_moves, 0, 1)
+    tables["flip_move"] = orientation_move_table(np, N_FLIP, 12, 2, all_moves, 2, 3)
+    tables["slice_move"] = slice_move_table(np)
+    tables["corner_move"] = perm_move_table(np, 8, slice(0, 8), 0, PHASE2_MOVES, 0)
+    tables["edge_move"] = perm_move_table(np, 8, slice(0, 8), 0, PHASE2_MOVES, 2)
+    tables["slice_perm_move"] = perm_move_table(np, 4, slice(8, 12), 8, PHASE2_MOVES, 2)
+    tables["flipslice_class"], tables["flipslice_sym"], representatives, stabilizers = flipslice_classes(np)
+    tables["twist_conj"] = twist_conjugation_table(np)
+    tables["phase1_prune"] = phase1_prune_table(np, tables, representatives, stabilizers)
+    tables["corner_slice_prune"] = prune_table(np, tables["corner_move"], tables["slice_perm_move"], 0)
+    tables["edge_slice_prune"] = prune_table(np, tables["edge_move"], tables["slice_perm_move"], 0)
+    return tables
+
+
+def write_tables(path, tables):
+    header = {}
+    offset = 0
+    for name, table in tables.items():
+        header[name] = {"offset": offset, "format": "H" if table.dtype.itemsize == 2 else "B",
+                        "count": int(table.size)}
+        # keep every table 8 byte aligned
+        offset += (table.nbytes + 7) // 8 * 8
+    header_bytes = json.dumps(header).encode()
+    header_bytes += b" " * (-(len(MAGIC) + 4 + len(header_bytes)) % 8)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # write next to the target and rename, so concurrent workers never map a half-written file
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+        for table in tables.values():
+            data = table.astype(table.dtype.newbyteorder("<")).tobytes()
+            f.write(data + b"\0" * (-len(data) % 8))
+    os.replace(temporary, path)
+
+
+# --- memory-mapped tables ----------------------------------------------------
+
+class Tables:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a two-phase table file")
+        header_length = struct.unpack_from("<I", self.map, len(MAGIC))[0]
+        start = len(MAGIC) + 4
+        header = json.loads(bytes(self.map[start:start + header_length]))
+        data = memoryview(self.map)[start + header_length:]
+        for name, entry in header.items():
+            size = entry["count"] * (2 if entry["format"] == "H" else 1)
+            table = data[entry["offset"]:entry["offset"] + size].cast(entry["format"])
+            setattr(self, name, table)
+
+
+_tables = {}
+
+
+def load_tables(path=None):
+    # map the table file, generating it first if it does not exist yet
+    path = path or os.environ.get("RUBIK_TWOPHASE_TABLES", DEFAULT_PATH)
+    if path not in _tables:
+        if not os.path.exists(path):
+            write_tables(path, generate_tables())
+        _tables[path] = Tables(path)
+    return _tables[path]
+
+
+# --- search ------------------------------------------------------------------
+
+class Search:
+    # iterative deepening over phase 1; every phase 1 solution gets the shortest
+    # phase 2 that fits into max_length and PHASE2_MAX_LENGTH. The search stops
+    # at the first solution of at most `target` moves; longer ones only lower
+    # max_length, so it keeps improving until the time or node budget is spent.
+    # The budget holds from the start, so a search can end without a solution.
+    def __init__(self, cube, tables, max_length, target=None, deadline=None, max_nodes=None):
+        self.cube = cube
+        self.t = tables
+        self.max_length = max_length
+        self.target = max_length if target is None else target
+        self.deadline = deadline
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.next_check = 0
+        self.stopped = False
+        self.moves = []
+        self.best = None
+
+    def out_of_budget(self):
+        # called once nodes reach next_check: every 1024 nodes for the clock,
+        # exactly at max_nodes, and on every node after the search stopped
+        self.stopped = ((self.max_nodes is not None and self.nodes >= self.max_nodes)
+                        or (self.deadline is not None and time.monotonic() > self.deadline))
+        if self.stopped:
+            self.next_check = 0
+        elif self.max_nodes is not None:
+            self.next_check = min(self.nodes + 1024, self.max_nodes)
+        else:
+            self.next_check = self.nodes + 1024
+        return self.stopped
+
+    def phase1_bound(self, twist, flip, slc):
+        # exact phase 1 distance, looked up in the orientation of the flip-slice class representative
+        t = self.t
+        raw = slc * N_FLIP + flip
+        return t.phase1_prune[t.flipslice_class[raw] * N_TWIST + t.twist_conj[twist * N_SYM + t.flipslice_sym[raw]]]
+
+    def phase2_bound(self, corner, edge, slice_perm):
+        t = self.t
+        return max(t.corner_slice_prune[corner * N_PERM4 + slice_perm],
+                   t.edge_slice_prune[edge * N_PERM4 + slice_perm])
+
+    def phase1(self, twist, flip, slc, depth, last_face):
+        if depth == 0:
+            # a phase 1 ending with a phase 2 move was already tried one level shallower
+            if twist == 0 and flip == 0 and slc == SOLVED_SLICE and (not self.moves or self.moves[-1] not in PHASE2_SET):
+                return self.start_phase2()
+            return False
+        t = self.t
+        for m in range(18):
+            face = m // 3
+            # no two turns of one face in a row, opposite faces only in one order
+            if face == last_face or face == last_face - 3:
+                continue
+            if self.nodes >= self.next_check and self.out_of_budget():
+                return True
+            self.nodes += 1
+            new_twist = t.twist_move[twist * 18 + m]
+            new_flip = t.flip_move[flip * 18 + m]
+            new_slice = t.slice_move[slc * 18 + m]
+            if self.phase1_bound(new_twist, new_flip, new_slice) >= depth:
+                continue
+            self.moves.append(m)
+            done = self.phase1(new_twist, new_flip, new_slice, depth - 1, face)
+            self.moves.pop()
+            if done or self.stopped:
+                return True
+        return False
+
+    def start_phase2(self):
+        cube = self.cube
+        for m in self.moves:
+            cube = multiply(cube, MOVE_CUBES[m])
+        corner = perm_rank(cube[0])
+        edge = perm_rank(cube[2][:8])
+        slice_perm = perm_rank([e - FR for e in cube[2][8:]])
+        phase1_length = len(self.moves)
+        last_face = self.moves[-1] // 3 if self.moves else -1
+        bound = self.phase2_bound(corner, edge, slice_perm)
+        for depth in range(bound, min(PHASE2_MAX_LENGTH, self.max_length - phase1_length) + 1):
+            if self.phase2(corner, edge, slice_perm, depth, last_face):
+                self.best = [MOVE_NAMES[m] for m in self.moves]
+                del self.moves[phase1_length:]
+                self.max_length = len(self.best) - 1
+                return len(self.best) <= self.target
+            if self.stopped:
+                break
+        return False
+
+    def phase2(self, corner, edge, slice_perm, depth, last_face):
+        if depth == 0:
+            return corner == 0 and edge == 0 and slice_perm == 0
+        t = self.t
+        for k, m in enumerate(PHASE2_MOVES):
+            face = m // 3
+            if face == last_face or face == last_face - 3:
+                continue
+            if self.nodes >= self.next_check and self.out_of_budget():
+                return False
+            self.nodes += 1
+            new_corner = t.corner_move[corner * 10 + k]
+            new_edge = t.edge_move[edge * 10 + k]
+            new_slice = t.slice_perm_move[slice_perm * 10 + k]
+            if self.phase2_bound(new_corner, new_edge, new_slice) >= depth:
+                continue
+            self.moves.append(m)
+            if self.phase2(new_corner, new_edge, new_slice, depth - 1, face):
+                return True
+            self.moves.pop()
+        return False
+
+    def run(self):
+        cube = self.cube
+        twist, flip, slc = twist_of(cube), flip_of(cube), slice_of(cube)
+        depth = self.phase1_bound(twist, flip, slc)
+        # max_length shrinks with every solution found
+        while depth <= self.max_length:
+            if self.phase1(twist, flip, slc, depth, -1):
+                break
+            depth += 1
+        return self.best
+
+
+# same interface as kociemba.solve: facelet string in, "R U2 F' ..." out
+def solve(facelets, max_length=24, tables_path=None):
+    cube = from_facelets(facelets)
+    if cube == SOLVED:
+        return ""
+    solution = Search(cube, load_tables(tables_path), max_length).run()
+    if solution is None:
+        raise ValueError(f"no solution with at most {max_length} moves found")
+    return " ".join(solution)
+
+
+# anytime short solutions: keeps looking for shorter solutions until one has at
+# most `target` moves or the budget (seconds and/or search nodes, counted from
+# the start) is spent, and returns the shortest found. Its first solution is the
+# one solve() returns, so it is never longer; a budget spent before the first
+# solution is an error.
+def solve_short(facelets, target=20, timeout=1.0, max_nodes=None, max_length=24, tables_path=None):
+    cube = from_facelets(facelets)
+    if cube == SOLVED:
+        return ""
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    search = Search(cube, load_tables(tables_path), max_length, target, deadline, max_nodes)
+    solution = search.run()
+    if solution is None and search.stopped:
+        raise ValueError("no solution found within the search budget")
+    if solution is None:
+        raise ValueError(f"no solution with at most {max_length} moves found")
+    return " ".join(solution)
+
+
+if __name__ == "__main__":
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("RUBIK_TWOPHASE_TABLES", DEFAULT_PATH)
+    start = time.perf_counter()
+    write_tables(path, generate_tables())
+    print(f"wrote {path} in {time.perf_counter() - start:.1f}s")